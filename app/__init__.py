@@ -5,34 +5,53 @@ from flask_login import LoginManager
 from flask_cors import CORS 
 
 from .extensions import db, migrate, login_manager
+from .config import config_from_env, configure_database, apply_sqlite_pragmas
 from .routes.public import public_bp
 from .routes.customer import customer_bp
 from .routes.supplier import supplier_bp
 from .routes.admin import admin_bp
 from .routes.auth import auth_bp
+from .catalog import catalog_cli
+from .search import search_cli
+from .cache import cache
+from .identity import identity_cache
+from .passwords import hasher
+from .instrumentation import instrumentation
+from .serializers import FastJSONProvider
+from .jobs import jobs, jobs_cli
+from .analytics import analytics_cli
+from .inventory import inventory_cli
+from .categories import categories_cli
 import os
 
 
-def create_app(config_class=None):
+def create_app(config_class=None, asgi=False):
     app = Flask(__name__)
 
     # ------------------------------------
     # CONFIG
     # ------------------------------------
-    if config_class:
-        app.config.from_object(config_class)
-    else:
-        app.config['SECRET_KEY'] = "ecommercesite"
-        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///ecommerce.db"
-        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False 
+    # APP_CONFIG=development|testing|production picks the profile
+    app.config.from_object(config_class or config_from_env())
+    configure_database(app)
+
+    # orjson-backed jsonify when available, JSON_FAST_ENCODER=False opts out
+    app.json = FastJSONProvider(app)
 
     
     # ------------------------------------
     # EXTENSIONS
     # ------------------------------------
     db.init_app(app)
-    migrate.init_app(app, db)
+    apply_sqlite_pragmas(app, db)
+    # batch mode so ALTERs on SQLite are emitted as table copies
+    migrate.init_app(app, db, render_as_batch=True)
     login_manager.init_app(app)
+    cache.init_app(app)
+    identity_cache.init_app(app)
+    hasher.init_app(app)
+    instrumentation.init_app(app, db)
+    jobs.init_app(app)
 
     # all React front-end to communite
     CORS(app, supports_credentials=True)
@@ -46,5 +65,36 @@ def create_app(config_class=None):
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
     app.register_blueprint(auth_bp, url_prefix="/auth")
 
+    # ------------------------------------
+    # ASGI
+    # ------------------------------------
+    # asgi.py builds this variant: app.asgi_app serves the read-heavy
+    # public listings as native coroutines over an async engine and
+    # the rest of the app on a thread pool; needs asgiref and an async
+    # driver such as aiosqlite
+    if asgi:
+        from .async_db import async_db
+        from .asgi import AsgiApp
+        from .routes.public_async import NATIVE_VIEWS
+
+        async_db.init_app(app)
+        app.asgi_app = AsgiApp(app, NATIVE_VIEWS)
+
+    # ------------------------------------
+    # CLI
+    # ------------------------------------
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(inventory_cli)
+    app.cli.add_command(categories_cli)
+
+    # `flask db explain` sits next to Flask-Migrate's own commands; the
+    # import is local because the plan check builds apps of its own
+    from flask_migrate.cli import db as migrate_cli
+    from .query_plans import explain_command
+    migrate_cli.add_command(explain_command)
+
 
     return app
\ No newline at end of file
@@ -0,0 +1,360 @@
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, func, insert
+
+from app.extensions import db
+from app.models import (
+    Category, Order, OrderItem, Product, SalesDaily, SalesDailyCategory,
+    SalesDailyProduct, SalesDailySupplier, User,
+)
+
+
+DEFAULT_RANGE_DAYS = 30
+MAX_TOP_PRODUCTS = 100
+
+
+
+# ----------------------------------------------------------------
+# ROLLUP WRITES
+# relative upserts, so concurrent checkouts add to the same row
+# instead of overwriting each other
+# ----------------------------------------------------------------
+def _increment(session, model, rows, keys):
+    if not rows:
+        return
+
+    table = model.__table__
+    counters = [name for name in rows[0] if name not in keys]
+    dialect = session.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(table)
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + stmt.excluded[name] for name in counters}
+        ), rows)
+        return
+
+    # portable fallback for backends without ON CONFLICT
+    for row in rows:
+        result = session.execute(
+            table.update()
+            .where(and_(*(table.c[key] == row[key] for key in keys)))
+            .values({name: table.c[name] + row[name] for name in counters})
+        )
+        if result.rowcount == 0:
+            session.execute(table.insert().values(**row))
+
+
+
+def record_order(session, created_at, lines):
+    """Add one order to the rollups.
+
+    `lines` is [(product_id, category_id, supplier_id, quantity, price)].
+    Runs inside the checkout transaction so the rollups commit with
+    the order or not at all.
+    """
+    day = created_at.date()
+
+    totals = {"units": 0, "revenue": 0.0}
+    per = {"category": {}, "supplier": {}, "product": {}}
+
+    for product_id, category_id, supplier_id, quantity, price in lines:
+        amount = quantity * price
+        totals["units"] += quantity
+        totals["revenue"] += amount
+
+        for bucket, key in (("category", category_id), ("supplier", supplier_id), ("product", product_id)):
+            entry = per[bucket].setdefault(key, {"units": 0, "revenue": 0.0})
+            entry["units"] += quantity
+            entry["revenue"] += amount
+
+    _increment(session, SalesDaily, [
+        {"day": day, "orders": 1, "units": totals["units"], "revenue": totals["revenue"], "carts_started": 0}
+    ], ["day"])
+
+    for model, bucket, column in (
+        (SalesDailyCategory, "category", "category_id"),
+        (SalesDailySupplier, "supplier", "supplier_id"),
+        (SalesDailyProduct, "product", "product_id"),
+    ):
+        _increment(session, model, [
+            {"day": day, column: key, "orders": 1, **values}
+            for key, values in sorted(per[bucket].items())
+        ], ["day", column])
+
+
+
+def record_cart_started(session, started_at):
+    _increment(session, SalesDaily, [
+        {"day": started_at.date(), "orders": 0, "units": 0, "revenue": 0.0, "carts_started": 1}
+    ], ["day"])
+
+
+
+# ----------------------------------------------------------------
+# READS
+# every query is a range scan over (day, ...) primary keys, so cost
+# follows the number of days asked for, not the number of orders
+# ----------------------------------------------------------------
+def parse_range(args):
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD, inclusive, last 30 days by default."""
+    today = datetime.utcnow().date()
+    try:
+        end = _parse_day(args.get("to")) or today
+        start = _parse_day(args.get("from")) or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD")
+
+    if start > end:
+        raise ValueError("from must not be after to")
+    return start, end
+
+
+
+def _parse_day(value):
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+
+def _money(value):
+    return round(value or 0.0, 2)
+
+
+
+def revenue_by_day(start, end):
+    rows = (
+        db.session.query(SalesDaily)
+        .filter(SalesDaily.day.between(start, end))
+        .order_by(SalesDaily.day)
+        .all()
+    )
+
+    orders = sum(r.orders for r in rows)
+    revenue = sum(r.revenue for r in rows)
+
+    return {
+        "totals": {
+            "orders": orders,
+            "units": sum(r.units for r in rows),
+            "revenue": _money(revenue),
+            "average_order": _money(revenue / orders) if orders else 0.0,
+        },
+        "days": [
+            {"day": r.day.isoformat(), "orders": r.orders, "units": r.units, "revenue": _money(r.revenue)}
+            for r in rows
+        ],
+    }
+
+
+
+def _grouped(model, column, start, end, limit=None, order="revenue"):
+    query = (
+        db.session.query(
+            column,
+            func.sum(model.orders),
+            func.sum(model.units),
+            func.sum(model.revenue),
+        )
+        .filter(model.day.between(start, end))
+        .group_by(column)
+    )
+
+    sort = func.sum(model.units) if order == "units" else func.sum(model.revenue)
+    query = query.order_by(sort.desc(), column)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+
+def revenue_by_category(start, end):
+    rows = _grouped(SalesDailyCategory, SalesDailyCategory.category_id, start, end)
+    names = dict(
+        db.session.query(Category.id, Category.name)
+        .filter(Category.id.in_([r[0] for r in rows]))
+    ) if rows else {}
+
+    return [
+        {"category_id": cid, "name": names.get(cid), "orders": orders, "units": units, "revenue": _money(revenue)}
+        for cid, orders, units, revenue in rows
+    ]
+
+
+
+def revenue_by_supplier(start, end):
+    rows = _grouped(SalesDailySupplier, SalesDailySupplier.supplier_id, start, end)
+    names = dict(
+        db.session.query(User.id, User.name)
+        .filter(User.id.in_([r[0] for r in rows]))
+    ) if rows else {}
+
+    return [
+        {"supplier_id": sid, "name": names.get(sid), "orders": orders, "units": units, "revenue": _money(revenue)}
+        for sid, orders, units, revenue in rows
+    ]
+
+
+
+def top_products(start, end, limit=10, order="revenue"):
+    rows = _grouped(SalesDailyProduct, SalesDailyProduct.product_id, start, end, limit, order)
+    titles = dict(
+        db.session.query(Product.id, Product.title)
+        .filter(Product.id.in_([r[0] for r in rows]))
+    ) if rows else {}
+
+    return [
+        {"product_id": pid, "title": titles.get(pid), "orders": orders, "units": units, "revenue": _money(revenue)}
+        for pid, orders, units, revenue in rows
+    ]
+
+
+
+def conversion(start, end):
+    rows = (
+        db.session.query(SalesDaily.day, SalesDaily.carts_started, SalesDaily.orders)
+        .filter(SalesDaily.day.between(start, end))
+        .order_by(SalesDaily.day)
+        .all()
+    )
+
+    def rate(orders, carts):
+        return round(orders / carts, 4) if carts else None
+
+    carts = sum(r.carts_started for r in rows)
+    orders = sum(r.orders for r in rows)
+
+    return {
+        "carts_started": carts,
+        "orders": orders,
+        "conversion_rate": rate(orders, carts),
+        "days": [
+            {"day": r.day.isoformat(), "carts_started": r.carts_started,
+             "orders": r.orders, "conversion_rate": rate(r.orders, r.carts_started)}
+            for r in rows
+        ],
+    }
+
+
+
+# ----------------------------------------------------------------
+# BACKFILL
+# rebuilds the order-derived rollups from Order/OrderItem. category
+# and supplier come from the product as it is today. carts_started
+# has no history to rebuild from and is left as recorded
+# ----------------------------------------------------------------
+BACKFILL_BATCH = 5000
+
+
+def backfill(start=None, end=None):
+    day = func.date(Order.created_at)
+
+    def in_range(query):
+        if start:
+            query = query.filter(Order.created_at >= datetime.combine(start, datetime.min.time()))
+        if end:
+            query = query.filter(Order.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        return query
+
+    def day_filter(model):
+        conditions = []
+        if start:
+            conditions.append(model.day >= start)
+        if end:
+            conditions.append(model.day <= end)
+        return and_(*conditions) if conditions else True
+
+    for model in (SalesDailyCategory, SalesDailySupplier, SalesDailyProduct):
+        db.session.query(model).filter(day_filter(model)).delete(synchronize_session=False)
+
+    db.session.query(SalesDaily).filter(day_filter(SalesDaily)).update(
+        {"orders": 0, "units": 0, "revenue": 0.0}, synchronize_session=False
+    )
+
+    # per-day totals; orders are counted off Order so empty orders still count
+    daily = in_range(
+        db.session.query(
+            day,
+            func.count(func.distinct(Order.id)),
+            func.coalesce(func.sum(OrderItem.quantity), 0),
+            func.coalesce(func.sum(OrderItem.quantity * OrderItem.price), 0.0),
+        )
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .group_by(day)
+    ).all()
+
+    _increment(db.session, SalesDaily, [
+        {"day": _as_date(d), "orders": orders, "units": units, "revenue": revenue, "carts_started": 0}
+        for d, orders, units, revenue in daily
+    ], ["day"])
+
+    counts = {"days": len(daily)}
+    for model, column, key in (
+        (SalesDailyCategory, Product.category_id, "category_id"),
+        (SalesDailySupplier, Product.supplier_id, "supplier_id"),
+        (SalesDailyProduct, OrderItem.product_id, "product_id"),
+    ):
+        query = in_range(
+            db.session.query(
+                day,
+                column,
+                func.count(func.distinct(Order.id)),
+                func.sum(OrderItem.quantity),
+                func.sum(OrderItem.quantity * OrderItem.price),
+            )
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .join(Product, OrderItem.product_id == Product.id)
+            .group_by(day, column)
+        )
+
+        rows = [
+            {"day": _as_date(d), key: value, "orders": orders, "units": units, "revenue": revenue}
+            for d, value, orders, units, revenue in query.all()
+        ]
+        for i in range(0, len(rows), BACKFILL_BATCH):
+            db.session.execute(insert(model), rows[i:i + BACKFILL_BATCH])
+        counts[model.__tablename__] = len(rows)
+
+    db.session.commit()
+    return counts
+
+
+
+def _as_date(value):
+    # func.date() comes back as a string on SQLite
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# flask analytics backfill [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+# ----------------------------------------------------------------
+analytics_cli = AppGroup("analytics", help="Sales rollups.")
+
+
+@analytics_cli.command("backfill")
+@click.option("--from", "start", help="First day to rebuild, YYYY-MM-DD.")
+@click.option("--to", "end", help="Last day to rebuild, YYYY-MM-DD.")
+def backfill_command(start, end):
+    """Rebuild the sales rollups from historical orders."""
+    try:
+        start, end = _parse_day(start), _parse_day(end)
+    except ValueError:
+        raise click.BadParameter("Dates must be YYYY-MM-DD")
+
+    counts = backfill(start, end)
+    click.echo(", ".join(f"{name}: {count}" for name, count in counts.items()))
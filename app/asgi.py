@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+from urllib.parse import parse_qsl
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import request
+from werkzeug.exceptions import HTTPException
+
+from app.async_db import async_db
+
+
+# ----------------------------------------------------------------
+# ASGI APP
+# GETs routed to an endpoint in `views` (public_async.NATIVE_VIEWS)
+# run as coroutines on the event loop: the request context is
+# pushed in the request's task, the view awaits the async engine,
+# and no thread is held while the database works. everything else
+# (writes, auth, admin, product detail, NDJSON exports) runs the
+# Flask app as WSGI on a pool of ASGI_THREADS threads
+# ----------------------------------------------------------------
+class AsgiApp:
+    def __init__(self, app, views):
+        self.app = app
+        self.views = views
+        self.urls = app.url_map.bind("localhost")
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get("ASGI_THREADS", 4),
+            thread_name_prefix="asgi-sync",
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        exchange = _Exchange(self.app, self.executor)
+        view = self._native_view(scope)
+        if view is None:
+            await exchange(scope, receive, send)
+        else:
+            await exchange.native(view, scope, receive, send)
+
+    def _native_view(self, scope):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return None
+
+        path = scope["path"]
+        root = scope.get("root_path", "")
+        if root and path.startswith(root):
+            path = path[len(root):]
+
+        try:
+            endpoint, _ = self.urls.match(path, "GET")
+        except HTTPException:
+            return None
+
+        # streamed exports stay on the sync views
+        if ("format", "ndjson") in parse_qsl(scope["query_string"].decode("latin1")):
+            return None
+        return self.views.get(endpoint)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                with self.app.app_context():
+                    await async_db.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+
+class _Exchange(WsgiToAsgiInstance):
+    """One HTTP request, served natively or by the WSGI app."""
+
+    def __init__(self, app, executor):
+        super().__init__(app)
+        self.app = app
+        # asgiref runs sync code on a single shared thread by default;
+        # the Flask app is thread-safe, so give it the whole pool
+        self.run_wsgi_app = sync_to_async(
+            partial(WsgiToAsgiInstance.run_wsgi_app.__wrapped__, self),
+            thread_sensitive=False,
+            executor=executor,
+        )
+
+    async def native(self, view, scope, receive, send):
+        self.scope = scope
+        body = BytesIO()
+        while True:
+            message = await receive()
+            body.write(message.get("body", b""))
+            if message["type"] != "http.request" or not message.get("more_body"):
+                break
+        body.seek(0)
+
+        environ = self.build_environ(scope, body)
+        response = await self._dispatch(view, environ)
+
+        chunks, status, headers = response.get_wsgi_response(environ)
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+
+    async def _dispatch(self, view, environ):
+        # Flask.wsgi_app and full_dispatch_request, awaiting the view
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                return app.handle_exception(e)
+        finally:
+            ctx.pop(error)
@@ -0,0 +1,98 @@
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import sqlite_pragma_listener
+from app.extensions import db
+
+
+# sync backend -> async driver
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver known for {backend}, set ASYNC_DATABASE_URL")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+
+def _is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+
+# ----------------------------------------------------------------
+# ASYNC ENGINE
+# the native views of ASGI mode read through their own engines on
+# the same database (and the replica, when one is configured), so
+# a query awaits on the event loop instead of holding a thread.
+# engines are built on first use, in the worker process that runs
+# the loop, from the sync engines' resolved URLs so relative SQLite
+# paths land on the same file
+# ----------------------------------------------------------------
+class AsyncDatabase:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        uri = app.config.get("ASYNC_DATABASE_URL") or app.config["SQLALCHEMY_DATABASE_URI"]
+        if _is_memory_sqlite(uri):
+            # every engine gets a private in-memory database
+            raise RuntimeError("ASGI mode needs a file or server database, not in-memory SQLite")
+
+        app.extensions["async_db"] = {}
+
+    def engine(self, bind=None):
+        engines = current_app.extensions["async_db"]
+        if bind not in engines:
+            engines[bind] = self._create_engine(bind)
+        return engines[bind]
+
+    def _create_engine(self, bind):
+        config = current_app.config
+        override = config.get("ASYNC_REPLICA_URL" if bind == "replica" else "ASYNC_DATABASE_URL")
+        engine = create_async_engine(make_url(override) if override else async_url(db.engines[bind].url))
+
+        pragmas = config.get("SQLITE_PRAGMAS")
+        if pragmas and engine.dialect.name == "sqlite":
+            event.listen(engine.sync_engine, "connect", sqlite_pragma_listener(pragmas))
+
+        instrumentation = current_app.extensions.get("instrumentation")
+        if instrumentation is not None:
+            instrumentation.watch_engine(engine.sync_engine)
+
+        return engine
+
+    def _bind(self):
+        # reads follow the request onto the replica, like RoutingSession
+        if has_request_context() and g.get("use_replica") and "replica" in db.engines:
+            return "replica"
+        return None
+
+    async def all(self, stmt):
+        async with self.engine(self._bind()).connect() as conn:
+            return (await conn.execute(stmt)).all()
+
+    async def scalars(self, stmt):
+        async with self.engine(self._bind()).connect() as conn:
+            return (await conn.scalars(stmt)).all()
+
+    async def dispose(self):
+        engines = current_app.extensions["async_db"]
+        for engine in engines.values():
+            await engine.dispose()
+        engines.clear()
+
+
+
+async_db = AsyncDatabase()
@@ -0,0 +1,608 @@
+"""Load/benchmark harness for the API.
+
+    python -m app.bench --products 5000 --users 50 --concurrency 8 --duration 20
+    python -m app.bench --output run.json --compare baseline.json
+    python -m app.bench --server asgi --compare wsgi.json
+
+Seeds a synthetic catalog into a temporary SQLite database, then drives
+a weighted mix of browse, product detail, cart edits and checkout from
+concurrent virtual customers and reports throughput plus p50/p95/p99
+latency per endpoint.
+
+Requests are served in-process the way a production worker would:
+--server wsgi runs them on a pool of --threads threads (gunicorn
+gthread), --server asgi drives app.asgi_app on one event loop with
+the same number of threads for its sync routes (uvicorn).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+
+from app import create_app
+from app.categories import rebuild_tree
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import (
+    Cart, CartItem, Category, Product, ProductImage, ProductQnA, Review, User,
+    refresh_cart_totals, refresh_rating_summary,
+)
+from app.passwords import hasher
+from app.search import get_backend
+
+
+PASSWORD = "bench-password"
+
+DEFAULT_MIX = "browse=50,detail=30,cart=15,checkout=5"
+
+
+
+# ----------------------------------------------------------------
+# SEEDING
+# Core executemany inserts so large catalogs seed in seconds
+# ----------------------------------------------------------------
+def seed(scale, rng):
+    # one hash shared by every bench user, hashing is not under test here
+    pwhash = hasher.hash(PASSWORD)
+
+    db.session.execute(insert(User), [
+        {"name": f"Supplier {i}", "email": f"supplier{i}@bench.test",
+         "password_hash": pwhash, "role": "supplier"}
+        for i in range(scale["suppliers"])
+    ] + [
+        {"name": f"Customer {i}", "email": f"customer{i}@bench.test",
+         "password_hash": pwhash, "role": "customer"}
+        for i in range(scale["users"])
+    ])
+
+    supplier_ids = [u.id for u in User.query.filter_by(role="supplier")]
+    customer_ids = [u.id for u in User.query.filter_by(role="customer")]
+
+    # a two-level tree: a quarter of the categories are roots, the
+    # rest hang off them; paths and counts come from rebuild_tree()
+    roots = max(1, scale["categories"] // 4)
+    db.session.execute(insert(Category), [
+        {"name": f"Category {i}"} for i in range(roots)
+    ])
+    root_ids = [c.id for c in Category.query]
+    db.session.execute(insert(Category), [
+        {"name": f"Category {i}", "parent_id": root_ids[i % roots]}
+        for i in range(roots, scale["categories"])
+    ])
+    category_ids = [c.id for c in Category.query]
+
+    started = datetime(2024, 1, 1)
+    words = ["classic", "pro", "mini", "ultra", "eco", "smart", "travel", "home", "sport", "deluxe"]
+    nouns = ["lamp", "shoe", "kettle", "jacket", "speaker", "backpack", "mug", "chair", "watch", "desk"]
+
+    batch = []
+    for i in range(scale["products"]):
+        batch.append({
+            "supplier_id": rng.choice(supplier_ids),
+            "category_id": rng.choice(category_ids),
+            "title": f"{rng.choice(words).title()} {rng.choice(nouns)} {i}",
+            "description": f"A {rng.choice(words)} {rng.choice(nouns)} for everyday use.",
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": 1_000_000,     # checkout must not run dry during a run
+            "thumbnail": f"/img/{i}.jpg",
+            "created_at": started + timedelta(minutes=i),
+        })
+        if len(batch) >= 5000:
+            db.session.execute(insert(Product), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Product), batch)
+
+    product_ids = [pid for (pid,) in db.session.query(Product.id)]
+
+    db.session.execute(insert(ProductImage), [
+        {"product_id": pid, "image_url": f"/img/{pid}-{n}.jpg"}
+        for pid in product_ids for n in range(2)
+    ])
+
+    for rows, model in (
+        (scale["reviews"], Review),
+        (scale["reviews"] // 2, ProductQnA),
+    ):
+        batch = []
+        for pid in product_ids:
+            for n in range(rows):
+                row = {"product_id": pid, "user_id": rng.choice(customer_ids),
+                       "created_at": started + timedelta(hours=n)}
+                if model is Review:
+                    row.update(rating=rng.randint(1, 5), comment="Bench review")
+                else:
+                    row.update(question="Is it any good?", answer="Yes")
+                batch.append(row)
+            if len(batch) >= 5000:
+                db.session.execute(insert(model), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(model), batch)
+
+    db.session.execute(insert(Cart), [{"user_id": uid} for uid in customer_ids])
+    carts = {c.user_id: c.id for c in Cart.query}
+    db.session.execute(insert(CartItem), [
+        {"cart_id": carts[uid], "product_id": pid, "quantity": 1}
+        for uid in customer_ids
+        for pid in rng.sample(product_ids, min(3, len(product_ids)))
+    ])
+
+    # bulk inserts skip mapper events, so recompute what the listeners
+    # maintain: rating summaries, cart totals, the search index and
+    # the category tree, in one pass each
+    refresh_rating_summary(db.session)
+    refresh_cart_totals(db.session)
+    db.session.commit()
+
+    with db.engine.begin() as connection:
+        get_backend(connection.dialect.name).rebuild(connection)
+    rebuild_tree()
+
+    return customer_ids, product_ids, category_ids
+
+
+
+# ----------------------------------------------------------------
+# DATABASE LATENCY
+# --db-latency sleeps in the driver's thread on every statement, like
+# the round trip to a networked database: a sync driver holds the
+# request thread meanwhile, aiosqlite only its own connection thread
+# ----------------------------------------------------------------
+def add_db_latency(seconds):
+    def trace(statement):
+        time.sleep(seconds)
+
+    @event.listens_for(Engine, "connect")
+    def set_trace(dbapi_connection, connection_record):
+        # sqlite3 itself, or the one aiosqlite runs in its thread
+        raw = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+        getattr(raw, "_conn", raw).set_trace_callback(trace)
+
+
+
+# ----------------------------------------------------------------
+# SERVERS
+# each virtual customer blocks on its own request like an HTTP
+# client would, while the "server" side has a bounded budget:
+# WsgiClient hands requests to the gthread-style pool, AsgiClient
+# to an event loop in a background thread
+# ----------------------------------------------------------------
+class WsgiClient:
+    def __init__(self, client, pool):
+        self.client = client
+        self.pool = pool
+
+    def get(self, path):
+        return self.pool.submit(self.client.get, path).result()
+
+    def post(self, path, json=None):
+        return self.pool.submit(self.client.post, path, json=json).result()
+
+    def patch(self, path, json=None):
+        return self.pool.submit(self.client.patch, path, json=json).result()
+
+
+
+class AsgiResponse:
+    def __init__(self, status_code, headers, data):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+
+    def get_json(self):
+        return json.loads(self.data) if self.data else None
+
+
+
+class AsgiClient:
+    def __init__(self, application, loop):
+        self.application = application
+        self.loop = loop
+        self.cookies = {}
+
+    def get(self, path):
+        return self.open(path, "GET")
+
+    def post(self, path, json=None):
+        return self.open(path, "POST", json)
+
+    def patch(self, path, json=None):
+        return self.open(path, "PATCH", json)
+
+    def open(self, path, method="GET", body=None):
+        future = asyncio.run_coroutine_threadsafe(self._request(path, method, body), self.loop)
+        return future.result()
+
+    async def _request(self, path, method, body):
+        path, _, query = path.partition("?")
+        payload = json.dumps(body).encode() if body is not None else b""
+
+        headers = [(b"host", b"bench"), (b"content-length", str(len(payload)).encode())]
+        if body is not None:
+            headers.append((b"content-type", b"application/json"))
+        if self.cookies:
+            cookie = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+            headers.append((b"cookie", cookie.encode()))
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "", "headers": headers,
+            "server": ("bench", 80), "client": ("127.0.0.1", 0),
+        }
+        received = asyncio.Event()
+
+        async def receive():
+            if not received.is_set():
+                received.set()
+                return {"type": "http.request", "body": payload, "more_body": False}
+            # nothing more to read until the server is done with us
+            await asyncio.Event().wait()
+
+        status, response_headers, chunks = None, [], []
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status, response_headers = message["status"], message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.application(scope, receive, send)
+
+        for name, value in response_headers:
+            if name.lower() == b"set-cookie":
+                key, _, rest = value.decode().partition("=")
+                self.cookies[key] = rest.split(";", 1)[0]
+
+        return AsgiResponse(status, response_headers, b"".join(chunks))
+
+
+
+def start_event_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+
+# ----------------------------------------------------------------
+# WORKLOADS
+# each returns the endpoint label it exercised and the response
+# ----------------------------------------------------------------
+class VirtualCustomer:
+    def __init__(self, client, email, product_ids, category_ids, rng):
+        self.client = client
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.rng = rng
+
+        response = client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f"bench login failed for {email}: {response.status_code}")
+
+    def browse(self):
+        choice = self.rng.random()
+        if choice < 0.1:
+            return "GET /api/categories", self.client.get("/api/categories")
+        if choice < 0.25:
+            cid = self.rng.choice(self.category_ids)
+            return "GET /api/categories/<id>/products", self.client.get(
+                f"/api/categories/{cid}/products?limit=20"
+            )
+
+        args = {"limit": 20}
+        choice = self.rng.random()
+        if choice < 0.3:
+            args["category_id"] = self.rng.choice(self.category_ids)
+        elif choice < 0.5:
+            args["sort"] = self.rng.choice(["price_asc", "price_desc", "newest"])
+        if self.rng.random() < 0.4:
+            # deep page: keyset should make this as cheap as the first
+            if "sort" in args:
+                # sorted cursors carry the sort value, take one from a first page
+                first = self.client.get(f"/api/products?{urlencode(args)}").get_json()
+                if first["next_after"] is not None:
+                    args["after"] = first["next_after"]
+            else:
+                args["after"] = self.rng.choice(self.product_ids)
+
+        return "GET /api/products", self.client.get(f"/api/products?{urlencode(args)}")
+
+    def detail(self):
+        pid = self.rng.choice(self.product_ids)
+        if self.rng.random() < 0.5:
+            return "GET /api/products/<id>", self.client.get(
+                f"/api/products/{pid}?include=reviews,qna,rating_summary"
+            )
+        return "GET /api/products/<id>/reviews", self.client.get(f"/api/products/{pid}/reviews")
+
+    def cart(self):
+        choice = self.rng.random()
+        if choice < 0.3:
+            # badge polling
+            return "GET /api/customer/cart?summary=1", self.client.get("/api/customer/cart?summary=1")
+        if choice < 0.5:
+            return "GET /api/customer/cart", self.client.get("/api/customer/cart")
+
+        operations = [
+            {"op": "add", "product_id": self.rng.choice(self.product_ids), "quantity": self.rng.randint(1, 3)}
+            for _ in range(self.rng.randint(1, 3))
+        ]
+        return "PATCH /api/customer/cart", self.client.patch("/api/customer/cart", json={"operations": operations})
+
+    def checkout(self):
+        # make sure there is something to buy, then buy it
+        self.client.patch("/api/customer/cart", json={"operations": [
+            {"op": "add", "product_id": self.rng.choice(self.product_ids), "quantity": 1}
+        ]})
+        return "POST /api/customer/checkout", self.client.post("/api/customer/checkout")
+
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("browse", "detail", "cart", "checkout"):
+            raise argparse.ArgumentTypeError(f"unknown workload {name!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+
+# ----------------------------------------------------------------
+# RUNNER
+# ----------------------------------------------------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+
+def summarize(samples, errors, elapsed):
+    endpoints = {}
+    for label in sorted(set(samples) | set(errors)):
+        latencies = sorted(samples.get(label, []))
+        count = len(latencies)
+        endpoints[label] = {
+            "requests": count,
+            "errors": errors.get(label, 0),
+            "rps": round(count / elapsed, 2) if elapsed else None,
+            "mean_ms": round(sum(latencies) / count * 1000, 3) if count else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3) if count else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3) if count else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3) if count else None,
+        }
+
+    total = sum(len(v) for v in samples.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(errors.values()),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "endpoints": endpoints,
+    }
+
+
+
+def run_load(make_client, customers, product_ids, category_ids, args):
+    mix = parse_mix(args.mix)
+    names, weights = zip(*mix.items())
+
+    samples, errors = {}, {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    remaining = [args.requests] if args.requests else None
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        email = f"customer{index % len(customers)}@bench.test"
+        customer = VirtualCustomer(make_client(), email, product_ids, category_ids, rng)
+
+        local_samples, local_errors = {}, {}
+        while time.perf_counter() < deadline:
+            if remaining is not None:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+
+            workload = getattr(customer, rng.choices(names, weights)[0])
+            started = time.perf_counter()
+            label, response = workload()
+            elapsed = time.perf_counter() - started
+
+            if response.status_code >= 400:
+                local_errors[label] = local_errors.get(label, 0) + 1
+            else:
+                local_samples.setdefault(label, []).append(elapsed)
+
+        with lock:
+            for label, values in local_samples.items():
+                samples.setdefault(label, []).extend(values)
+            for label, count in local_errors.items():
+                errors[label] = errors.get(label, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return summarize(samples, errors, time.perf_counter() - started)
+
+
+
+def compare(result, baseline):
+    lines = [f"{'endpoint':36} {'rps':>16} {'p50 ms':>18} {'p99 ms':>18}"]
+    for label, now in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if not before:
+            continue
+        lines.append(
+            f"{label:36} "
+            f"{_delta(before['rps'], now['rps']):>16} "
+            f"{_delta(before['p50_ms'], now['p50_ms']):>18} "
+            f"{_delta(before['p99_ms'], now['p99_ms']):>18}"
+        )
+    lines.append(f"{'total':36} {_delta(baseline['throughput_rps'], result['throughput_rps']):>16}")
+    return "\n".join(lines)
+
+
+
+def _delta(before, now):
+    if not before or now is None:
+        return f"{now}"
+    return f"{now} ({(now - before) / before * 100:+.1f}%)"
+
+
+
+def print_report(result):
+    print(f"{'endpoint':36} {'req':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, stats in result["endpoints"].items():
+        print(
+            f"{label:36} {stats['requests']:>7} {stats['errors']:>5} {stats['rps'] or 0:>9} "
+            f"{stats['p50_ms'] or 0:>9} {stats['p95_ms'] or 0:>9} {stats['p99_ms'] or 0:>9}"
+        )
+    print(f"\n{result['requests']} requests, {result['errors']} errors in {result['elapsed_s']} s "
+          f"-> {result['throughput_rps']} req/s")
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------
+class BenchConfig(TestingConfig):
+    # responses are cached by default, pass --no-cache to measure the DB
+    CACHE_BACKEND = "lru"
+    SLOW_REQUEST_MS = 10_000
+    SLOW_REQUEST_QUERIES = 10_000
+
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app.bench", description=__doc__.split("\n\n")[0])
+    scale = parser.add_argument_group("dataset")
+    scale.add_argument("--products", type=int, default=2000)
+    scale.add_argument("--categories", type=int, default=20)
+    scale.add_argument("--suppliers", type=int, default=10)
+    scale.add_argument("--users", type=int, default=50)
+    scale.add_argument("--reviews", type=int, default=5, help="Reviews per product.")
+
+    load = parser.add_argument_group("load")
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--duration", type=float, default=10.0, help="Seconds to run.")
+    load.add_argument("--requests", type=int, default=0, help="Stop after this many requests.")
+    load.add_argument("--mix", default=DEFAULT_MIX, help=f"Workload weights, default {DEFAULT_MIX}.")
+    load.add_argument("--seed", type=int, default=1)
+    load.add_argument("--no-cache", action="store_true", help="Disable the response cache.")
+    load.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi",
+                      help="Serve through the WSGI app or the ASGI variant (native async catalog reads).")
+    load.add_argument("--threads", type=int, default=4,
+                      help="Request threads of the server (gthread threads, ASGI_THREADS).")
+    load.add_argument("--db-latency", type=float, default=0.0,
+                      help="Milliseconds added to every statement, to model a networked database.")
+
+    out = parser.add_argument_group("output")
+    out.add_argument("--database", help="SQLite file to use, defaults to a temp file.")
+    out.add_argument("--overwrite", action="store_true",
+                     help="Allow --database to name an existing file; its tables are dropped.")
+    out.add_argument("--output", help="Write the JSON result here.")
+    out.add_argument("--compare", help="Previous JSON result to diff against.")
+    return parser
+
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    if args.database:
+        # absolute, so Flask-SQLAlchemy doesn't resolve it into instance/
+        path = os.path.abspath(args.database)
+        if os.path.exists(path) and not args.overwrite:
+            parser.error(f"{path} exists and the bench drops every table in it, pass --overwrite to allow that")
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="ecommerce-bench-"), "bench.db")
+
+    class Config(BenchConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        CACHE_BACKEND = "null" if args.no_cache else "lru"
+        ASGI_THREADS = args.threads
+
+    app = create_app(Config, asgi=args.server == "asgi")
+    scale = {
+        "products": args.products, "categories": args.categories,
+        "suppliers": args.suppliers, "users": args.users, "reviews": args.reviews,
+    }
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        customers, product_ids, category_ids = seed(scale, random.Random(args.seed))
+        print(f"Seeded {scale} in {time.perf_counter() - started:.1f} s ({path})", file=sys.stderr)
+
+        if args.db_latency:
+            # only connections opened from here on get the delay
+            db.engine.dispose()
+            add_db_latency(args.db_latency / 1000)
+
+    if args.server == "asgi":
+        loop = start_event_loop()
+
+        def make_client():
+            return AsgiClient(app.asgi_app, loop)
+    else:
+        pool = ThreadPoolExecutor(max_workers=args.threads)
+
+        def make_client():
+            return WsgiClient(app.test_client(), pool)
+
+    result = run_load(make_client, customers, product_ids, category_ids, args)
+    result["config"] = {
+        "scale": scale,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "mix": args.mix,
+        "cache": not args.no_cache,
+        "server": args.server,
+        "threads": args.threads,
+        "db_latency_ms": args.db_latency,
+        "seed": args.seed,
+    }
+
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            print()
+            print(compare(result, json.load(fh)))
+
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import hashlib
+import inspect
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, attributes, object_session
+
+from app.config import worker_processes
+from app.models import Category, Product, ProductImage, ProductQnA, Review, User
+
+
+# ----------------------------------------------------------------
+# BACKENDS
+# both store opaque values under string keys plus integer versions
+# per tag; bumping a tag version orphans every entry built on it
+# ----------------------------------------------------------------
+class LRUBackend:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+
+class RedisBackend:
+    def __init__(self, url, ttl=60, prefix="ecommerce:cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='redis' needs the redis package installed")
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def versions(self, tags):
+        values = self.client.mget([self.prefix + "tag:" + tag for tag in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(self.prefix + "tag:" + tag)
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+    def size(self):
+        return None
+
+
+
+# ----------------------------------------------------------------
+# RESPONSE CACHE
+# config:
+#   CACHE_BACKEND    "lru" (default), "redis" or "null"; "lru" is
+#                    per process, so it is refused under several
+#                    workers (WEB_CONCURRENCY > 1) where invalidations
+#                    would not reach the other processes
+#   CACHE_MAXSIZE    entries kept by the LRU backend
+#   CACHE_TTL        seconds an entry lives
+#   CACHE_REDIS_URL  used by the redis backend
+# ----------------------------------------------------------------
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.get("CACHE_BACKEND", "lru")
+        ttl = app.config.get("CACHE_TTL", 60)
+
+        if name == "redis":
+            self.backend = RedisBackend(app.config["CACHE_REDIS_URL"], ttl=ttl)
+        elif name == "lru":
+            if worker_processes() > 1:
+                raise RuntimeError(
+                    "CACHE_BACKEND='lru' is per process and would serve stale entries "
+                    "with WEB_CONCURRENCY > 1, use 'redis' or 'null'"
+                )
+            self.backend = LRUBackend(app.config.get("CACHE_MAXSIZE", 1024), ttl=ttl)
+        else:
+            self.backend = None
+
+        app.extensions["response_cache"] = self
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def invalidate(self, tags):
+        if self.backend is None or not tags:
+            return
+        self.backend.bump(sorted(tags))
+        self._count("invalidations")
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "size": self.backend.size() if self.backend else 0,
+        }
+
+    def _key(self, tags):
+        args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        versions = ",".join(map(str, self.backend.versions(tags)))
+        return f"{request.path}?{args}#{versions}"
+
+    def cached(self, tags):
+        """Cache a GET view's 200 responses under the given tags.
+
+        `tags` is a list, or a callable taking the view kwargs. Works on
+        plain views and on the coroutine views of the ASGI mode.
+        """
+        def decorator(view):
+            if inspect.iscoroutinefunction(view):
+                @wraps(view)
+                async def async_wrapper(*args, **kwargs):
+                    if self.backend is None:
+                        return await view(*args, **kwargs)
+
+                    key, entry = self._lookup(tags, kwargs)
+                    if entry is None:
+                        return self._store(key, await view(*args, **kwargs))
+                    return self._serve(entry, "HIT")
+
+                return async_wrapper
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+
+                key, entry = self._lookup(tags, kwargs)
+                if entry is None:
+                    return self._store(key, view(*args, **kwargs))
+                return self._serve(entry, "HIT")
+
+            return wrapper
+        return decorator
+
+    def _lookup(self, tags, kwargs):
+        view_tags = tags(**kwargs) if callable(tags) else tags
+        key = self._key(view_tags)
+
+        entry = self.backend.get(key)
+        self._count("misses" if entry is None else "hits")
+        return key, entry
+
+    def _store(self, key, rv):
+        response = make_response(rv)
+        if response.status_code != 200 or response.is_streamed:
+            return response
+
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()
+        entry = (body, response.mimetype, etag)
+        self.backend.set(key, entry)
+        return self._serve(entry, "MISS")
+
+    def _serve(self, entry, state):
+        body, mimetype, etag = entry
+        if etag in request.if_none_match:
+            self._count("not_modified")
+            response = make_response("", 304)
+        else:
+            response = make_response(body)
+            response.mimetype = mimetype
+
+        response.set_etag(etag)
+        response.headers["X-Cache"] = state
+        return response
+
+
+
+cache = ResponseCache()
+
+
+
+# ----------------------------------------------------------------
+# INVALIDATION
+# mapper events collect tags on the session; they are only applied
+# after the transaction commits so readers never re-cache stale rows.
+# Core bulk writes that skip mapper events call mark_stale() instead.
+# ----------------------------------------------------------------
+def mark_stale(session, *tags):
+    session.info.setdefault("stale_cache_tags", set()).update(tags)
+
+
+
+def product_tags(product_id):
+    return ["products", f"product:{product_id}"]
+
+
+
+def _stale_tags(target):
+    if isinstance(target, Product):
+        return product_tags(target.id)
+    if isinstance(target, ProductImage):
+        return [f"product:{target.product_id}"]
+    if isinstance(target, Review):
+        return [f"product:{target.product_id}", f"reviews:{target.product_id}"]
+    if isinstance(target, ProductQnA):
+        return [f"product:{target.product_id}", f"qna:{target.product_id}"]
+    if isinstance(target, Category):
+        return ["categories"]
+    return []
+
+
+
+def _on_write(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        mark_stale(session, *_stale_tags(target))
+
+
+
+for model in (Product, ProductImage, Review, ProductQnA, Category):
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, _on_write)
+
+
+
+# product pages embed the supplier's name
+@event.listens_for(User, "after_update")
+def _supplier_renamed(mapper, connection, target):
+    session = object_session(target)
+    if session is None or not attributes.get_history(target, "name").has_changes():
+        return
+
+    product_ids = connection.execute(
+        select(Product.id).where(Product.supplier_id == target.id)
+    ).scalars().all()
+    mark_stale(session, *(f"product:{pid}" for pid in product_ids))
+
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    tags = session.info.pop("stale_cache_tags", None)
+    if tags:
+        cache.invalidate(tags)
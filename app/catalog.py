@@ -0,0 +1,384 @@
+import csv
+import io
+import json
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models import Category, Product, ProductImage, User, adjust_category_counts, record_stock_moves
+from app.search import index_products
+from app.cache import mark_stale
+from app.serializers import dumps
+
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+EXPORT_FIELDS = ("id", "title", "description", "price", "stock", "category", "thumbnail", "images")
+
+# images travel as a single "|" separated cell in CSV
+CSV_IMAGE_SEPARATOR = "|"
+
+
+class RowError(ValueError):
+    pass
+
+
+
+# ----------------------------------------------------------------
+# READERS
+# both yield (line_number, dict) one row at a time
+# ----------------------------------------------------------------
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+
+def read_ndjson(stream):
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, RowError(f"Invalid JSON: {exc}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError("Each line must be a JSON object")
+            continue
+        yield line_number, row
+
+
+
+READERS = {
+    "csv": read_csv,
+    "ndjson": read_ndjson,
+}
+
+
+
+# ----------------------------------------------------------------
+# VALIDATION
+# ----------------------------------------------------------------
+class CategoryLookup:
+    """Category name/id resolution held in memory for a whole import."""
+
+    def __init__(self):
+        rows = db.session.query(Category.id, Category.name).all()
+        self.by_name = {name.lower(): cid for cid, name in rows}
+        self.ids = {cid for cid, _ in rows}
+
+
+
+def _resolve_category(row, categories):
+    category_id = row.get("category_id")
+    if category_id not in (None, ""):
+        try:
+            category_id = int(category_id)
+        except (TypeError, ValueError):
+            raise RowError("category_id must be an integer")
+        if category_id not in categories.ids:
+            raise RowError(f"Unknown category_id: {category_id}")
+        return category_id
+
+    category = str(row.get("category") or "").strip()
+    if not category:
+        raise RowError("category or category_id is required")
+    if category.lower() not in categories.by_name:
+        raise RowError(f"Unknown category: {category!r}")
+    return categories.by_name[category.lower()]
+
+
+
+def validate_row(row, supplier_id, categories):
+    if isinstance(row, RowError):
+        raise row
+
+    title = str(row.get("title") or "").strip()
+    description = str(row.get("description") or "").strip()
+    if not title:
+        raise RowError("title is required")
+    if not description:
+        raise RowError("description is required")
+
+    try:
+        price = float(row.get("price"))
+    except (TypeError, ValueError):
+        raise RowError("price must be a number")
+    if price < 0:
+        raise RowError("price must not be negative")
+
+    stock = row.get("stock")
+    try:
+        stock = int(stock) if stock not in (None, "") else 0
+    except (TypeError, ValueError):
+        raise RowError("stock must be an integer")
+    if stock < 0:
+        raise RowError("stock must not be negative")
+
+    category_id = _resolve_category(row, categories)
+
+    images = row.get("images") or []
+    if isinstance(images, str):
+        images = [url.strip() for url in images.split(CSV_IMAGE_SEPARATOR) if url.strip()]
+    if not isinstance(images, list) or not all(isinstance(url, str) for url in images):
+        raise RowError("images must be a list of URLs")
+
+    product = {
+        "supplier_id": supplier_id,
+        "category_id": category_id,
+        "title": title,
+        "description": description,
+        "price": price,
+        "stock": stock,
+        "thumbnail": (row.get("thumbnail") or None),
+    }
+    return product, images
+
+
+
+# ----------------------------------------------------------------
+# BATCH INSERT
+# ----------------------------------------------------------------
+def _insert_products(batch):
+    products = [product for _, product, _ in batch]
+
+    ids = db.session.scalars(
+        insert(Product).returning(Product.id, sort_by_parameter_order=True),
+        products
+    ).all()
+
+    record_stock_moves(db.session, [
+        {
+            "product_id": product_id,
+            "supplier_id": product["supplier_id"],
+            "delta": product["stock"],
+            "balance": product["stock"],
+            "reason": "import",
+        }
+        for product_id, product in zip(ids, products)
+    ])
+
+    images = [
+        {"product_id": product_id, "image_url": url}
+        for product_id, (_, _, urls) in zip(ids, batch)
+        for url in urls
+    ]
+    if images:
+        db.session.execute(insert(ProductImage), images)
+
+    # bulk inserts skip mapper events, so index and count the batch explicitly
+    index_products(db.session.connection(), ids)
+    adjust_category_counts(db.session, Counter(product["category_id"] for product in products))
+    mark_stale(db.session, "products")
+
+    return len(ids)
+
+
+
+def flush_batch(batch, report):
+    if not batch:
+        return
+
+    try:
+        with db.session.begin_nested():
+            report.inserted += _insert_products(batch)
+    except SQLAlchemyError:
+        # isolate the failing rows instead of dropping the whole batch
+        for row in batch:
+            try:
+                with db.session.begin_nested():
+                    report.inserted += _insert_products([row])
+            except SQLAlchemyError as exc:
+                report.add_error(row[0], str(getattr(exc, "orig", None) or exc))
+
+    db.session.commit()
+
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def to_dict(self):
+        return {
+            "inserted": self.inserted,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+
+def import_products(stream, fmt, supplier_id, batch_size=None):
+    """Stream rows from a text stream into the catalog in batches."""
+    batch_size = batch_size or current_app.config.get("CATALOG_IMPORT_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    categories = CategoryLookup()
+    report = ImportReport()
+
+    batch = []
+    for line, row in READERS[fmt](stream):
+        try:
+            product, images = validate_row(row, supplier_id, categories)
+        except RowError as exc:
+            report.add_error(line, str(exc))
+            continue
+
+        batch.append((line, product, images))
+        if len(batch) >= batch_size:
+            flush_batch(batch, report)
+            batch = []
+
+    flush_batch(batch, report)
+    return report
+
+
+
+# ----------------------------------------------------------------
+# EXPORT
+# keyset batches over id, so memory stays flat for any catalog size
+# ----------------------------------------------------------------
+def iter_supplier_products(supplier_id, batch_size=DEFAULT_BATCH_SIZE):
+    after = 0
+    while True:
+        rows = db.session.execute(
+            select(
+                Product.id, Product.title, Product.description, Product.price,
+                Product.stock, Category.name, Product.thumbnail
+            )
+            .outerjoin(Category, Product.category_id == Category.id)
+            .where(Product.supplier_id == supplier_id, Product.id > after)
+            .order_by(Product.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+
+        images = {}
+        for product_id, url in db.session.execute(
+            select(ProductImage.product_id, ProductImage.image_url)
+            .where(ProductImage.product_id.in_([r[0] for r in rows]))
+            .order_by(ProductImage.id)
+        ):
+            images.setdefault(product_id, []).append(url)
+
+        for r in rows:
+            yield dict(zip(EXPORT_FIELDS, (*r, images.get(r[0], []))))
+
+        after = rows[-1][0]
+
+
+
+def export_ndjson(rows):
+    for row in rows:
+        yield dumps(row).decode() + "\n"
+
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+
+    for row in rows:
+        row["images"] = CSV_IMAGE_SEPARATOR.join(row["images"])
+        writer.writerow(row)
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+
+WRITERS = {
+    "csv": (export_csv, "text/csv"),
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+}
+
+
+def format_from_request(request):
+    fmt = request.args.get("format")
+    if fmt:
+        return fmt
+
+    mimetype = request.mimetype or ""
+    if "csv" in mimetype:
+        return "csv"
+    return "ndjson"
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# flask catalog import products.csv --supplier supplier@example.com
+# flask catalog export --supplier supplier@example.com > products.ndjson
+# ----------------------------------------------------------------
+catalog_cli = AppGroup("catalog", help="Bulk catalog import and export.")
+
+
+def _find_supplier(supplier):
+    query = User.query.filter_by(role="supplier")
+    if supplier.isdigit():
+        user = query.filter_by(id=int(supplier)).first()
+    else:
+        user = query.filter_by(email=supplier).first()
+
+    if not user:
+        raise click.BadParameter(f"No supplier {supplier!r}", param_hint="--supplier")
+    return user
+
+
+
+def _format_for_path(path, fmt):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+
+@catalog_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--supplier", required=True, help="Supplier id or email.")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="Defaults from the file extension.")
+@click.option("--batch-size", type=int, default=None)
+def import_command(path, supplier, fmt, batch_size):
+    """Import products from a CSV or NDJSON file."""
+    user = _find_supplier(supplier)
+
+    with open(path, newline="", encoding="utf-8") as stream:
+        report = import_products(stream, _format_for_path(path, fmt), user.id, batch_size)
+
+    click.echo(f"Inserted {report.inserted} products, {report.error_count} errors")
+    for error in report.errors:
+        click.echo(f"  line {error['line']}: {error['error']}", err=True)
+
+
+
+@catalog_cli.command("export")
+@click.option("--supplier", required=True, help="Supplier id or email.")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="ndjson")
+@click.option("--output", type=click.File("w", encoding="utf-8"), default="-")
+def export_command(supplier, fmt, output):
+    """Export a supplier's products as CSV or NDJSON."""
+    user = _find_supplier(supplier)
+
+    writer, _ = WRITERS[fmt]
+    for chunk in writer(iter_supplier_products(user.id)):
+        output.write(chunk)
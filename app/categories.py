@@ -0,0 +1,138 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.models import Category, Product
+
+
+# ----------------------------------------------------------------
+# TREE READS
+# one SELECT over the category table ordered by path puts every
+# parent before its children; counts come from the maintained
+# columns, the product table is never touched
+# ----------------------------------------------------------------
+def tree_select():
+    return (
+        select(
+            Category.id, Category.name, Category.parent_id,
+            Category.product_count, Category.subtree_product_count,
+        )
+        .order_by(Category.path, Category.id)
+    )
+
+
+
+def build_tree(rows):
+    nodes = {}
+    roots = []
+    for cid, name, parent_id, direct, total in rows:
+        node = {
+            "id": cid,
+            "name": name,
+            "product_count": total,
+            "direct_product_count": direct,
+            "children": [],
+        }
+        nodes[cid] = node
+
+        parent = nodes.get(parent_id)
+        if parent is None:
+            roots.append(node)
+        else:
+            parent["children"].append(node)
+
+    return roots
+
+
+
+def category_tree():
+    return build_tree(db.session.execute(tree_select()).all())
+
+
+
+def subtree_select(category_id):
+    """Ids of the category and every descendant, none if it does not exist."""
+    node_path = (
+        select(Category.path)
+        .where(Category.id == category_id)
+        .scalar_subquery()
+    )
+    return (
+        select(Category.id)
+        .where(Category.path.startswith(node_path))
+        .order_by(Category.id)
+    )
+
+
+
+def subtree_ids(category_id):
+    return db.session.scalars(subtree_select(category_id)).all()
+
+
+
+# ----------------------------------------------------------------
+# REBUILD
+# recomputes paths, depths and both counts from parent_id and the
+# product table; for categories or products written with Core
+# (seed scripts, bulk loads) or to repair drift
+# ----------------------------------------------------------------
+def rebuild_tree():
+    rows = db.session.query(Category.id, Category.parent_id).all()
+    children = {}
+    for cid, parent_id in rows:
+        children.setdefault(parent_id, []).append(cid)
+
+    paths = {}
+    stack = [(cid, "/", 0) for cid in children.get(None, [])]
+    while stack:
+        cid, prefix, depth = stack.pop()
+        path = f"{prefix}{cid}/"
+        paths[cid] = (path, depth)
+        stack.extend((child, path, depth + 1) for child in children.get(cid, []))
+
+    # a parent cycle leaves its members unreachable from any root
+    orphans = len(rows) - len(paths)
+
+    direct = dict(
+        db.session.query(Product.category_id, func.count(Product.id))
+        .group_by(Product.category_id)
+        .all()
+    )
+
+    totals = dict.fromkeys(paths, 0)
+    for cid, (path, _) in paths.items():
+        for ancestor in path.strip("/").split("/"):
+            totals[int(ancestor)] += direct.get(cid, 0)
+
+    if paths:
+        db.session.execute(db.update(Category), [
+            {
+                "id": cid,
+                "path": path,
+                "depth": depth,
+                "product_count": direct.get(cid, 0),
+                "subtree_product_count": totals[cid],
+            }
+            for cid, (path, depth) in paths.items()
+        ])
+
+    db.session.commit()
+    return {"categories": len(paths), "orphans": orphans}
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# flask categories rebuild
+# ----------------------------------------------------------------
+categories_cli = AppGroup("categories", help="Category tree maintenance.")
+
+
+@categories_cli.command("rebuild")
+def rebuild_command():
+    """Recompute category paths and product counts."""
+    result = rebuild_tree()
+    click.echo(f"Rebuilt {result['categories']} categories")
+    if result["orphans"]:
+        click.echo(f"{result['orphans']} categories sit in a parent cycle and were skipped")
@@ -0,0 +1,226 @@
+import os
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+
+def worker_processes():
+    """Server processes sharing this app (gunicorn/uvicorn WEB_CONCURRENCY)."""
+    return _env_int("WEB_CONCURRENCY", 1)
+
+
+
+def request_threads():
+    """Request threads per process (gunicorn gthread GUNICORN_THREADS)."""
+    return _env_int("GUNICORN_THREADS", 4)
+
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+
+# ----------------------------------------------------------------
+# CONFIG PROFILES
+# pick one with APP_CONFIG=development|testing|production;
+# every value can be overridden from the environment
+# ----------------------------------------------------------------
+class Config:
+    SECRET_KEY = os.environ.get("SECRET_KEY", "ecommercesite")
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///ecommerce.db")
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # optional read replica, used by public GET routes
+    DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+
+    # pool settings, ignored for SQLite which manages its own pool
+    DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+    DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+    DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+    DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+    # PostgreSQL only, 0 disables
+    DB_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+
+    # inventory: default low-stock threshold for suppliers without their
+    # own, and how long stock movements stay in the ledger
+    LOW_STOCK_THRESHOLD = _env_int("LOW_STOCK_THRESHOLD", 5)
+    STOCK_LEDGER_RETENTION_DAYS = _env_int("STOCK_LEDGER_RETENTION_DAYS", 90)
+
+    # response cache: "lru" lives in each process, so a tag bump only
+    # reaches the worker that handled the write and the others serve
+    # stale HITs until CACHE_TTL; with WEB_CONCURRENCY > 1 use "redis"
+    # (or "null"), create_app refuses "lru" there
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "lru")
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # session identities: "lru" forgets a changed user only in the
+    # worker that wrote it, so under several workers it drops to a 5 s
+    # TTL; "redis" shares the cache and its invalidations
+    IDENTITY_CACHE_BACKEND = os.environ.get("IDENTITY_CACHE_BACKEND", "lru")
+
+    # /api/admin/metrics: bearer token and/or client allow-list
+    # (comma separated addresses or networks)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    METRICS_ALLOWED_IPS = os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1")
+
+    # jsonify through orjson when it is installed
+    JSON_FAST_ENCODER = _env_bool("JSON_FAST_ENCODER", True)
+
+    # ASGI mode (asgi.py): the native catalog reads go through an
+    # async driver, derived from the sync URL (sqlite -> aiosqlite,
+    # postgresql -> asyncpg) when unset; every other route runs the
+    # Flask app on a pool of ASGI_THREADS threads per worker
+    ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL")
+    ASYNC_REPLICA_URL = os.environ.get("ASYNC_REPLICA_URL")
+    ASGI_THREADS = _env_int("ASGI_THREADS", 4)
+
+    # applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",
+        "busy_timeout": 5000,
+    }
+
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL", "sqlite://")
+    DATABASE_REPLICA_URL = None
+
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+
+
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+    DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+    DB_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 15000)
+
+    # production runs several workers, invalidations must reach them
+    # all: Redis when CACHE_REDIS_URL is given, otherwise no response
+    # cache and short-lived per-process identities
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "redis" if CACHE_REDIS_URL else "null")
+    IDENTITY_CACHE_BACKEND = os.environ.get(
+        "IDENTITY_CACHE_BACKEND", "redis" if CACHE_REDIS_URL else "lru"
+    )
+
+
+
+CONFIGS = {
+    "development": DevelopmentConfig,
+    "testing": TestingConfig,
+    "production": ProductionConfig,
+}
+
+
+def config_from_env():
+    return CONFIGS[os.environ.get("APP_CONFIG", "development")]
+
+
+
+# ----------------------------------------------------------------
+# ENGINE OPTIONS
+# turns the DB_* settings into SQLALCHEMY_ENGINE_OPTIONS / BINDS,
+# leaving anything the config class already set untouched
+# ----------------------------------------------------------------
+def engine_options(uri, config):
+    if uri.startswith("sqlite"):
+        return {}
+
+    options = {
+        "pool_size": config.get("DB_POOL_SIZE", 5),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 10),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 30),
+        "pool_pre_ping": config.get("DB_POOL_PRE_PING", True),
+    }
+
+    timeout = config.get("DB_STATEMENT_TIMEOUT_MS")
+    if timeout and uri.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={int(timeout)}"}
+
+    return options
+
+
+
+def configure_database(app):
+    config = app.config
+
+    config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        engine_options(config["SQLALCHEMY_DATABASE_URI"], config)
+    )
+
+    replica = config.get("DATABASE_REPLICA_URL")
+    if replica:
+        binds = dict(config.get("SQLALCHEMY_BINDS") or {})
+        binds.setdefault("replica", {"url": replica, **engine_options(replica, config)})
+        config["SQLALCHEMY_BINDS"] = binds
+
+
+
+def sqlite_pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return set_pragmas
+
+
+
+def apply_sqlite_pragmas(app, db):
+    pragmas = app.config.get("SQLITE_PRAGMAS") or {}
+    if not pragmas:
+        return
+
+    set_pragmas = sqlite_pragma_listener(pragmas)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", set_pragmas)
+
+
+
+# ----------------------------------------------------------------
+# READ REPLICA ROUTING
+# a request that sets g.use_replica reads through the "replica"
+# bind; flushes always go to the primary
+# ----------------------------------------------------------------
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and has_request_context()
+            and g.get("use_replica")
+        ):
+            replica = self._db.engines.get("replica")
+            if replica is not None:
+                return replica
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
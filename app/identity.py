@@ -0,0 +1,145 @@
+import threading
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.cache import LRUBackend, RedisBackend
+from app.config import worker_processes
+from app.extensions import db, login_manager
+from app.models import User
+
+
+# ----------------------------------------------------------------
+# USER IDENTITY
+# the handful of User columns a request needs for auth and role
+# checks; routes that need the full row load it themselves
+# ----------------------------------------------------------------
+class UserIdentity(UserMixin):
+    def __init__(self, id, name, email, role):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.role = role
+
+    def is_admin(self):
+        return self.role == "admin"
+
+    def is_supplier(self):
+        return self.role == "supplier"
+
+
+
+# ----------------------------------------------------------------
+# IDENTITY CACHE
+# config:
+#   IDENTITY_CACHE_BACKEND  "lru" (default) or "redis" (CACHE_REDIS_URL)
+#   IDENTITY_CACHE_MAXSIZE  identities kept by lru (default 10000)
+#   IDENTITY_CACHE_TTL      seconds before a re-read (default 300, or 5
+#                           for lru under several workers)
+# forget() only reaches the backend it runs against: with lru and
+# WEB_CONCURRENCY > 1 the other workers keep a changed or deleted user
+# for up to the TTL, hence the short default there. Use "redis" to
+# make role changes and deletions apply everywhere at once.
+# ----------------------------------------------------------------
+MULTI_WORKER_LRU_TTL = 5
+
+
+class IdentityCache:
+    def __init__(self, app=None):
+        self.backend = LRUBackend(maxsize=10000, ttl=300)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        if config.get("IDENTITY_CACHE_BACKEND", "lru") == "redis":
+            self.backend = RedisBackend(
+                config["CACHE_REDIS_URL"],
+                ttl=config.get("IDENTITY_CACHE_TTL", 300),
+                prefix="ecommerce:identity:",
+            )
+        else:
+            default_ttl = 300 if worker_processes() == 1 else MULTI_WORKER_LRU_TTL
+            self.backend = LRUBackend(
+                maxsize=config.get("IDENTITY_CACHE_MAXSIZE", 10000),
+                ttl=config.get("IDENTITY_CACHE_TTL", default_ttl),
+            )
+        app.extensions["identity_cache"] = self
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, user_id):
+        identity = self.backend.get(str(user_id))
+        if identity is not None:
+            self._count("hits")
+            return identity
+
+        self._count("misses")
+        row = (
+            db.session.query(User.id, User.name, User.email, User.role)
+            .filter(User.id == user_id)
+            .first()
+        )
+        if row is None:
+            return None
+
+        identity = UserIdentity(*row)
+        self.backend.set(str(user_id), identity)
+        return identity
+
+    def forget(self, user_ids):
+        for user_id in user_ids:
+            self.backend.delete(str(user_id))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "size": self.backend.size(),
+        }
+
+
+
+identity_cache = IdentityCache()
+
+
+
+# ----------------------------------------------------------------
+# LOGIN LOADER
+# ----------------------------------------------------------------
+@login_manager.user_loader
+def load_user(user_id):
+    return identity_cache.get(int(user_id))
+
+
+
+# ----------------------------------------------------------------
+# INVALIDATION
+# changed or deleted users drop out once their transaction commits
+# ----------------------------------------------------------------
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("stale_user_ids", set()).add(target.id)
+
+
+
+event.listen(User, "after_update", _user_changed)
+event.listen(User, "after_delete", _user_changed)
+
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_changed_users(session):
+    user_ids = session.info.pop("stale_user_ids", None)
+    if user_ids:
+        identity_cache.forget(user_ids)
@@ -0,0 +1,195 @@
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+
+# seconds, Prometheus-style upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# statements kept per request for the slow-request log
+MAX_LOGGED_STATEMENTS = 50
+
+
+
+# ----------------------------------------------------------------
+# ROUTE METRICS
+# latency histogram plus query/SQL-time totals per endpoint
+# ----------------------------------------------------------------
+class RouteMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.statuses = {}
+
+    def observe(self, endpoint, method, status, seconds, queries, sql_seconds):
+        with self._lock:
+            route = self.routes.get((endpoint, method))
+            if route is None:
+                route = self.routes[(endpoint, method)] = {
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                    "count": 0,
+                    "sum": 0.0,
+                    "queries": 0,
+                    "sql_seconds": 0.0,
+                }
+
+            for i, upper in enumerate(LATENCY_BUCKETS):
+                if seconds <= upper:
+                    route["buckets"][i] += 1
+            route["count"] += 1
+            route["sum"] += seconds
+            route["queries"] += queries
+            route["sql_seconds"] += sql_seconds
+
+            key = (endpoint, method, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+            self.statuses.clear()
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            routes = {k: dict(v, buckets=list(v["buckets"])) for k, v in self.routes.items()}
+            statuses = dict(self.statuses)
+
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (endpoint, method), route in sorted(routes.items()):
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            for upper, count in zip(LATENCY_BUCKETS, route["buckets"]):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{upper}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {route["count"]}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {route['sum']:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {route['count']}")
+
+        lines += [
+            "# HELP http_requests_total Requests by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (endpoint, method, status), count in sorted(statuses.items()):
+            lines.append(
+                f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}'
+            )
+
+        lines += [
+            "# HELP db_queries_total SQL statements issued by route.",
+            "# TYPE db_queries_total counter",
+        ]
+        for (endpoint, method), route in sorted(routes.items()):
+            lines.append(f'db_queries_total{{endpoint="{endpoint}",method="{method}"}} {route["queries"]}')
+
+        lines += [
+            "# HELP db_query_seconds_total Time spent in SQL by route.",
+            "# TYPE db_query_seconds_total counter",
+        ]
+        for (endpoint, method), route in sorted(routes.items()):
+            lines.append(
+                f'db_query_seconds_total{{endpoint="{endpoint}",method="{method}"}} {route["sql_seconds"]:.6f}'
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+
+# ----------------------------------------------------------------
+# INSTRUMENTATION
+# counts queries and SQL time per request from cursor events, adds
+# a Server-Timing header and logs slow or query-heavy requests.
+# config:
+#   INSTRUMENTATION_ENABLED   default True
+#   SLOW_REQUEST_MS           log requests slower than this (500)
+#   SLOW_REQUEST_QUERIES      log requests issuing more queries (50)
+# ----------------------------------------------------------------
+class Instrumentation:
+    def __init__(self, app=None, db=None):
+        self.metrics = RouteMetrics()
+
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        if not app.config.get("INSTRUMENTATION_ENABLED", True):
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        with app.app_context():
+            for engine in db.engines.values():
+                self.watch_engine(engine)
+
+        app.extensions["instrumentation"] = self
+
+    def watch_engine(self, engine):
+        """Count this engine's statements too (async engines: pass .sync_engine)."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    # -- SQL ------------------------------------------------------
+    # the start time rides on the statement's execution context, so a
+    # statement that raises (and never reaches after_cursor_execute)
+    # leaves nothing behind on the pooled connection
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_start", None)
+        if started is None or not has_request_context() or "sql_stats" not in g:
+            return
+
+        elapsed = time.perf_counter() - started
+        stats = g.sql_stats
+        stats["count"] += 1
+        stats["seconds"] += elapsed
+        if len(stats["statements"]) < MAX_LOGGED_STATEMENTS:
+            stats["statements"].append((elapsed, statement))
+
+    # -- requests -------------------------------------------------
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_stats = {"count": 0, "seconds": 0.0, "statements": []}
+
+    def _after_request(self, response):
+        if "request_started" not in g:
+            return response
+
+        elapsed = time.perf_counter() - g.request_started
+        stats = g.sql_stats
+        endpoint = request.endpoint or "unmatched"
+
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats["seconds"] * 1000:.2f};desc="{stats["count"]} queries", '
+            f"app;dur={elapsed * 1000:.2f}"
+        )
+
+        self.metrics.observe(
+            endpoint, request.method, response.status_code,
+            elapsed, stats["count"], stats["seconds"]
+        )
+
+        slow_ms = current_app.config.get("SLOW_REQUEST_MS", 500)
+        slow_queries = current_app.config.get("SLOW_REQUEST_QUERIES", 50)
+        if elapsed * 1000 >= slow_ms or stats["count"] >= slow_queries:
+            statements = "\n".join(
+                f"  {seconds * 1000:8.2f} ms  {' '.join(sql.split())}"
+                for seconds, sql in stats["statements"]
+            )
+            current_app.logger.warning(
+                "Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms SQL\n%s",
+                request.method, request.path, endpoint,
+                elapsed * 1000, stats["count"], stats["seconds"] * 1000, statements
+            )
+
+        return response
+
+
+
+instrumentation = Instrumentation()
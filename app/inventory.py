@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, literal, select
+
+from app.extensions import db
+from app.models import StockLedger, StockSnapshot
+
+
+DEFAULT_RETENTION_DAYS = 90
+
+
+
+# ----------------------------------------------------------------
+# LEDGER COMPACTION
+# every ledger row created before the cutoff is folded into one
+# StockSnapshot per product (movement count, net delta and the
+# balance after the last folded move), then deleted, so the ledger
+# only ever holds the retention window
+# ----------------------------------------------------------------
+def compact_ledger(cutoff):
+    upto = (
+        db.session.query(func.max(StockLedger.id))
+        .filter(StockLedger.created_at < cutoff)
+        .scalar()
+    )
+    if upto is None:
+        return {"snapshots": 0, "compacted": 0}
+
+    folded = (
+        select(
+            StockLedger.product_id,
+            func.count(StockLedger.id).label("movements"),
+            func.sum(StockLedger.delta).label("net_delta"),
+            func.max(StockLedger.id).label("last_id"),
+        )
+        .where(StockLedger.id <= upto, StockLedger.created_at < cutoff)
+        .group_by(StockLedger.product_id)
+        .subquery()
+    )
+    last = StockLedger.__table__.alias("last_move")
+
+    snapshots = db.session.execute(
+        insert(StockSnapshot).from_select(
+            ["product_id", "supplier_id", "period_end", "balance", "net_delta", "movements"],
+            select(
+                folded.c.product_id,
+                last.c.supplier_id,
+                literal(cutoff, db.DateTime),
+                last.c.balance,
+                folded.c.net_delta,
+                folded.c.movements,
+            )
+            .join(last, last.c.id == folded.c.last_id)
+        )
+    ).rowcount
+
+    compacted = (
+        db.session.query(StockLedger)
+        .filter(StockLedger.id <= upto, StockLedger.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+
+    db.session.commit()
+    return {"snapshots": snapshots, "compacted": compacted}
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# flask inventory compact [--days 90]
+# ----------------------------------------------------------------
+inventory_cli = AppGroup("inventory", help="Stock ledger maintenance.")
+
+
+@inventory_cli.command("compact")
+@click.option("--days", type=int, help="Keep this many days of movements, default STOCK_LEDGER_RETENTION_DAYS.")
+def compact_command(days):
+    """Fold old ledger rows into per-product snapshots."""
+    if days is None:
+        days = current_app.config.get("STOCK_LEDGER_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+
+    result = compact_ledger(datetime.utcnow() - timedelta(days=days))
+    click.echo(f"Compacted {result['compacted']} movement(s) into {result['snapshots']} snapshot(s)")
@@ -0,0 +1,404 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, or_, update
+
+from app.extensions import db
+from app.models import Job, Order, OrderItem, Product, User
+
+
+# ----------------------------------------------------------------
+# HANDLER REGISTRY
+#   @job_handler("order.confirmation")
+#   def send_confirmation(payload): ...
+# handlers run inside an app context and must be idempotent, a job
+# is delivered at least once
+# ----------------------------------------------------------------
+HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+
+# ----------------------------------------------------------------
+# ENQUEUE
+# adds rows to the caller's session, so they commit or roll back
+# with the business write (transactional outbox)
+# ----------------------------------------------------------------
+def enqueue(session, kind, payload=None, delay=0, max_attempts=None):
+    enqueue_many(session, [(kind, payload)], delay, max_attempts)
+
+
+
+def enqueue_many(session, jobs_to_add, delay=0, max_attempts=None):
+    if not jobs_to_add:
+        return
+
+    run_at = datetime.utcnow() + timedelta(seconds=delay)
+    attempts = max_attempts or current_app.config.get("JOBS_MAX_ATTEMPTS", 5)
+
+    session.execute(insert(Job), [
+        {
+            "kind": kind,
+            "payload": json.dumps(payload or {}),
+            "status": "pending",
+            "attempts": 0,
+            "max_attempts": attempts,
+            "run_at": run_at,
+            "created_at": datetime.utcnow(),
+        }
+        for kind, payload in jobs_to_add
+    ])
+
+
+
+# ----------------------------------------------------------------
+# WORKER METRICS
+# ----------------------------------------------------------------
+class JobMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.seconds = {}
+
+    def observe(self, kind, outcome, seconds=0.0):
+        with self._lock:
+            key = (kind, outcome)
+            self.counters[key] = self.counters.get(key, 0) + 1
+            self.seconds[kind] = self.seconds.get(kind, 0.0) + seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                f"{kind}:{outcome}": count
+                for (kind, outcome), count in sorted(self.counters.items())
+            }
+
+
+
+# ----------------------------------------------------------------
+# JOB QUEUE
+# config:
+#   JOBS_MAX_ATTEMPTS    attempts before a job is dead-lettered (5)
+#   JOBS_BACKOFF_BASE    seconds, doubled per failed attempt (2)
+#   JOBS_BACKOFF_MAX     cap on the retry delay in seconds (600)
+#   JOBS_LOCK_TIMEOUT    seconds before a running job is presumed
+#                        lost with its worker and reclaimed (300)
+#   JOBS_BATCH_SIZE      jobs claimed per poll (10)
+#   JOBS_POLL_INTERVAL   idle sleep between polls in seconds (1.0)
+# ----------------------------------------------------------------
+class JobQueue:
+    def __init__(self, app=None):
+        self.metrics = JobMetrics()
+        self.backoff_base = 2.0
+        self.backoff_max = 600.0
+        self.lock_timeout = 300
+        self.batch_size = 10
+        self.poll_interval = 1.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backoff_base = app.config.get("JOBS_BACKOFF_BASE", 2.0)
+        self.backoff_max = app.config.get("JOBS_BACKOFF_MAX", 600.0)
+        self.lock_timeout = app.config.get("JOBS_LOCK_TIMEOUT", 300)
+        self.batch_size = app.config.get("JOBS_BATCH_SIZE", 10)
+        self.poll_interval = app.config.get("JOBS_POLL_INTERVAL", 1.0)
+
+        app.extensions["jobs"] = self
+
+    def backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(0, attempts - 1))
+        # jitter keeps a burst of failures from retrying in lockstep
+        return delay * random.uniform(0.5, 1.0)
+
+    # -- claiming -------------------------------------------------
+    def claim(self, worker_id, limit=None):
+        """Lock up to `limit` due jobs for this worker and return them.
+
+        Candidates are read first, then each is taken with a conditional
+        UPDATE; a row another worker got to first simply doesn't match.
+        """
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lock_timeout)
+
+        candidates = [
+            job_id for (job_id,) in
+            db.session.query(Job.id)
+            .filter(or_(
+                (Job.status == "pending") & (Job.run_at <= now),
+                (Job.status == "running") & (Job.locked_at < stale),
+            ))
+            .order_by(Job.run_at, Job.id)
+            .limit(limit or self.batch_size)
+        ]
+
+        claimed = []
+        for job_id in candidates:
+            result = db.session.execute(
+                update(Job)
+                .where(
+                    Job.id == job_id,
+                    or_(
+                        (Job.status == "pending") & (Job.run_at <= now),
+                        (Job.status == "running") & (Job.locked_at < stale),
+                    )
+                )
+                .values(
+                    status="running",
+                    locked_at=now,
+                    locked_by=worker_id,
+                    attempts=Job.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                claimed.append(job_id)
+
+        db.session.commit()
+
+        if not claimed:
+            return []
+        return Job.query.filter(Job.id.in_(claimed)).order_by(Job.run_at, Job.id).all()
+
+    # -- running --------------------------------------------------
+    def run(self, job):
+        started = time.perf_counter()
+        handler = HANDLERS.get(job.kind)
+
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for {job.kind!r}")
+            handler(json.loads(job.payload or "{}"))
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            return self._failed(job, exc, time.perf_counter() - started)
+
+        self._finish(job.id, worker=job.locked_by, status="done", finished_at=datetime.utcnow(), last_error=None)
+        self.metrics.observe(job.kind, "succeeded", time.perf_counter() - started)
+        return "succeeded"
+
+    def _failed(self, job, exc, seconds):
+        error = f"{type(exc).__name__}: {exc}"
+
+        if job.attempts >= job.max_attempts:
+            self._finish(job.id, worker=job.locked_by, status="dead", finished_at=datetime.utcnow(), last_error=error)
+            self.metrics.observe(job.kind, "dead", seconds)
+            current_app.logger.error("Job %s (%s) dead after %d attempts: %s", job.id, job.kind, job.attempts, error)
+            return "dead"
+
+        run_at = datetime.utcnow() + timedelta(seconds=self.backoff(job.attempts))
+        self._finish(job.id, worker=job.locked_by, status="pending", run_at=run_at, last_error=error)
+        self.metrics.observe(job.kind, "retried", seconds)
+        current_app.logger.warning("Job %s (%s) attempt %d failed, retrying at %s: %s",
+                                   job.id, job.kind, job.attempts, run_at, error)
+        return "retried"
+
+    def _finish(self, job_id, worker, **values):
+        # only the worker still holding the lock may settle the job
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "running", Job.locked_by == worker)
+            .values(locked_at=None, locked_by=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def work(self, worker_id, stop, once=False):
+        """Poll and run jobs until `stop` is set, or the queue is empty with once=True."""
+        while not stop.is_set():
+            jobs = self.claim(worker_id)
+            for claimed in jobs:
+                self.run(claimed)
+            db.session.remove()
+
+            if not jobs:
+                if once:
+                    return
+                stop.wait(self.poll_interval)
+
+    # -- inspection -----------------------------------------------
+    def stats(self):
+        by_status = dict(
+            db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+        )
+        oldest = (
+            db.session.query(func.min(Job.run_at))
+            .filter(Job.status == "pending", Job.run_at <= datetime.utcnow())
+            .scalar()
+        )
+
+        return {
+            "pending": by_status.get("pending", 0),
+            "running": by_status.get("running", 0),
+            "done": by_status.get("done", 0),
+            "dead": by_status.get("dead", 0),
+            "oldest_due_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0,
+            "worker": self.metrics.snapshot(),
+        }
+
+
+
+jobs = JobQueue()
+
+
+
+# ----------------------------------------------------------------
+# DELIVERY
+# stand-in transport: log the message. swap for SMTP or a provider
+# client here, handlers only call deliver()
+# ----------------------------------------------------------------
+def deliver(recipient, subject, body):
+    current_app.logger.info("Notify %s: %s\n%s", recipient, subject, body)
+
+
+
+# ----------------------------------------------------------------
+# CHECKOUT HANDLERS
+# ----------------------------------------------------------------
+@job_handler("order.confirmation")
+def send_order_confirmation(payload):
+    order = db.session.get(Order, payload["order_id"])
+    if order is None:
+        return
+
+    user = db.session.get(User, order.user_id)
+    lines = (
+        db.session.query(OrderItem.title, OrderItem.quantity, OrderItem.price)
+        .filter(OrderItem.order_id == order.id)
+        .order_by(OrderItem.id)
+        .all()
+    )
+    body = "\n".join(f"{qty} x {title}  {price:.2f}" for title, qty, price in lines)
+    deliver(user.email, f"Order #{order.id} confirmed", f"{body}\nTotal: {order.total_amount:.2f}")
+
+
+
+@job_handler("order.notify_suppliers")
+def notify_suppliers(payload):
+    rows = (
+        db.session.query(User.email, OrderItem.title, OrderItem.quantity)
+        .join(Product, OrderItem.product_id == Product.id)
+        .join(User, Product.supplier_id == User.id)
+        .filter(OrderItem.order_id == payload["order_id"])
+        .order_by(User.email, OrderItem.id)
+        .all()
+    )
+
+    by_supplier = {}
+    for email, title, quantity in rows:
+        by_supplier.setdefault(email, []).append(f"{quantity} x {title}")
+
+    for email, lines in by_supplier.items():
+        deliver(email, f"New order #{payload['order_id']}", "\n".join(lines))
+
+
+
+@job_handler("stock.check_alerts")
+def check_stock_alerts(payload):
+    # each supplier's own threshold, the site default otherwise
+    threshold = func.coalesce(User.low_stock_threshold, current_app.config.get("LOW_STOCK_THRESHOLD", 5))
+
+    rows = (
+        db.session.query(User.email, Product.id, Product.title, Product.stock)
+        .join(User, Product.supplier_id == User.id)
+        .filter(Product.id.in_(payload.get("product_ids") or []), Product.stock <= threshold)
+        .all()
+    )
+
+    for email, product_id, title, stock in rows:
+        deliver(email, f"Low stock: {title}", f"Product {product_id} has {stock} left")
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# flask jobs worker [--concurrency N] [--once]
+# flask jobs stats | retry-dead | purge
+# ----------------------------------------------------------------
+jobs_cli = AppGroup("jobs", help="Background job queue.")
+
+
+@jobs_cli.command("worker")
+@click.option("--concurrency", default=2, show_default=True, help="Worker threads.")
+@click.option("--once", is_flag=True, help="Exit once no jobs are due.")
+def worker_command(concurrency, once):
+    """Run jobs until interrupted."""
+    app = current_app._get_current_object()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+
+    def loop(index):
+        with app.app_context():
+            jobs.work(f"{prefix}:{index}", stop, once=once)
+
+    threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+
+    click.echo(f"Job worker {prefix} running {concurrency} thread(s)")
+    try:
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=0.5)
+    except KeyboardInterrupt:
+        click.echo("Stopping, letting claimed jobs finish")
+        stop.set()
+        for t in threads:
+            t.join()
+
+    click.echo(json.dumps(jobs.metrics.snapshot(), indent=2))
+
+
+
+@jobs_cli.command("stats")
+def stats_command():
+    """Queue depth by status."""
+    click.echo(json.dumps(jobs.stats(), indent=2))
+
+
+
+@jobs_cli.command("retry-dead")
+@click.option("--kind", help="Only requeue jobs of this kind.")
+def retry_dead_command(kind):
+    """Move dead-lettered jobs back to pending with fresh attempts."""
+    query = update(Job).where(Job.status == "dead")
+    if kind:
+        query = query.where(Job.kind == kind)
+
+    result = db.session.execute(
+        query.values(status="pending", attempts=0, run_at=datetime.utcnow(), finished_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    click.echo(f"Requeued {result.rowcount} job(s)")
+
+
+
+@jobs_cli.command("purge")
+@click.option("--days", default=7, show_default=True, help="Delete finished jobs older than this.")
+def purge_command(days):
+    """Delete done jobs older than --days; dead jobs are kept for inspection."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = (
+        Job.query
+        .filter(Job.status == "done", Job.finished_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    click.echo(f"Deleted {deleted} job(s)")
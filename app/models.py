@@ -1,16 +1,9 @@
 from datetime import datetime
-from app.extensions import db, login_manager
+from sqlalchemy import case, event, func, inspect, literal, select
+from sqlalchemy.orm.attributes import set_committed_value
+from app.extensions import db
+from app.passwords import hasher
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-
-
-# ----------------------------------------------------------------
-# LOGIN LOADER
-# ----------------------------------------------------------------
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
 
 
 # ----------------------------------------------------------------
@@ -26,6 +19,10 @@ class User(db.Model, UserMixin):
 
     role = db.Column(db.String(20), nullable=False, default="customer")
 
+    # suppliers only: products at or below this stock are "low",
+    # NULL falls back to LOW_STOCK_THRESHOLD
+    low_stock_threshold = db.Column(db.Integer, nullable=True)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # relationships
@@ -39,11 +36,12 @@ class User(db.Model, UserMixin):
     def is_supplier(self):
         return self.role == "supplier"
 
+    # hashing runs in the app's password pool, see app/passwords.py
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
     
 
 
@@ -54,7 +52,25 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False, unique=True)
 
+    # tree position as a materialized path of ancestor ids, "/1/4/9/"
+    # for category 9 under 4 under 1; a subtree is a path prefix scan.
+    # set on insert and rewritten on move by the listeners below
+    parent_id = db.Column(db.Integer, db.ForeignKey("category.id", name="fk_category_parent_id"), nullable=True)
+    path = db.Column(db.String(255), nullable=True)
+    depth = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # products filed directly under this node / under the whole subtree,
+    # kept in step with Product writes by the listeners below
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    subtree_product_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     products = db.relationship("Product", backref="category", lazy=True)
+    parent = db.relationship("Category", remote_side=[id], backref="children")
+
+    __table_args__ = (
+        db.Index("ix_category_path", "path"),
+        db.Index("ix_category_parent", "parent_id"),
+    )
 
 
 
@@ -77,10 +93,47 @@ class Product(db.Model):
     thumbnail = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # denormalized rating summary, kept in step with Review writes
+    # by the listeners at the bottom of this module
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     images = db.relationship("ProductImage", backref="product", lazy=True)
     reviews = db.relationship("Review", backref="product", lazy=True)
     qna = db.relationship("ProductQnA", backref="product", lazy=True)
 
+    # composite indexes backing the supplier catalog and the /api/products
+    # filter + sort combinations, every key ends with id so keyset pages
+    # never fall back to a sort step
+    __table_args__ = (
+        db.Index("ix_product_supplier_id", "supplier_id", "id"),
+        # low-stock listing: range scan on stock within one supplier
+        db.Index("ix_product_supplier_stock", "supplier_id", "stock", "id"),
+        db.Index("ix_product_category_id", "category_id", "id"),
+        db.Index("ix_product_category_price", "category_id", "price", "id"),
+        db.Index("ix_product_category_created", "category_id", "created_at", "id"),
+        db.Index("ix_product_price", "price", "id"),
+        db.Index("ix_product_created", "created_at", "id"),
+    )
+
+    def rating_summary(self):
+        histogram = {
+            str(stars): getattr(self, f"rating_{stars}_count") or 0
+            for stars in range(1, 6)
+        }
+        count = self.rating_count or 0
+
+        return {
+            "count": count,
+            "average": round(self.rating_sum / count, 2) if count else None,
+            "histogram": histogram,
+        }
+
 
 
 # ----------------------------------------------------------------
@@ -91,6 +144,11 @@ class ProductImage(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
     image_url = db.Column(db.String(200), nullable=False)    
 
+    # detail pages and the catalog export load images by product
+    __table_args__ = (
+        db.Index("ix_product_image_product", "product_id"),
+    )
+
 
 
 # ----------------------------------------------------------------
@@ -101,6 +159,16 @@ class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), unique=True)
 
+    # set when an empty cart gets its first item, cleared when it
+    # empties again; each transition counts as a started cart
+    started_at = db.Column(db.DateTime, nullable=True)
+
+    # totals snapshot, rewritten by refresh_cart_totals() on every cart
+    # or price change; version lets clients poll cheaply
+    subtotal = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     items = db.relationship("CartItem", backref="cart", lazy=True, cascade="all, delete")
 
 
@@ -118,6 +186,13 @@ class CartItem(db.Model):
 
     product = db.relationship("Product")
 
+    # one row per product per cart, target of the cart upserts
+    __table_args__ = (
+        db.UniqueConstraint("cart_id", "product_id", name="uq_cart_item_cart_product"),
+        # carts holding a product, for price change fan-out
+        db.Index("ix_cart_item_product", "product_id"),
+    )
+
 
 
 # ----------------------------------------------------------------
@@ -132,8 +207,17 @@ class Order(db.Model):
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(50), default="pending")
 
+    # client supplied, makes checkout retries return the original order
+    idempotency_key = db.Column(db.String(100), nullable=True)
+
     items = db.relationship("OrderItem", backref="order", lazy=True, cascade="all, delete")
 
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "idempotency_key", name="uq_order_user_idempotency_key"),
+        # order history, newest first per customer
+        db.Index("ix_order_user_created", "user_id", "created_at", "id"),
+    )
+
 
 
 # ----------------------------------------------------------------
@@ -148,8 +232,18 @@ class OrderItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)     # snapshot of price at time of purchase
 
+    # snapshot of the listing at purchase, history never joins the catalog
+    title = db.Column(db.String(200), nullable=True)
+    thumbnail = db.Column(db.String(200), nullable=True)
+
     product = db.relationship("Product")
 
+    __table_args__ = (
+        # per-product sales aggregates for the supplier dashboard
+        db.Index("ix_order_item_product", "product_id", "quantity", "price"),
+        db.Index("ix_order_item_order", "order_id"),
+    )
+
 
 
 # ----------------------------------------------------------------
@@ -167,6 +261,12 @@ class Review(db.Model):
 
     user = db.relationship("User")
 
+    # per-product keyset pages sorted by date or rating
+    __table_args__ = (
+        db.Index("ix_review_product_created", "product_id", "created_at", "id"),
+        db.Index("ix_review_product_rating", "product_id", "rating", "id"),
+    )
+
 
 
 # ----------------------------------------------------------------
@@ -183,4 +283,455 @@ class ProductQnA(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship("User")
-    
+
+    __table_args__ = (
+        db.Index("ix_product_qna_product_created", "product_id", "created_at", "id"),
+    )
+
+
+
+# ----------------------------------------------------------------
+# STOCK LEDGER
+# append-only, one row per stock movement written in the same
+# transaction as the change; `balance` is the stock after the move.
+# rows older than the retention window are folded into StockSnapshot
+# by `flask inventory compact` (see app/inventory.py)
+# REASONS: create, manual, import, checkout, batch, opening (migration)
+# ----------------------------------------------------------------
+class StockLedger(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    supplier_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    delta = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(30), nullable=False)
+    reference = db.Column(db.String(100), nullable=True)     # e.g. "order:42"
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_stock_ledger_product", "product_id", "id"),
+        db.Index("ix_stock_ledger_created", "created_at", "id"),
+    )
+
+
+
+class StockSnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    supplier_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    # the compacted movements, all created before period_end
+    period_end = db.Column(db.DateTime, nullable=False)
+    balance = db.Column(db.Integer, nullable=False)
+    net_delta = db.Column(db.Integer, nullable=False)
+    movements = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_stock_snapshot_product", "product_id", "period_end"),
+    )
+
+
+
+# ----------------------------------------------------------------
+# SALES ROLLUPS
+# one row per day (and per category / supplier / product), kept
+# current by checkout and rebuilt with `flask analytics backfill`
+# (see app/analytics.py)
+# ----------------------------------------------------------------
+class SalesDaily(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    carts_started = db.Column(db.Integer, nullable=False, default=0)
+
+
+
+class SalesDailyCategory(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey("category.id"), primary_key=True)
+
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
+
+class SalesDailySupplier(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
+
+class SalesDailyProduct(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
+
+# ----------------------------------------------------------------
+# BACKGROUND JOBS
+# outbox rows written in the same transaction as the change that
+# caused them, drained by `flask jobs worker` (see app/jobs.py)
+# STATUS: pending, running, done, dead
+# ----------------------------------------------------------------
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+
+    kind = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # workers poll for due pending jobs and reclaim stale running ones
+    __table_args__ = (
+        db.Index("ix_job_status_run_at", "status", "run_at"),
+    )
+
+
+
+# ----------------------------------------------------------------
+# RATING SUMMARY MAINTENANCE
+# every Review write adjusts the product's aggregate columns with a
+# single relative UPDATE, so reads never recompute from the reviews
+# ----------------------------------------------------------------
+def _apply_rating(connection, product_id, rating, sign):
+    if product_id is None or rating is None:
+        return
+
+    product = Product.__table__
+    values = {
+        "rating_count": product.c.rating_count + sign,
+        "rating_sum": product.c.rating_sum + sign * rating,
+    }
+    if 1 <= rating <= 5:
+        column = f"rating_{rating}_count"
+        values[column] = product.c[column] + sign
+
+    connection.execute(
+        product.update().where(product.c.id == product_id).values(**values)
+    )
+
+
+
+def _previous_value(target, attr):
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+
+
+@event.listens_for(Review, "after_insert")
+def _review_inserted(mapper, connection, target):
+    _apply_rating(connection, target.product_id, target.rating, 1)
+
+
+
+@event.listens_for(Review, "after_update")
+def _review_updated(mapper, connection, target):
+    old_product_id = _previous_value(target, "product_id")
+    old_rating = _previous_value(target, "rating")
+
+    if old_product_id == target.product_id and old_rating == target.rating:
+        return
+
+    _apply_rating(connection, old_product_id, old_rating, -1)
+    _apply_rating(connection, target.product_id, target.rating, 1)
+
+
+
+@event.listens_for(Review, "after_delete")
+def _review_deleted(mapper, connection, target):
+    _apply_rating(connection, target.product_id, target.rating, -1)
+
+
+
+def refresh_rating_summary(executor, product_ids=None):
+    """Recompute the summary from the reviews, for rows written in bulk."""
+    product = Product.__table__
+    review = Review.__table__
+
+    def reviews(*columns, where=()):
+        return (
+            select(*columns)
+            .where(review.c.product_id == product.c.id, *where)
+            .scalar_subquery()
+        )
+
+    values = {
+        "rating_count": reviews(func.count()),
+        "rating_sum": reviews(func.coalesce(func.sum(review.c.rating), 0)),
+    }
+    for stars in range(1, 6):
+        values[f"rating_{stars}_count"] = reviews(func.count(), where=(review.c.rating == stars,))
+
+    stmt = product.update().values(**values)
+    if product_ids is not None:
+        stmt = stmt.where(product.c.id.in_(list(product_ids)))
+
+    return executor.execute(stmt)
+
+
+
+# ----------------------------------------------------------------
+# CART TOTALS MAINTENANCE
+# one UPDATE recomputes subtotal/item_count and bumps version for
+# every affected cart, either the carts given or every cart holding
+# one of the given products
+# ----------------------------------------------------------------
+def refresh_cart_totals(executor, cart_ids=None, product_ids=None):
+    """`executor` is a Session or Connection inside the write's transaction."""
+    cart = Cart.__table__
+    item = CartItem.__table__
+    product = Product.__table__
+
+    subtotal = (
+        select(func.coalesce(func.sum(item.c.quantity * product.c.price), 0.0))
+        .select_from(item.join(product, item.c.product_id == product.c.id))
+        .where(item.c.cart_id == cart.c.id)
+        .scalar_subquery()
+    )
+    item_count = (
+        select(func.coalesce(func.sum(item.c.quantity), 0))
+        .where(item.c.cart_id == cart.c.id)
+        .scalar_subquery()
+    )
+
+    stmt = cart.update().values(
+        subtotal=subtotal,
+        item_count=item_count,
+        version=cart.c.version + 1,
+    )
+    if cart_ids is not None:
+        stmt = stmt.where(cart.c.id.in_(list(cart_ids)))
+    if product_ids is not None:
+        stmt = stmt.where(cart.c.id.in_(
+            select(item.c.cart_id).where(item.c.product_id.in_(list(product_ids)))
+        ))
+
+    return executor.execute(stmt)
+
+
+
+@event.listens_for(Product, "after_update")
+def _product_price_changed(mapper, connection, target):
+    if inspect(target).attrs.price.history.has_changes():
+        refresh_cart_totals(connection, product_ids=[target.id])
+
+
+
+# ----------------------------------------------------------------
+# STOCK LEDGER MAINTENANCE
+# ORM writes are recorded from mapper events; Core UPDATEs (checkout,
+# batch updates, imports) call record_stock_moves() themselves
+# ----------------------------------------------------------------
+def record_stock_moves(executor, moves):
+    """`moves` is [{product_id, supplier_id, delta, balance, reason, reference}]."""
+    moves = [move for move in moves if move["delta"]]
+    if not moves:
+        return
+
+    now = datetime.utcnow()
+    executor.execute(StockLedger.__table__.insert(), [
+        {"reference": None, "created_at": now, **move} for move in moves
+    ])
+
+
+
+@event.listens_for(Product, "after_insert")
+def _product_stock_created(mapper, connection, target):
+    record_stock_moves(connection, [{
+        "product_id": target.id,
+        "supplier_id": target.supplier_id,
+        "delta": target.stock or 0,
+        "balance": target.stock or 0,
+        "reason": "create",
+    }])
+
+
+
+@event.listens_for(Product, "after_update")
+def _product_stock_changed(mapper, connection, target):
+    history = inspect(target).attrs.stock.history
+    if not history.has_changes():
+        return
+
+    old = history.deleted[0] if history.deleted else 0
+    record_stock_moves(connection, [{
+        "product_id": target.id,
+        "supplier_id": target.supplier_id,
+        "delta": (target.stock or 0) - (old or 0),
+        "balance": target.stock or 0,
+        "reason": "manual",
+    }])
+
+
+
+# ----------------------------------------------------------------
+# CATEGORY TREE MAINTENANCE
+# counts move by relative UPDATEs on the node and its ancestors, the
+# ancestors being every category whose path prefixes the node's, so
+# the tree is read without counting products. Core bulk inserts call
+# adjust_category_counts() themselves
+# ----------------------------------------------------------------
+def _ancestors_of(category, path):
+    """Rows of `category` (a table) on the root-to-node chain of `path`."""
+    return path.startswith(category.c.path)
+
+
+
+def adjust_category_counts(executor, deltas):
+    """`deltas` is {category_id: change in product count}."""
+    category = Category.__table__
+
+    for category_id, delta in sorted(deltas.items()):
+        if category_id is None or not delta:
+            continue
+
+        node_path = (
+            select(category.c.path)
+            .where(category.c.id == category_id)
+            .scalar_subquery()
+        )
+        executor.execute(
+            category.update()
+            .where(_ancestors_of(category, node_path))
+            .values(
+                subtree_product_count=category.c.subtree_product_count + delta,
+                product_count=category.c.product_count + case(
+                    (category.c.id == category_id, delta), else_=0
+                ),
+            )
+        )
+
+
+
+def _parent_position(connection, parent_id):
+    if parent_id is None:
+        return "/", 0
+
+    category = Category.__table__
+    row = connection.execute(
+        select(category.c.path, category.c.depth).where(category.c.id == parent_id)
+    ).first()
+    if row is None or row.path is None:
+        raise ValueError(f"Unknown parent category: {parent_id}")
+    return row.path, row.depth + 1
+
+
+
+@event.listens_for(Category, "after_insert")
+def _category_inserted(mapper, connection, target):
+    prefix, depth = _parent_position(connection, target.parent_id)
+    path = f"{prefix}{target.id}/"
+
+    category = Category.__table__
+    connection.execute(
+        category.update().where(category.c.id == target.id).values(path=path, depth=depth)
+    )
+    set_committed_value(target, "path", path)
+    set_committed_value(target, "depth", depth)
+
+
+
+@event.listens_for(Category, "before_update")
+def _category_moving(mapper, connection, target):
+    if not inspect(target).attrs.parent_id.history.has_changes():
+        return
+    if target.parent_id is None or target.path is None:
+        return
+
+    prefix, _ = _parent_position(connection, target.parent_id)
+    if prefix.startswith(target.path):
+        raise ValueError("A category cannot be moved under its own subtree")
+
+
+
+@event.listens_for(Category, "after_update")
+def _category_moved(mapper, connection, target):
+    if not inspect(target).attrs.parent_id.history.has_changes():
+        return
+
+    category = Category.__table__
+    old_path, old_depth, moved = connection.execute(
+        select(category.c.path, category.c.depth, category.c.subtree_product_count)
+        .where(category.c.id == target.id)
+    ).one()
+    if old_path is None:
+        return
+
+    prefix, depth = _parent_position(connection, target.parent_id)
+    new_path = f"{prefix}{target.id}/"
+
+    # take the subtree's products off the old ancestors ...
+    connection.execute(
+        category.update()
+        .where(_ancestors_of(category, literal(old_path)), category.c.id != target.id)
+        .values(subtree_product_count=category.c.subtree_product_count - moved)
+    )
+    # ... re-root every path in the subtree ...
+    connection.execute(
+        category.update()
+        .where(category.c.path.startswith(old_path))
+        .values(
+            path=literal(new_path) + func.substr(category.c.path, len(old_path) + 1),
+            depth=category.c.depth + (depth - old_depth),
+        )
+    )
+    # ... and add them to the new ones
+    connection.execute(
+        category.update()
+        .where(_ancestors_of(category, literal(new_path)), category.c.id != target.id)
+        .values(subtree_product_count=category.c.subtree_product_count + moved)
+    )
+    set_committed_value(target, "path", new_path)
+    set_committed_value(target, "depth", depth)
+
+
+
+@event.listens_for(Product, "after_insert")
+def _product_filed(mapper, connection, target):
+    adjust_category_counts(connection, {target.category_id: 1})
+
+
+
+@event.listens_for(Product, "after_update")
+def _product_refiled(mapper, connection, target):
+    history = inspect(target).attrs.category_id.history
+    if not history.has_changes():
+        return
+
+    old = history.deleted[0] if history.deleted else None
+    if old == target.category_id:
+        return
+    adjust_category_counts(connection, {old: -1, target.category_id: 1})
+
+
+
+@event.listens_for(Product, "after_delete")
+def _product_unfiled(mapper, connection, target):
+    adjust_category_counts(connection, {target.category_id: -1})
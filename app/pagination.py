@@ -0,0 +1,133 @@
+from datetime import datetime
+
+from flask import abort, jsonify, make_response, request
+from sqlalchemy import and_, or_
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+# ----------------------------------------------------------------
+# REQUEST ARGS
+# ?after=<cursor>&limit=<n>; the cursor is the next_after of the
+# previous page, an id or "<sort value>,<id>"
+# ----------------------------------------------------------------
+def invalid_cursor():
+    abort(make_response(jsonify({"error": "Invalid after cursor, restart from the first page"}), 400))
+
+
+
+def page_args(default_limit=DEFAULT_LIMIT, max_limit=MAX_LIMIT):
+    after = request.args.get("after")
+    if after is not None:
+        after = int(after) if after.isdigit() else after
+        if isinstance(after, str) and not after.rpartition(",")[2].isdigit():
+            invalid_cursor()
+
+    limit = request.args.get("limit", default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    return after, limit
+
+
+
+# ----------------------------------------------------------------
+# KEYSET PAGE
+# fetch one extra row to know whether another page exists
+# ----------------------------------------------------------------
+def keyset_page(query, limit, key=lambda row: row.id):
+    return keyset_rows(query.limit(limit + 1).all(), limit, key)
+
+
+
+def keyset_rows(rows, limit, key=lambda row: row.id):
+    """Split up to limit + 1 fetched rows into (page, next_after)."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_after = key(rows[-1]) if has_more and rows else None
+    return rows, next_after
+
+
+
+# ----------------------------------------------------------------
+# KEYSET ORDERING
+# rows are ordered by (column, id) so ties on column stay stable.
+# a listing sorted by anything but id selects keyset_column() and
+# pages with a "<value>,<id>" cursor (keyset_key) that carries the
+# last row's sort value, so the next page never depends on that row
+# still existing. NULL sort values (an empty <value>) come first in
+# either direction
+# ----------------------------------------------------------------
+CURSOR_COLUMN = "keyset_value"
+
+
+def keyset_order(model, column, descending=False):
+    if column is model.id:
+        return (model.id.desc() if descending else model.id.asc(),)
+
+    if descending:
+        return column.desc().nulls_first(), model.id.desc()
+    return column.asc().nulls_first(), model.id.asc()
+
+
+
+def keyset_column(column):
+    return column.label(CURSOR_COLUMN)
+
+
+
+def _encode_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+
+def keyset_key(model, column):
+    """next_after for a row selected with keyset_column(column)."""
+    if column is model.id:
+        return lambda row: row.id
+    return lambda row: f"{_encode_value(getattr(row, CURSOR_COLUMN))},{row.id}"
+
+
+
+def _decode(column, after):
+    if isinstance(after, int):
+        return None, after
+
+    value, _, after_id = str(after).rpartition(",")
+    if not after_id.isdigit():
+        invalid_cursor()
+    if value == "":
+        return None, int(after_id)
+
+    python_type = column.type.python_type
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(value), int(after_id)
+        return python_type(value), int(after_id)
+    except ValueError:
+        invalid_cursor()
+
+
+
+def keyset_after(model, column, after, descending=False):
+    if column is model.id:
+        after_id = after if isinstance(after, int) else _decode(column, after)[1]
+        return model.id < after_id if descending else model.id > after_id
+
+    if isinstance(after, int):
+        # a bare id cannot place a row in a sorted listing
+        invalid_cursor()
+
+    value, after_id = _decode(column, after)
+    past_id = model.id < after_id if descending else model.id > after_id
+
+    if value is None:
+        return or_(column.isnot(None), and_(column.is_(None), past_id))
+    if descending:
+        return or_(column < value, and_(column == value, past_id))
+    return or_(column > value, and_(column == value, past_id))
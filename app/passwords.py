@@ -0,0 +1,174 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.config import request_threads, worker_processes
+
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are already queued."""
+
+
+
+@lru_cache(maxsize=None)
+def method_prefix(method):
+    """The prefix werkzeug writes for `method`, defaults filled in.
+
+    "scrypt" hashes as "scrypt:32768:8:1$...", so shorthand methods
+    are normalized by hashing a throwaway password once.
+    """
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+
+# worker-side functions, module level so they pickle into the pool
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+
+# ----------------------------------------------------------------
+# PASSWORD HASHER
+# CPU-bound hashing runs in a process pool so it never holds the
+# GIL of a request worker. the request thread itself still blocks on
+# the pool's .result() until its hash is done, so the thread is tied
+# up either way; what the semaphore bounds is how many of this
+# process's gthread threads can be tied up like that (one hashing,
+# or waiting for a slot up to PASSWORD_HASH_WAIT), so a login storm
+# can't take every thread from catalog traffic.
+# config:
+#   PASSWORD_HASH_METHOD       werkzeug method, e.g. "scrypt:32768:8:1"
+#                              or "pbkdf2:sha256:600000"
+#   PASSWORD_HASH_MAX_PENDING  hashes in flight per process; default
+#                              GUNICORN_THREADS - 1, so one thread is
+#                              always left for other requests
+#   PASSWORD_HASH_WORKERS      pool processes, 0 hashes inline; default
+#                              this process's share of the CPUs, at
+#                              most MAX_PENDING (more can't be used)
+#   PASSWORD_HASH_WAIT         seconds to wait for a slot before
+#                              raising HasherBusy
+# ----------------------------------------------------------------
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = DEFAULT_METHOD
+        self.prefix = DEFAULT_METHOD
+        self.workers = 0
+        self.wait = 2.0
+        self.max_pending = 64
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get("PASSWORD_HASH_METHOD", DEFAULT_METHOD)
+        self.prefix = method_prefix(self.method)
+        self.wait = app.config.get("PASSWORD_HASH_WAIT", 2.0)
+
+        self.max_pending = app.config.get("PASSWORD_HASH_MAX_PENDING", max(1, request_threads() - 1))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+        cpu_share = multiprocessing.cpu_count() // worker_processes()
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", max(1, min(self.max_pending, cpu_share)))
+
+        app.extensions["password_hasher"] = self
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # spawn, not fork: request threads may hold locks
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                    atexit.register(self._pool.shutdown, wait=False)
+        return self._pool
+
+    def _bump(self, counter, amount=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _run(self, fn, *args):
+        self._bump("waiting")
+        acquired = self._slots.acquire(timeout=self.wait)
+        self._bump("waiting", -1)
+
+        if not acquired:
+            self._bump("rejected")
+            raise HasherBusy("Password hashing is saturated, retry shortly")
+
+        self._bump("in_flight")
+        try:
+            # blocks this thread either way, the pool only frees the GIL
+            if self.workers:
+                result = self._executor().submit(fn, *args).result()
+            else:
+                result = fn(*args)
+        except Exception:
+            self._bump("failed")
+            raise
+        else:
+            self._bump("completed")
+            return result
+        finally:
+            self._bump("in_flight", -1)
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        # werkzeug hashes are "<method>$<salt>$<hash>"
+        return pwhash.split("$", 1)[0] != self.prefix
+
+    def rehash_if_needed(self, pwhash, password):
+        """Return a hash with the current parameters, or None if unchanged."""
+        if not self.needs_rehash(pwhash):
+            return None
+
+        new_hash = self.hash(password)
+        self._bump("rehashed")
+        return new_hash
+
+    def stats(self):
+        return {
+            "method": self.method,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,350 @@
+"""N+1 query regression guard.
+
+Every endpoint below declares a query budget. The guard builds the app
+on a fresh in-memory database at two or more dataset sizes, calls each
+endpoint through the test client and fails when the statement count
+changes with the data size or exceeds the budget, printing a diff of
+the SQL emitted at the smallest and largest size.
+
+From CI:
+    python -m app.query_guard --sizes 3,40
+
+The test suite runs the same checks as one test per endpoint
+(tests/test_query_budgets.py), so a plain ``pytest`` enforces them.
+
+As a pytest plugin (``pytest -p app.query_guard``) it adds the
+``--query-guard-sizes`` option and the ``query_guard`` fixture for
+tests of their own, and ``--query-guard`` adds the endpoint checks to
+any run.
+"""
+import argparse
+import difflib
+import re
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.identity import identity_cache
+from app.models import (
+    Cart, CartItem, Category, Order, OrderItem, Product, ProductImage,
+    ProductQnA, Review, StockLedger, User,
+)
+
+
+DEFAULT_SIZES = (3, 40)
+PASSWORD = "password"
+
+
+class GuardConfig(TestingConfig):
+    CACHE_BACKEND = "null"          # measure the database, not the cache
+    INSTRUMENTATION_ENABLED = False
+
+
+
+# ----------------------------------------------------------------
+# ENDPOINT BUDGETS
+# (name, login as, method, path, json body, max statements)
+# the budget counts every statement in the request, including the
+# identity load on a cold cache
+# ----------------------------------------------------------------
+ENDPOINTS = [
+    ("products", None, "GET", "/api/products?limit=100", None, 1),
+    ("products filtered", None, "GET", "/api/products?limit=100&sort=price_desc&category_id=1&in_stock=1", None, 1),
+    ("product detail", None, "GET", "/api/products/1?include=reviews,qna,rating_summary", None, 4),
+    ("reviews", None, "GET", "/api/products/1/reviews?limit=100", None, 1),
+    ("qna", None, "GET", "/api/products/1/qna?limit=100", None, 1),
+    ("search", None, "GET", "/api/search?q=product&limit=100", None, 4),
+    ("categories", None, "GET", "/api/categories", None, 1),
+    ("category products", None, "GET", "/api/categories/1/products?limit=100", None, 2),
+    ("cart", "customer", "GET", "/api/customer/cart", None, 2),
+    ("cart summary", "customer", "GET", "/api/customer/cart?summary=1", None, 2),
+    ("cart patch", "customer", "PATCH", "/api/customer/cart", {"operations": [
+        {"op": "add", "product_id": 1, "quantity": 1},
+        {"op": "set", "product_id": 2, "quantity": 3},
+        {"op": "remove", "product_id": 3},
+    ]}, 8),
+    ("cart clear", "customer", "DELETE", "/api/customer/cart/clear", None, 6),
+    ("my products", "supplier", "GET", "/api/supplier/my-products?limit=100", None, 3),
+    ("batch update", "supplier", "PATCH", "/api/supplier/products/batch", {"updates": [
+        {"product_id": 1, "stock": 10},
+        {"product_id": 2, "price": 5.0},
+    ]}, 6),
+    ("orders", "customer", "GET", "/api/customer/orders?limit=100", None, 2),
+    ("order detail", "customer", "GET", "/api/customer/orders/1", None, 3),
+    ("low stock", "supplier", "GET", "/api/supplier/low-stock?limit=100", None, 3),
+    ("stock history", "supplier", "GET", "/api/supplier/product/1/stock-history?limit=100", None, 4),
+    ("me", "customer", "GET", "/auth/me", None, 1),
+]
+
+# checkout issues one conditional stock UPDATE per cart line by design,
+# so it is linear in cart size and not part of the guard
+
+
+
+# ----------------------------------------------------------------
+# DATASET
+# every collection an endpoint could walk grows with `size`
+# ----------------------------------------------------------------
+def seed(size):
+    supplier = User(name="Supplier", email="supplier@example.com", role="supplier")
+    customer = User(name="Customer", email="customer@example.com", role="customer")
+    supplier.set_password(PASSWORD)
+    customer.set_password(PASSWORD)
+    db.session.add_all([supplier, customer])
+
+    root = Category(name="Category 0")
+    db.session.add(root)
+    db.session.flush()
+    categories = [root] + [Category(name=f"Category {i}", parent_id=root.id) for i in (1, 2)]
+    db.session.add_all(categories)
+    db.session.flush()
+
+    products = [
+        Product(
+            supplier_id=supplier.id,
+            category_id=categories[i % 3].id,
+            title=f"Product {i}",
+            description=f"Description of product {i}",
+            price=float(i % 50 + 1),
+            stock=i % 10 + 1,               # some under the low-stock threshold
+        )
+        for i in range(max(size, 3))
+    ]
+    db.session.add_all(products)
+    db.session.flush()
+
+    # the cart is seeded non-empty, so it has already been started
+    cart = Cart(user_id=customer.id, started_at=datetime.utcnow())
+    db.session.add(cart)
+    db.session.flush()
+
+    for i, product in enumerate(products[:size]):
+        db.session.add(ProductImage(product_id=products[0].id, image_url=f"/img/{i}.jpg"))
+        db.session.add(Review(product_id=products[0].id, user_id=customer.id, rating=i % 5 + 1, comment="ok"))
+        db.session.add(ProductQnA(product_id=products[0].id, user_id=customer.id, question="Does it work?"))
+        db.session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1))
+        db.session.add(StockLedger(
+            product_id=products[0].id, supplier_id=supplier.id, delta=1, balance=i, reason="manual"
+        ))
+
+    for i in range(size):
+        order = Order(user_id=customer.id, total_amount=1.0)
+        db.session.add(order)
+        db.session.flush()
+        product = products[i % len(products)]
+        db.session.add(OrderItem(
+            order_id=order.id, product_id=product.id, quantity=1, price=1.0,
+            title=product.title, thumbnail=product.thumbnail
+        ))
+
+    db.session.commit()
+
+
+
+# ----------------------------------------------------------------
+# MEASURING
+# ----------------------------------------------------------------
+@contextmanager
+def capture_queries(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+
+def build_app(size, config=GuardConfig):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        seed(size)
+    return app
+
+
+
+def measure(app, role, method, path, body):
+    client = app.test_client()
+    if role:
+        response = client.post("/auth/login", json={"email": f"{role}@example.com", "password": PASSWORD})
+        assert response.status_code == 200, response.get_json()
+
+    with app.app_context():
+        engine = db.engine
+
+    # start cold so the identity load is always part of the count
+    identity_cache.backend.clear()
+
+    with capture_queries(engine) as statements:
+        response = client.open(path, method=method, json=body)
+
+    return response.status_code, statements
+
+
+
+def normalize(statement):
+    # IN lists and LIMITs shouldn't make two otherwise equal statements differ
+    statement = " ".join(statement.split())
+    return re.sub(r"\(\?(, \?)*\)", "(?...)", statement)
+
+
+
+def check_endpoint(endpoint, apps):
+    """Return None when the endpoint is within budget, else a report."""
+    name, role, method, path, body, budget = endpoint
+
+    runs = []
+    for size, app in apps:
+        status, statements = measure(app, role, method, path, body)
+        if status >= 400:
+            return f"{name}: {method} {path} returned {status} at size {size}"
+        runs.append((size, statements))
+
+    counts = {size: len(statements) for size, statements in runs}
+    (small, small_sql), (large, large_sql) = runs[0], runs[-1]
+
+    problems = []
+    if len(set(counts.values())) > 1:
+        problems.append(f"query count scales with data size: {counts}")
+    if max(counts.values()) > budget:
+        problems.append(f"{max(counts.values())} queries exceeds budget of {budget}")
+    if not problems:
+        return None
+
+    diff = "\n".join(difflib.unified_diff(
+        [normalize(s) for s in small_sql],
+        [normalize(s) for s in large_sql],
+        fromfile=f"size={small}",
+        tofile=f"size={large}",
+        lineterm=""
+    ))
+    return f"{name}: {method} {path}\n  " + "\n  ".join(problems) + "\n" + diff
+
+
+
+def run_guard(sizes=DEFAULT_SIZES, endpoints=ENDPOINTS):
+    failures = []
+    for endpoint in endpoints:
+        # stateful endpoints get a fresh database per size
+        apps = [(size, build_app(size)) for size in sizes]
+        report = check_endpoint(endpoint, apps)
+        if report:
+            failures.append(report)
+    return failures
+
+
+
+def parse_sizes(value):
+    sizes = tuple(sorted(int(v) for v in value.split(",") if v.strip()))
+    if len(sizes) < 2:
+        raise ValueError("need at least two sizes")
+    return sizes
+
+
+
+# ----------------------------------------------------------------
+# PYTEST PLUGIN
+# ----------------------------------------------------------------
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+
+if pytest is not None:
+    def pytest_addoption(parser):
+        group = parser.getgroup("query guard")
+        group.addoption("--query-guard", action="store_true", help="Run the endpoint query budget checks.")
+        group.addoption(
+            "--query-guard-sizes",
+            default=",".join(map(str, DEFAULT_SIZES)),
+            help="Comma separated dataset sizes to compare."
+        )
+
+    def pytest_configure(config):
+        config.addinivalue_line("markers", "query_guard: endpoint query budget check")
+
+    def pytest_collection_modifyitems(session, config, items):
+        if not config.getoption("--query-guard"):
+            return
+        for endpoint in ENDPOINTS:
+            items.append(QueryGuardItem.from_parent(session, name=f"query_guard[{endpoint[0]}]", endpoint=endpoint))
+
+    class QueryGuardItem(pytest.Item):
+        def __init__(self, *, endpoint, **kwargs):
+            super().__init__(**kwargs)
+            self.endpoint = endpoint
+            self.add_marker("query_guard")
+
+        def runtest(self):
+            sizes = parse_sizes(self.config.getoption("--query-guard-sizes"))
+            report = check_endpoint(self.endpoint, [(size, build_app(size)) for size in sizes])
+            if report:
+                raise QueryBudgetExceeded(report)
+
+        def repr_failure(self, excinfo):
+            if isinstance(excinfo.value, QueryBudgetExceeded):
+                return str(excinfo.value)
+            return super().repr_failure(excinfo)
+
+        def reportinfo(self):
+            return __file__, None, self.name
+
+    @pytest.fixture
+    def query_guard(request):
+        """Build seeded apps and measure endpoints inside a test.
+
+            def test_cart_is_flat(query_guard):
+                assert query_guard.check(("cart", "customer", "GET", "/api/customer/cart", None, 2)) is None
+        """
+        sizes = parse_sizes(request.config.getoption("--query-guard-sizes"))
+
+        class Guard:
+            def build(self, size):
+                return build_app(size)
+
+            def check(self, endpoint):
+                return check_endpoint(endpoint, [(size, build_app(size)) for size in sizes])
+
+        return Guard()
+
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail when endpoint query counts scale with data size.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--only", action="append", help="Endpoint name to check, repeatable.")
+    args = parser.parse_args(argv)
+
+    endpoints = [e for e in ENDPOINTS if not args.only or e[0] in args.only]
+    failures = run_guard(parse_sizes(args.sizes), endpoints)
+
+    for report in failures:
+        print(report, file=sys.stderr)
+        print(file=sys.stderr)
+
+    print(f"{len(endpoints) - len(failures)}/{len(endpoints)} endpoints within budget")
+    return 1 if failures else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Query plan check for the routes' SQL.
+
+Builds the query guard's seeded in-memory database, calls every guard
+endpoint through the test client, then runs EXPLAIN QUERY PLAN on each
+statement it emitted and flags full table and full index scans, the
+plans an index is missing for. Temporary sort B-trees are listed as
+notes.
+
+    flask db explain [--size 40] [--schema models|migrations] [--only NAME]
+    python -m app.query_plans
+
+With ``--schema migrations`` the tables and indexes come from running
+the Flask-Migrate revisions instead of ``db.create_all()``, so the
+check also proves the migration set carries every index. SQLite only.
+"""
+import argparse
+import re
+import sys
+from contextlib import contextmanager
+
+import click
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.identity import identity_cache
+from app.query_guard import ENDPOINTS, PASSWORD, GuardConfig, seed
+
+
+DEFAULT_SIZE = 40
+
+# tables a route reads whole on purpose
+ALLOWED_SCANS = {
+    "category": "the category tree endpoint returns every node",
+}
+
+# statements with no plan worth checking
+SKIPPED = re.compile(r"^\s*(INSERT\s+INTO\s+\S+\s+(\(|VALUES|DEFAULT)|PRAGMA|SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)", re.I)
+
+# "SCAN t", "SCAN t USING INDEX ix", "SCAN t USING COVERING INDEX ix"
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+LOOP = re.compile(r"^(SCAN|SEARCH) ")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE")
+ORDERED_LIMIT = re.compile(r"\bORDER BY\b.*\bLIMIT\b", re.I | re.S)
+OUTER_WHERE = re.compile(r"\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)", re.I | re.S)
+SUBQUERY = re.compile(r"\s*SELECT\b", re.I)
+
+
+
+# ----------------------------------------------------------------
+# CAPTURE
+# ----------------------------------------------------------------
+@contextmanager
+def capture_statements(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+
+def build_app(size, schema="models"):
+    app = create_app(GuardConfig)
+    with app.app_context():
+        if schema == "migrations":
+            from flask_migrate import upgrade
+            upgrade()
+        else:
+            db.create_all()
+        seed(size)
+    return app
+
+
+
+def run_endpoint(app, role, method, path, body):
+    client = app.test_client()
+    if role:
+        response = client.post("/auth/login", json={"email": f"{role}@example.com", "password": PASSWORD})
+        assert response.status_code == 200, response.get_json()
+
+    with app.app_context():
+        engine = db.engine
+
+    identity_cache.backend.clear()
+
+    with capture_statements(engine) as statements:
+        response = client.open(path, method=method, json=body)
+
+    return response.status_code, engine, statements
+
+
+
+# ----------------------------------------------------------------
+# PLANS
+# ----------------------------------------------------------------
+def explain(engine, statement, parameters):
+    """(parent, detail) per plan row; parent 0 is the top-level query."""
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [(row[1], row[-1]) for row in rows]
+
+
+
+def _outer_query(statement):
+    """The statement with its parenthesised subqueries blanked out."""
+    out = []
+    opened = []
+    for i, char in enumerate(statement):
+        if char == "(":
+            opened.append((len(out), bool(SUBQUERY.match(statement, i + 1))))
+        elif char == ")" and opened:
+            start, is_subquery = opened.pop()
+            if is_subquery:
+                del out[start:]
+                out.append("(...)")
+                continue
+        out.append(char)
+    return "".join(out)
+
+
+
+def _filters(statement, table):
+    where = OUTER_WHERE.search(_outer_query(statement))
+    return bool(where and re.search(rf'(?<![\w.])"?{re.escape(table)}"?\.', where.group(1)))
+
+
+
+def findings(statement, plan):
+    """(full scans, temp sorts) in one statement's plan.
+
+    Every SCAN of a table or a whole index counts, with one exception:
+    the keyset listings' first page. There the scan is the outer loop,
+    its order is the ORDER BY (no temp sort), nothing in WHERE filters
+    the table, so it reads exactly LIMIT rows and stops.
+    """
+    sorts = [detail for _, detail in plan if TEMP_SORT.search(detail)]
+    ordered = ORDERED_LIMIT.search(statement) and not any("ORDER BY" in detail for detail in sorts)
+    outer = next((detail for parent, detail in plan if parent == 0 and LOOP.match(detail)), None)
+
+    scans = []
+    for _, detail in plan:
+        match = FULL_SCAN.match(detail)
+        if not match or match.group(1) in ALLOWED_SCANS:
+            continue
+        if ordered and detail == outer and not _filters(statement, match.group(1)):
+            continue
+        scans.append(detail)
+    return scans, sorts
+
+
+
+def check_endpoint(endpoint, size=DEFAULT_SIZE, schema="models"):
+    """Return (problems, notes) for one guard endpoint."""
+    name, role, method, path, body, _ = endpoint
+    app = build_app(size, schema)
+
+    status, engine, statements = run_endpoint(app, role, method, path, body)
+    if status >= 400:
+        return [f"{method} {path} returned {status}"], []
+
+    problems, notes = [], []
+    seen = set()
+    for statement, parameters in statements:
+        if SKIPPED.match(statement) or statement in seen:
+            continue
+        seen.add(statement)
+
+        scans, sorts = findings(statement, explain(engine, statement, parameters))
+        sql = " ".join(statement.split())
+        problems += [f"{detail}\n      {sql}" for detail in scans]
+        notes += [f"{detail}\n      {sql}" for detail in sorts]
+
+    return problems, notes
+
+
+
+def run_explain(endpoints=ENDPOINTS, size=DEFAULT_SIZE, schema="models", out=print):
+    flagged = 0
+    for endpoint in endpoints:
+        problems, notes = check_endpoint(endpoint, size, schema)
+        if problems:
+            flagged += 1
+
+        status = "FULL SCAN" if problems else "ok"
+        out(f"{endpoint[0]:<24} {endpoint[2]} {endpoint[3]}  [{status}]")
+        for line in problems:
+            out(f"    scan: {line}")
+        for line in notes:
+            out(f"    note: {line}")
+
+    out(f"{len(endpoints) - flagged}/{len(endpoints)} endpoints without full scans")
+    return flagged
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# registered on Flask-Migrate's group as `flask db explain`
+# ----------------------------------------------------------------
+@click.command("explain")
+@click.option("--size", type=int, default=DEFAULT_SIZE, show_default=True, help="Seeded dataset size.")
+@click.option("--schema", type=click.Choice(["models", "migrations"]), default="models", show_default=True,
+              help="Build tables from the models or by running the migrations.")
+@click.option("--only", multiple=True, help="Endpoint name to explain, repeatable.")
+def explain_command(size, schema, only):
+    """EXPLAIN QUERY PLAN every guarded route and flag full table scans."""
+    endpoints = [e for e in ENDPOINTS if not only or e[0] in only]
+    if run_explain(endpoints, size, schema, out=click.echo):
+        sys.exit(1)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag full table scans in the routes' query plans.")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    parser.add_argument("--schema", choices=["models", "migrations"], default="models")
+    parser.add_argument("--only", action="append", help="Endpoint name to explain, repeatable.")
+    args = parser.parse_args(argv)
+
+    endpoints = [e for e in ENDPOINTS if not args.only or e[0] in args.only]
+    return 1 if run_explain(endpoints, args.size, args.schema) else 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,290 @@
-from flask import Blueprint, jsonify
+import hmac
+import ipaddress
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_login import current_user
+from app import analytics
+from app.cache import cache
+from app.extensions import db
+from app.identity import identity_cache
+from app.passwords import hasher
+from app.instrumentation import instrumentation
+from app.jobs import jobs
+from app.models import Category
 
 admin_bp = Blueprint("admin", __name__)
 
+
+# ----------------------------------------------------------------
+# ACCESS
+# everything here but /status and /metrics is for staff and admins only
+# ----------------------------------------------------------------
+ADMIN_ROLES = ("staff", "admin")
+
+
+def admin_required():
+    if not current_user.is_authenticated:
+        return False, jsonify({"error": "Login required"}), 401
+    if current_user.role not in ADMIN_ROLES:
+        return False, jsonify({"error": "Admin access only"}), 403
+
+    return True, None, None
+
+
+
 @admin_bp.route("/status")
 def status():
-    return jsonify({"message": "Admin API working"})
\ No newline at end of file
+    return jsonify({"message": "Admin API working"})
+
+
+
+@admin_bp.route("/cache")
+def cache_stats():
+    ok, res, code = admin_required()
+    if not ok:
+        return res, code
+
+    return jsonify(cache.stats())
+
+
+
+@admin_bp.route("/identity-cache")
+def identity_cache_stats():
+    ok, res, code = admin_required()
+    if not ok:
+        return res, code
+
+    return jsonify(identity_cache.stats())
+
+
+
+@admin_bp.route("/password-hasher")
+def password_hasher_stats():
+    ok, res, code = admin_required()
+    if not ok:
+        return res, code
+
+    return jsonify(hasher.stats())
+
+
+
+@admin_bp.route("/jobs")
+def job_stats():
+    ok, res, code = admin_required()
+    if not ok:
+        return res, code
+
+    return jsonify(jobs.stats())
+
+
+
+# ----------------------------------------------------------------
+# METRICS
+# Prometheus text format: per-route latency histograms and query
+# counts, plus the cache and password pool counters. scrapers have no
+# session, so access is by bearer token (METRICS_TOKEN) or client
+# address (METRICS_ALLOWED_IPS, addresses or networks); remote_addr
+# is the proxy's unless the app runs behind ProxyFix
+# ----------------------------------------------------------------
+def _metrics_allowed():
+    config = current_app.config
+
+    token = config.get("METRICS_TOKEN")
+    if token:
+        scheme, _, given = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(given.encode(), token.encode()):
+            return True
+
+    try:
+        client = ipaddress.ip_address(request.remote_addr or "")
+    except ValueError:
+        return False
+    return any(
+        client in ipaddress.ip_network(network.strip(), strict=False)
+        for network in config.get("METRICS_ALLOWED_IPS", "").split(",")
+        if network.strip()
+    )
+
+
+
+def _counter_lines(prefix, stats, kind="counter"):
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{key} {kind}")
+            lines.append(f"{prefix}_{key} {value}")
+    return lines
+
+
+
+@admin_bp.route("/metrics")
+def metrics():
+    if not _metrics_allowed():
+        return jsonify({"error": "Metrics access denied"}), 403
+
+    lines = [instrumentation.metrics.render().rstrip("\n")]
+    lines += _counter_lines("response_cache", cache.stats(), "gauge")
+    lines += _counter_lines("identity_cache", identity_cache.stats(), "gauge")
+    lines += _counter_lines("password_hasher", hasher.stats(), "gauge")
+    lines += _counter_lines("jobs", jobs.stats(), "gauge")
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+
+# ----------------------------------------------------------------
+# SALES ANALYTICS
+# ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive, default last 30 days)
+# read from the sales rollups, never from Order/OrderItem
+# ----------------------------------------------------------------
+def _analytics_range():
+    ok, res, code = admin_required()
+    if not ok:
+        return None, (res, code)
+
+    try:
+        return analytics.parse_range(request.args), None
+    except ValueError as exc:
+        return None, (jsonify({"error": str(exc)}), 400)
+
+
+
+def _range_dict(start, end):
+    return {"from": start.isoformat(), "to": end.isoformat()}
+
+
+
+@admin_bp.route("/analytics/revenue")
+def revenue():
+    date_range, error = _analytics_range()
+    if error:
+        return error
+
+    return jsonify({**_range_dict(*date_range), **analytics.revenue_by_day(*date_range)})
+
+
+
+@admin_bp.route("/analytics/categories")
+def revenue_by_category():
+    date_range, error = _analytics_range()
+    if error:
+        return error
+
+    return jsonify({**_range_dict(*date_range), "items": analytics.revenue_by_category(*date_range)})
+
+
+
+@admin_bp.route("/analytics/suppliers")
+def revenue_by_supplier():
+    date_range, error = _analytics_range()
+    if error:
+        return error
+
+    return jsonify({**_range_dict(*date_range), "items": analytics.revenue_by_supplier(*date_range)})
+
+
+
+@admin_bp.route("/analytics/top-products")
+def top_products():
+    date_range, error = _analytics_range()
+    if error:
+        return error
+
+    order = request.args.get("by", "revenue")
+    if order not in ("revenue", "units"):
+        return jsonify({"error": "Invalid by, use one of: revenue, units"}), 400
+
+    limit = request.args.get("limit", 10, type=int)
+    limit = max(1, min(limit, analytics.MAX_TOP_PRODUCTS))
+
+    return jsonify({
+        **_range_dict(*date_range),
+        "items": analytics.top_products(*date_range, limit=limit, order=order)
+    })
+
+
+
+@admin_bp.route("/analytics/conversion")
+def conversion():
+    date_range, error = _analytics_range()
+    if error:
+        return error
+
+    return jsonify({**_range_dict(*date_range), **analytics.conversion(*date_range)})
+
+
+
+# ----------------------------------------------------------------
+# CATEGORY TREE
+# {"name": ..., "parent_id": null | id}; moving a category carries
+# its subtree and product counts along with it
+# ----------------------------------------------------------------
+def _parent_error(parent_id, category_id=None):
+    if parent_id is None:
+        return None
+    if not isinstance(parent_id, int) or db.session.get(Category, parent_id) is None:
+        return jsonify({"error": f"Unknown parent category: {parent_id}"}), 400
+    if parent_id == category_id:
+        return jsonify({"error": "A category cannot be its own parent"}), 400
+    return None
+
+
+
+@admin_bp.route("/categories", methods=["POST"])
+def create_category():
+    ok, res, code = admin_required()
+    if not ok:
+        return res, code
+
+    data = request.json or {}
+    name = str(data.get("name") or "").strip()
+    if not name:
+        return jsonify({"error": "name is required"}), 400
+    if Category.query.filter_by(name=name).first():
+        return jsonify({"error": "Category already exists"}), 409
+
+    parent_id = data.get("parent_id")
+    error = _parent_error(parent_id)
+    if error:
+        return error
+
+    category = Category(name=name, parent_id=parent_id)
+    db.session.add(category)
+    db.session.commit()
+
+    return jsonify({"message": "Category created", "category_id": category.id}), 201
+
+
+
+@admin_bp.route("/categories/<int:category_id>", methods=["PUT"])
+def update_category(category_id):
+    ok, res, code = admin_required()
+    if not ok:
+        return res, code
+
+    category = Category.query.get_or_404(category_id)
+    data = request.json or {}
+
+    if "name" in data:
+        name = str(data.get("name") or "").strip()
+        if not name:
+            return jsonify({"error": "name must not be empty"}), 400
+        if Category.query.filter(Category.name == name, Category.id != category_id).first():
+            return jsonify({"error": "Category already exists"}), 409
+        category.name = name
+
+    if "parent_id" in data:
+        parent_id = data.get("parent_id")
+        error = _parent_error(parent_id, category_id)
+        if error:
+            return error
+        category.parent_id = parent_id
+
+    try:
+        db.session.commit()
+    except ValueError as exc:
+        # moved under its own subtree
+        db.session.rollback()
+        return jsonify({"error": str(exc)}), 400
+
+    return jsonify({"message": "Category updated"})
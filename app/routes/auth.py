@@ -2,10 +2,20 @@ from flask import Blueprint, jsonify, request
 from flask_login import login_user, current_user, login_required, logout_user
 from app.models import User
 from app.extensions import db
+from app.passwords import HasherBusy, hasher
 
 auth_bp = Blueprint("auth", __name__)
 
 
+@auth_bp.errorhandler(HasherBusy)
+def hasher_busy(error):
+    return {"error": str(error)}, 503, {"Retry-After": "1"}
+
+
+# roles anyone may sign up with; staff and admins are made by an admin
+SIGNUP_ROLES = ("customer", "supplier")
+
+
 @auth_bp.route("/signup", methods=["POST"])
 def signup():
     data = request.get_json()
@@ -14,6 +24,8 @@ def signup():
     email = data.get("email")
     password = data.get("password")
     role = data.get("role", "customer")   # optional
+    if role not in SIGNUP_ROLES:
+        return {"error": f"Invalid role, use one of: {', '.join(SIGNUP_ROLES)}"}, 400
 
     if User.query.filter_by(email=email).first():
         return {"error": "Email already registered"}, 400
@@ -40,6 +52,12 @@ def login():
     if not user or not user.check_password(password):
         return {"error": "Invalid email or password"}, 401
 
+    # upgrade hashes made with older method/cost settings
+    new_hash = hasher.rehash_if_needed(user.password_hash, password)
+    if new_hash:
+        user.password_hash = new_hash
+        db.session.commit()
+
     login_user(user)
     return {"message": "Login successful", "user": user.id}
 
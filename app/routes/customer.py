@@ -1,7 +1,16 @@
-from flask import Blueprint, jsonify, request
+from datetime import datetime
+
+from flask import Blueprint, jsonify, make_response, request
 from flask_login import current_user, login_required
-from app.models import Cart, CartItem, Product, Order, OrderItem
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.models import Cart, CartItem, Product, Order, OrderItem, record_stock_moves, refresh_cart_totals
 from app.extensions import db
+from app.cache import mark_stale, product_tags
+from app.jobs import enqueue_many
+from app.analytics import record_cart_started, record_order
+from app.pagination import page_args, keyset_page, keyset_order, keyset_after, keyset_column, keyset_key
+from app.serializers import CART_ITEM, ORDER, ORDER_ITEM
 
 
 customer_bp = Blueprint("customer", __name__)
@@ -11,8 +20,9 @@ def status():
     return jsonify({"message": "Customer API working"})
 
 def get_or_create_cart(user):
-    if user.cart:
-        return user.cart
+    cart = Cart.query.filter_by(user_id=user.id).first()
+    if cart:
+        return cart
     
     cart = Cart(user_id=user.id)
     db.session.add(cart)
@@ -21,6 +31,29 @@ def get_or_create_cart(user):
 
 
 
+def _refresh_totals(cart_id):
+    # ORM changes must reach the table before the totals are recomputed
+    db.session.flush()
+    refresh_cart_totals(db.session, cart_ids=[cart_id])
+
+
+
+def _track_cart_started(cart, has_items):
+    # empty -> non-empty counts as a started cart for the conversion rollup
+    if has_items and cart.started_at is None:
+        cart.started_at = datetime.utcnow()
+        record_cart_started(db.session, cart.started_at)
+    elif not has_items and cart.started_at is not None:
+        cart.started_at = None
+
+
+
+def _cart_item_count(cart_id):
+    # the totals UPDATE bypasses the identity map, read the column itself
+    return db.session.query(Cart.item_count).filter(Cart.id == cart_id).scalar() or 0
+
+
+
 @customer_bp.route("/cart/add", methods=["POST"])
 @login_required
 def add_to_cart():
@@ -41,33 +74,224 @@ def add_to_cart():
         item = CartItem(cart_id=cart.id, product_id=product.id, quantity=quantity)
         db.session.add(item)
 
+    _refresh_totals(cart.id)
+    _track_cart_started(cart, True)
     db.session.commit()
 
     return jsonify({"message": "Item added to cart"}), 200
 
 
 
+def _cart_items(cart_id):
+    # column tuples, so rows just upserted in bulk are always read fresh
+    rows = (
+        db.session.query(*CART_ITEM.columns())
+        .join(Product, CartItem.product_id == Product.id)
+        .filter(CartItem.cart_id == cart_id)
+        .order_by(CartItem.id)
+        .all()
+    )
+    return CART_ITEM.dump_rows(rows)
+
+
+
+# ----------------------------------------------------------------
+# CART
+# ?summary=1 answers from the cart row alone (subtotal, item_count,
+# version) and honours If-None-Match, for badge polling; the full
+# cart is the same row outer-joined to its lines in one SELECT
+# ----------------------------------------------------------------
+CART_SUMMARY_FIELDS = (Cart.id, Cart.subtotal, Cart.item_count, Cart.version)
+
+
+def _cart_summary(cart_id, subtotal, item_count, version):
+    return {
+        "cart_id": cart_id,
+        "subtotal": round(subtotal or 0, 2),
+        "item_count": item_count,
+        "version": version,
+    }
+
+
+
 @customer_bp.route("/cart", methods=["GET"])
 @login_required
 def get_cart():
-    cart = get_or_create_cart(current_user)
+    summary = request.args.get("summary", "").lower() in ("1", "true", "yes")
+
+    if summary:
+        rows = db.session.query(*CART_SUMMARY_FIELDS).filter(Cart.user_id == current_user.id).all()
+    else:
+        rows = (
+            db.session.query(*CART_SUMMARY_FIELDS, *CART_ITEM.columns())
+            .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+            .outerjoin(Product, CartItem.product_id == Product.id)
+            .filter(Cart.user_id == current_user.id)
+            .order_by(CartItem.id)
+            .all()
+        )
+
+    # positional: the joined line columns carry their own "id"
+    offset = len(CART_SUMMARY_FIELDS)
+    if rows:
+        head = tuple(rows[0])[:offset]
+    else:
+        cart = get_or_create_cart(current_user)
+        head = (cart.id, cart.subtotal, cart.item_count, cart.version)
+
+    etag = f"cart-{head[0]}-{head[3]}"
+    if summary and etag in request.if_none_match:
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    data = _cart_summary(*head)
+    if not summary:
+        # an empty cart still yields one row, with NULL line columns
+        data["items"] = [
+            CART_ITEM.dump_row(tuple(row)[offset:])
+            for row in rows if row[offset] is not None
+        ]
+
+    response = jsonify(data)
+    response.set_etag(etag)
+    return response
+
+
+
+# ----------------------------------------------------------------
+# BULK CART MUTATION
+# body: {"operations": [{"op": "add" | "set" | "remove",
+#                        "product_id": 1, "quantity": 2}, ...]}
+# all operations apply in order inside one transaction; "set" to 0
+# removes the line, like "remove"
+# ----------------------------------------------------------------
+CART_OPS = ("add", "set", "remove")
+MAX_CART_OPS = 100
+
+
+def _upsert_cart_item(cart_id, product_id, quantity, increment):
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(CartItem).values(
+            cart_id=cart_id, product_id=product_id, quantity=quantity
+        )
+        new_quantity = CartItem.quantity + stmt.excluded.quantity if increment else stmt.excluded.quantity
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=["cart_id", "product_id"],
+            set_={"quantity": new_quantity}
+        ))
+        return
+
+    # portable fallback for backends without ON CONFLICT
+    result = db.session.execute(
+        update(CartItem)
+        .where(CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+        .values(quantity=CartItem.quantity + quantity if increment else quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(CartItem).values(
+            cart_id=cart_id, product_id=product_id, quantity=quantity
+        ))
+
+
+
+def _remove_cart_item(cart_id, product_id):
+    CartItem.query.filter_by(
+        cart_id=cart_id, product_id=product_id
+    ).delete(synchronize_session=False)
+
 
-    items = []
-    for i in cart.items:
-        items.append({
-            "id": i.id,
-            "product_id": i.product_id,
-            "title": i.product.title,
-            "price": i.product.price,
-            "quantity": i.quantity,
-            "thumbnail": i.product.thumbnail
-        })
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+
+def _validate_cart_ops(operations):
+    if not isinstance(operations, list) or not operations:
+        return "operations must be a non-empty list"
+    if len(operations) > MAX_CART_OPS:
+        return f"At most {MAX_CART_OPS} operations per request"
+
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get("op") not in CART_OPS:
+            return f"Operation {index}: op must be one of {', '.join(CART_OPS)}"
+        if not _is_int(op.get("product_id")):
+            return f"Operation {index}: product_id is required"
+        if op["op"] == "remove":
+            continue
+
+        quantity = op.get("quantity")
+        if not _is_int(quantity):
+            return f"Operation {index}: quantity must be an integer"
+        if op["op"] == "add" and quantity < 1:
+            return f"Operation {index}: quantity must be positive"
+        if op["op"] == "set" and quantity < 0:
+            return f"Operation {index}: quantity must not be negative"
+
+    return None
+
+
+
+@customer_bp.route("/cart", methods=["PATCH"])
+@login_required
+def patch_cart():
+    data = request.get_json(silent=True) or {}
+    operations = data.get("operations")
+
+    error = _validate_cart_ops(operations)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # every referenced product must exist, checked in one query
+    product_ids = {op["product_id"] for op in operations}
+    found = {
+        pid for (pid,) in
+        db.session.query(Product.id).filter(Product.id.in_(product_ids)).all()
+    }
+    missing = sorted(product_ids - found)
+    if missing:
+        return jsonify({
+            "error": "Unknown products",
+            "product_ids": missing
+        }), 404
+
+    cart = Cart.query.filter_by(user_id=current_user.id).first()
+    if not cart:
+        cart = Cart(user_id=current_user.id)
+        db.session.add(cart)
+        db.session.flush()
+    cart_id = cart.id
+
+    for op in operations:
+        if op["op"] == "add":
+            _upsert_cart_item(cart_id, op["product_id"], op["quantity"], increment=True)
+        elif op["op"] == "set" and op["quantity"] > 0:
+            _upsert_cart_item(cart_id, op["product_id"], op["quantity"], increment=False)
+        else:
+            # remove, or set to zero
+            _remove_cart_item(cart_id, op["product_id"])
+
+    _refresh_totals(cart_id)
+    items = _cart_items(cart_id)
+    _track_cart_started(cart, bool(items))
+    db.session.commit()
 
     return jsonify({
-        "cart_id": cart.id,
-        "items": items
+        "cart_id": cart_id,
+        "items": items,
+        "subtotal": round(sum(i["price"] * i["quantity"] for i in items), 2),
+        "item_count": sum(i["quantity"] for i in items)
     })
-    
+
 
 
 @customer_bp.route("/cart/update", methods=["PUT"])
@@ -84,6 +308,8 @@ def update_cart_item():
         return jsonify({"error": "Unauthorized"}), 403
     
     item.quantity = quantity
+    _refresh_totals(item.cart_id)
+    _track_cart_started(item.cart, _cart_item_count(item.cart_id) > 0)
     db.session.commit()
 
     return jsonify({"message": "Quantity updated"})
@@ -98,7 +324,10 @@ def remove_item(item_id):
     if item.cart.user_id != current_user.id:
         return jsonify({"error": "Unauthorized"}), 403
 
+    cart = item.cart
     db.session.delete(item)
+    _refresh_totals(cart.id)
+    _track_cart_started(cart, _cart_item_count(cart.id) > 0)
     db.session.commit()
 
     return jsonify({"message": "Item removed"})
@@ -112,49 +341,230 @@ def clear_cart():
 
     for item in cart.items:
         db.session.delete(item)
-    
+
+    _refresh_totals(cart.id)
+    _track_cart_started(cart, False)
     db.session.commit()
 
     return jsonify({"message": "Cart cleared"})
 
 
 
+def _order_response(order_id, total):
+    return jsonify({
+        "message": "Order created",
+        "order_id": order_id,
+        "total": total
+    })
+
+
+
+# ----------------------------------------------------------------
+# CHECKOUT
+# one transaction: cart + products in one SELECT, conditional stock
+# decrements, bulk OrderItem insert, a single DELETE of the cart, the
+# stock ledger, the sales rollups and the follow-up jobs
+# (confirmation, supplier notices, stock alerts).
+# Send an Idempotency-Key header to make retries safe.
+# ----------------------------------------------------------------
 @customer_bp.route("/checkout", methods=["POST"])
 @login_required
 def checkout():
-    cart = get_or_create_cart(current_user)
-
-    if not cart.items:
+    idempotency_key = request.headers.get("Idempotency-Key")
+
+    if idempotency_key:
+        existing = Order.query.filter_by(
+            user_id=current_user.id, idempotency_key=idempotency_key
+        ).first()
+        if existing:
+            return _order_response(existing.id, existing.total_amount)
+
+    rows = (
+        db.session.query(CartItem, Product)
+        .join(Cart, CartItem.cart_id == Cart.id)
+        .join(Product, CartItem.product_id == Product.id)
+        .filter(Cart.user_id == current_user.id)
+        .order_by(CartItem.product_id)    # stable lock order across checkouts
+        .all()
+    )
+
+    if not rows:
         return jsonify({"error": "Cart is empty"}), 400
-    
-    total = 0
-    for item in cart.items:
-        total += item.product.price * item.quantity
 
-    # Create order
-    order = Order(user_id=current_user.id, total_amount=total)
+    if any(not item.quantity or item.quantity < 1 for item, _ in rows):
+        return jsonify({"error": "Invalid quantity in cart"}), 400
+
+    # reserve stock, a product only moves when enough is left; the
+    # returned balance goes straight into the stock ledger
+    out_of_stock = []
+    stock_moves = []
+    for item, product in rows:
+        balance = db.session.execute(
+            update(Product)
+            .where(Product.id == product.id, Product.stock >= item.quantity)
+            .values(stock=Product.stock - item.quantity)
+            .returning(Product.stock)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if balance is None:
+            out_of_stock.append(product.id)
+            continue
+
+        stock_moves.append({
+            "product_id": product.id,
+            "supplier_id": product.supplier_id,
+            "delta": -item.quantity,
+            "balance": balance,
+            "reason": "checkout",
+        })
+
+    if out_of_stock:
+        db.session.rollback()
+        return jsonify({
+            "error": "Insufficient stock",
+            "product_ids": out_of_stock
+        }), 409
+
+    # stock moved through Core UPDATEs, which skip the mapper events
+    for _, product in rows:
+        mark_stale(db.session, *product_tags(product.id))
+
+    total = sum(product.price * item.quantity for item, product in rows)
+
+    order = Order(
+        user_id=current_user.id,
+        total_amount=total,
+        idempotency_key=idempotency_key
+    )
     db.session.add(order)
+
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # a concurrent retry with the same key won the race
+        db.session.rollback()
+        existing = Order.query.filter_by(
+            user_id=current_user.id, idempotency_key=idempotency_key
+        ).first_or_404()
+        return _order_response(existing.id, existing.total_amount)
+
+    db.session.execute(insert(OrderItem), [
+        {
+            "order_id": order.id,
+            "product_id": product.id,
+            "quantity": item.quantity,
+            "price": product.price,
+            "title": product.title,
+            "thumbnail": product.thumbnail,
+        }
+        for item, product in rows
+    ])
+
+    cart_id = rows[0][0].cart_id
+    CartItem.query.filter_by(cart_id=cart_id).delete(synchronize_session=False)
+    db.session.execute(
+        update(Cart).where(Cart.id == cart_id)
+        .values(started_at=None, subtotal=0.0, item_count=0, version=Cart.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+    record_stock_moves(db.session, [
+        dict(move, reference=f"order:{order.id}") for move in stock_moves
+    ])
+
+    record_order(db.session, order.created_at, [
+        (product.id, product.category_id, product.supplier_id, item.quantity, product.price)
+        for item, product in rows
+    ])
+
+    # side effects commit with the order and run in `flask jobs worker`
+    order_id = order.id
+    enqueue_many(db.session, [
+        ("order.confirmation", {"order_id": order_id}),
+        ("order.notify_suppliers", {"order_id": order_id}),
+        ("stock.check_alerts", {"product_ids": [product.id for _, product in rows]}),
+    ])
+
     db.session.commit()
 
-    # Add items to order
-    for item in cart.items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.product.price
-        )
-        db.session.add(order_item)
+    return _order_response(order_id, total)
 
 
-    # Clear cart 
-    for item in cart.items:
-        db.session.delete(item)
-    
-    db.session.commit()
+
+# ----------------------------------------------------------------
+# ORDER HISTORY
+# ?after=<next_after>&limit=<n>, newest first off ix_order_user_created;
+# line items carry their own title/thumbnail snapshot so neither
+# endpoint touches the catalog
+# ----------------------------------------------------------------
+@customer_bp.route("/orders", methods=["GET"])
+@login_required
+def get_orders():
+    after, limit = page_args()
+
+    # counted per row inside the same statement via ix_order_item_order
+    item_count = (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+    )
+
+    query = (
+        db.session.query(*ORDER.columns(), item_count.label("item_count"), keyset_column(Order.created_at))
+        .filter(Order.user_id == current_user.id)
+    )
+    if after is not None:
+        query = query.filter(keyset_after(Order, Order.created_at, after, descending=True))
+
+    query = query.order_by(*keyset_order(Order, Order.created_at, descending=True))
+    rows, next_after = keyset_page(query, limit, keyset_key(Order, Order.created_at))
+
+    items = []
+    for row in rows:
+        data = ORDER.dump_row(row)
+        data["item_count"] = row.item_count
+        items.append(data)
 
     return jsonify({
-        "message": "Order created",
-        "order_id": order.id,
-        "total": total
-    })
\ No newline at end of file
+        "items": items,
+        "next_after": next_after
+    })
+
+
+
+@customer_bp.route("/orders/<int:order_id>", methods=["GET"])
+@login_required
+def get_order(order_id):
+    order = (
+        db.session.query(*ORDER.columns())
+        .filter(Order.id == order_id, Order.user_id == current_user.id)
+        .first()
+    )
+    if not order:
+        return jsonify({"error": "Order not found"}), 404
+
+    items = ORDER_ITEM.dump_rows(
+        db.session.query(*ORDER_ITEM.columns())
+        .filter(OrderItem.order_id == order_id)
+        .order_by(OrderItem.id)
+        .all()
+    )
+
+    # orders placed before snapshots existed, one lookup for all of them
+    missing = [item["product_id"] for item in items if item["title"] is None]
+    if missing:
+        listings = {
+            row.id: row for row in
+            db.session.query(Product.id, Product.title, Product.thumbnail)
+            .filter(Product.id.in_(missing))
+        }
+        for item in items:
+            listing = listings.get(item["product_id"])
+            if item["title"] is None and listing is not None:
+                item["title"], item["thumbnail"] = listing.title, listing.thumbnail
+
+    data = ORDER.dump_row(order)
+    data["items"] = items
+    data["item_count"] = sum(item["quantity"] for item in items)
+
+    return jsonify(data)
@@ -1,36 +1,249 @@
-from flask import Blueprint, jsonify, request
-from app.models import Product, ProductImage, Review, ProductQnA
+from flask import Blueprint, g, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Category, Product, ProductImage, Review, ProductQnA, User
+from app.extensions import db
+from app.pagination import page_args, keyset_rows, keyset_order, keyset_after, keyset_column, keyset_key, MAX_LIMIT, DEFAULT_LIMIT
+from app.search import search_products
+from app.cache import cache
+from app.serializers import PRODUCT_LISTING, QNA, REVIEW, iter_keyset, ndjson_response
+from app.categories import category_tree, subtree_ids
 
 public_bp = Blueprint("public", __name__)
 
+
+# catalog reads can be served by the read replica when one is configured
+@public_bp.before_request
+def use_read_replica():
+    if request.method == "GET":
+        g.use_replica = True
+
+
 @public_bp.route("/status")
 def status():
     return jsonify({"message": "Public API working"})
 
 
 
+# sort key -> (column, descending)
+PRODUCT_SORTS = {
+    "id": (Product.id, False),
+    "newest": (Product.created_at, True),
+    "price_asc": (Product.price, False),
+    "price_desc": (Product.price, True),
+}
+
+
+# ?format=ndjson streams every matching product instead of one page
+STREAM_BATCH_SIZE = 1000
+
+
+def _product_select(args, after):
+    column, descending = PRODUCT_SORTS[args["sort"]]
+
+    # plain column tuples, category name joined into the same SELECT
+    stmt = (
+        select(*PRODUCT_LISTING.columns(), keyset_column(column))
+        .select_from(Product)
+        .outerjoin(Category, Product.category_id == Category.id)
+    )
+
+    if args["category_id"] is not None:
+        stmt = stmt.where(Product.category_id == args["category_id"])
+    if args.get("category_ids") is not None:
+        stmt = stmt.where(Product.category_id.in_(args["category_ids"]))
+    if args["min_price"] is not None:
+        stmt = stmt.where(Product.price >= args["min_price"])
+    if args["max_price"] is not None:
+        stmt = stmt.where(Product.price <= args["max_price"])
+    if args["in_stock"]:
+        stmt = stmt.where(Product.stock > 0)
+
+    if after is not None:
+        stmt = stmt.where(keyset_after(Product, column, after, descending))
+
+    return stmt.order_by(*keyset_order(Product, column, descending))
+
+
+
+def _product_key(args):
+    return keyset_key(Product, PRODUCT_SORTS[args["sort"]][0])
+
+
+
+def _product_page(args, after, limit):
+    stmt = _product_select(args, after).limit(limit + 1)
+    rows, next_after = keyset_rows(db.session.execute(stmt).all(), limit, _product_key(args))
+
+    return PRODUCT_LISTING.dump_rows(rows), next_after
+
+
+
+def _product_args():
+    """Sort and filters shared by the product listings, (args, error)."""
+    sort = request.args.get("sort", "id")
+    if sort not in PRODUCT_SORTS:
+        return None, (jsonify({"error": f"Invalid sort, use one of: {', '.join(PRODUCT_SORTS)}"}), 400)
+
+    return {
+        "sort": sort,
+        "category_id": request.args.get("category_id", type=int),
+        "min_price": request.args.get("min_price", type=float),
+        "max_price": request.args.get("max_price", type=float),
+        "in_stock": request.args.get("in_stock", "").lower() in ("1", "true", "yes"),
+    }, None
+
+
+
+def _product_listing(args):
+    after, limit = page_args()
+
+    if request.args.get("format") == "ndjson":
+        return ndjson_response(iter_keyset(
+            lambda after, limit: _product_page(args, after, limit), STREAM_BATCH_SIZE
+        ))
+
+    data, next_after = _product_page(args, after, limit)
+
+    return jsonify({
+        "items": data,
+        "next_after": next_after
+    })
+
+
+
 @public_bp.route("/products", methods=["GET"])
+@cache.cached(["products", "categories"])
 def get_products():
-    products = Product.query.all()
-
-    data = []
-    for p in products:
-        data.append({
-            "id": p.id,
-            "title": p.title,
-            "price": p.price,
-            "stock": p.stock,
-            "thumbnail": p.thumbnail,
-            "category": p.category.name if p.category else None,
-        })
+    args, error = _product_args()
+    if error:
+        return error
+
+    return _product_listing(args)
+
+
+
+# ----------------------------------------------------------------
+# CATEGORY BROWSING
+# the tree carries the maintained per-node counts; a subtree listing
+# resolves the node's descendants by path prefix, then pages
+# products with the same sorts and filters as /products
+# ----------------------------------------------------------------
+@public_bp.route("/categories", methods=["GET"])
+@cache.cached(["categories", "products"])
+def get_categories():
+    return jsonify({"items": category_tree()})
+
+
+
+@public_bp.route("/categories/<int:category_id>/products", methods=["GET"])
+@cache.cached(["products", "categories"])
+def get_category_products(category_id):
+    args, error = _product_args()
+    if error:
+        return error
+
+    category_ids = subtree_ids(category_id)
+    if not category_ids:
+        return jsonify({"error": "Category not found"}), 404
+
+    args["category_ids"] = category_ids
+    return _product_listing(args)
 
-    return jsonify(data)
 
 
+DETAIL_INCLUDES = ("reviews", "qna", "rating_summary")
+DETAIL_PREVIEW_LIMIT = 5
 
+
+# sort key -> (column, descending)
+REVIEW_SORTS = {
+    "newest": (Review.created_at, True),
+    "oldest": (Review.created_at, False),
+    "rating_desc": (Review.rating, True),
+    "rating_asc": (Review.rating, False),
+}
+
+QNA_SORTS = {
+    "newest": (ProductQnA.created_at, True),
+    "oldest": (ProductQnA.created_at, False),
+}
+
+
+def _review_select(product_id, after=None, sort="newest"):
+    column, descending = REVIEW_SORTS[sort]
+
+    # user name is joined in rather than lazy-loaded per review
+    stmt = (
+        select(*REVIEW.columns(), keyset_column(column))
+        .join(User, Review.user_id == User.id)
+        .where(Review.product_id == product_id)
+    )
+    if after is not None:
+        stmt = stmt.where(keyset_after(Review, column, after, descending))
+
+    return stmt.order_by(*keyset_order(Review, column, descending))
+
+
+
+def _review_page(product_id, limit, after=None, sort="newest"):
+    stmt = _review_select(product_id, after, sort).limit(limit + 1)
+    key = keyset_key(Review, REVIEW_SORTS[sort][0])
+    rows, next_after = keyset_rows(db.session.execute(stmt).all(), limit, key)
+
+    return REVIEW.dump_rows(rows), next_after
+
+
+
+def _qna_select(product_id, after=None, sort="newest"):
+    column, descending = QNA_SORTS[sort]
+
+    stmt = (
+        select(*QNA.columns(), keyset_column(column))
+        .join(User, ProductQnA.user_id == User.id)
+        .where(ProductQnA.product_id == product_id)
+    )
+    if after is not None:
+        stmt = stmt.where(keyset_after(ProductQnA, column, after, descending))
+
+    return stmt.order_by(*keyset_order(ProductQnA, column, descending))
+
+
+
+def _qna_page(product_id, limit, after=None, sort="newest"):
+    stmt = _qna_select(product_id, after, sort).limit(limit + 1)
+    key = keyset_key(ProductQnA, QNA_SORTS[sort][0])
+    rows, next_after = keyset_rows(db.session.execute(stmt).all(), limit, key)
+
+    return QNA.dump_rows(rows), next_after
+
+
+
+# ?include=reviews,qna,rating_summary
+# statements: product + category + supplier (1), images (1),
+# then at most one each for reviews and qna
 @public_bp.route("/products/<int:product_id>", methods=["GET"])
+@cache.cached(lambda product_id: [f"product:{product_id}", "categories"])
 def get_product(product_id):
-    product = Product.query.get_or_404(product_id)
+    includes = {
+        part.strip()
+        for part in request.args.get("include", "").split(",")
+        if part.strip()
+    }
+    unknown = includes - set(DETAIL_INCLUDES)
+    if unknown:
+        return jsonify({"error": f"Invalid include, use any of: {', '.join(DETAIL_INCLUDES)}"}), 400
+
+    product = (
+        Product.query
+        .options(
+            joinedload(Product.category),
+            joinedload(Product.supplier),
+            selectinload(Product.images),
+        )
+        .filter(Product.id == product_id)
+        .first_or_404()
+    )
 
     data = {
         "id": product.id,
@@ -43,40 +256,88 @@ def get_product(product_id):
         "supplier": product.supplier.name,
     }
 
+    if "rating_summary" in includes:
+        data["rating_summary"] = product.rating_summary()
+    if "reviews" in includes:
+        data["reviews"], _ = _review_page(product.id, DETAIL_PREVIEW_LIMIT)
+    if "qna" in includes:
+        data["qna"], _ = _qna_page(product.id, DETAIL_PREVIEW_LIMIT)
+
     return jsonify(data)
 
 
 
 @public_bp.route("/products/<int:product_id>/reviews", methods=["GET"])
+@cache.cached(lambda product_id: [f"reviews:{product_id}"])
 def get_reviews(product_id):
-    reviews = Review.query.filter_by(product_id=product_id).all()
-
-    data = []
-    for r in reviews:
-        data.append({
-            "id": r.id,
-            "rating": r.rating,
-            "comment": r.comment,
-            "user": r.user.name,
-            "created_at": r.created_at.strftime("%Y-%m-%d"),
-        })
+    after, limit = page_args()
 
-    return jsonify(data)
+    sort = request.args.get("sort", "newest")
+    if sort not in REVIEW_SORTS:
+        return jsonify({"error": f"Invalid sort, use one of: {', '.join(REVIEW_SORTS)}"}), 400
+
+    if request.args.get("format") == "ndjson":
+        return ndjson_response(iter_keyset(
+            lambda after, limit: _review_page(product_id, limit, after, sort), STREAM_BATCH_SIZE
+        ))
+
+    data, next_after = _review_page(product_id, limit, after, sort)
+
+    return jsonify({
+        "items": data,
+        "next_after": next_after
+    })
 
 
 
 @public_bp.route("/products/<int:product_id>/qna", methods=["GET"])
+@cache.cached(lambda product_id: [f"qna:{product_id}"])
 def get_qna(product_id):
-    qna = ProductQnA.query.filter_by(product_id=product_id).all()
-
-    data = []
-    for q in qna:
-        data.append({
-            "id": q.id,
-            "question": q.question,
-            "answer": q.answer,
-            "user": q.user.name,
-            "created_at": q.created_at.strftime("%Y-%m-%d"),
-        })
-
-    return jsonify(data)
\ No newline at end of file
+    after, limit = page_args()
+
+    sort = request.args.get("sort", "newest")
+    if sort not in QNA_SORTS:
+        return jsonify({"error": f"Invalid sort, use one of: {', '.join(QNA_SORTS)}"}), 400
+
+    if request.args.get("format") == "ndjson":
+        return ndjson_response(iter_keyset(
+            lambda after, limit: _qna_page(product_id, limit, after, sort), STREAM_BATCH_SIZE
+        ))
+
+    data, next_after = _qna_page(product_id, limit, after, sort)
+
+    return jsonify({
+        "items": data,
+        "next_after": next_after
+    })
+
+
+
+# ----------------------------------------------------------------
+# SEARCH
+# ?q=<terms>&category_id=&min_price=&max_price=&limit=&offset=
+# results are ranked, so pages are offset based
+# ----------------------------------------------------------------
+@public_bp.route("/search", methods=["GET"])
+def search():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_LIMIT))
+    offset = max(0, request.args.get("offset", 0, type=int))
+
+    result = search_products(
+        q,
+        category_id=request.args.get("category_id", type=int),
+        min_price=request.args.get("min_price", type=float),
+        max_price=request.args.get("max_price", type=float),
+        limit=limit,
+        offset=offset,
+    )
+
+    next_offset = offset + limit
+    result["next_offset"] = next_offset if next_offset < result["total"] else None
+
+    return jsonify(result)
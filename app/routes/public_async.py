@@ -0,0 +1,101 @@
+"""Native coroutine versions of the read-heavy public views, for ASGI mode.
+
+app.asgi.AsgiApp awaits these straight on the event loop, inside a
+Flask request context but outside any thread: the database round
+trip goes through async_db, so a request waiting on a query holds
+no thread. They build the same statements as their sync views in
+public.py and return the same bodies; caching, ETags, the replica
+switch and instrumentation apply as usual. NDJSON exports are not
+handled here, AsgiApp sends those to the sync views.
+"""
+from flask import jsonify, request
+
+from app.async_db import async_db
+from app.cache import cache
+from app.categories import build_tree, subtree_select, tree_select
+from app.pagination import keyset_key, keyset_rows, page_args
+from app.routes import public
+from app.serializers import PRODUCT_LISTING, QNA, REVIEW
+
+
+async def _page(stmt, limit, key, schema):
+    rows, next_after = keyset_rows(await async_db.all(stmt.limit(limit + 1)), limit, key)
+
+    return jsonify({
+        "items": schema.dump_rows(rows),
+        "next_after": next_after
+    })
+
+
+
+async def _product_listing(args):
+    after, limit = page_args()
+    return await _page(public._product_select(args, after), limit, public._product_key(args), PRODUCT_LISTING)
+
+
+
+@cache.cached(["products", "categories"])
+async def get_products():
+    args, error = public._product_args()
+    if error:
+        return error
+
+    return await _product_listing(args)
+
+
+
+@cache.cached(["categories", "products"])
+async def get_categories():
+    return jsonify({"items": build_tree(await async_db.all(tree_select()))})
+
+
+
+@cache.cached(["products", "categories"])
+async def get_category_products(category_id):
+    args, error = public._product_args()
+    if error:
+        return error
+
+    category_ids = await async_db.scalars(subtree_select(category_id))
+    if not category_ids:
+        return jsonify({"error": "Category not found"}), 404
+
+    args["category_ids"] = category_ids
+    return await _product_listing(args)
+
+
+
+@cache.cached(lambda product_id: [f"reviews:{product_id}"])
+async def get_reviews(product_id):
+    after, limit = page_args()
+
+    sort = request.args.get("sort", "newest")
+    if sort not in public.REVIEW_SORTS:
+        return jsonify({"error": f"Invalid sort, use one of: {', '.join(public.REVIEW_SORTS)}"}), 400
+
+    key = keyset_key(public.Review, public.REVIEW_SORTS[sort][0])
+    return await _page(public._review_select(product_id, after, sort), limit, key, REVIEW)
+
+
+
+@cache.cached(lambda product_id: [f"qna:{product_id}"])
+async def get_qna(product_id):
+    after, limit = page_args()
+
+    sort = request.args.get("sort", "newest")
+    if sort not in public.QNA_SORTS:
+        return jsonify({"error": f"Invalid sort, use one of: {', '.join(public.QNA_SORTS)}"}), 400
+
+    key = keyset_key(public.ProductQnA, public.QNA_SORTS[sort][0])
+    return await _page(public._qna_select(product_id, after, sort), limit, key, QNA)
+
+
+
+# public_bp endpoint -> native view
+NATIVE_VIEWS = {
+    "public.get_products": get_products,
+    "public.get_categories": get_categories,
+    "public.get_category_products": get_category_products,
+    "public.get_reviews": get_reviews,
+    "public.get_qna": get_qna,
+}
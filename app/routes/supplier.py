@@ -1,7 +1,14 @@
-from flask import Blueprint, jsonify, request
+import io
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from flask_login import current_user, login_required
-from app.models import Product, ProductImage, Category
+from sqlalchemy import bindparam, case, func
+from app.models import Product, ProductImage, Category, OrderItem, StockLedger, User, record_stock_moves, refresh_cart_totals
 from app.extensions import db
+from app.cache import mark_stale, product_tags
+from app.pagination import page_args, keyset_page, keyset_order, keyset_after, keyset_column, keyset_key
+from app.serializers import STOCK_MOVE, SUPPLIER_PRODUCT, iter_keyset, money, ndjson_response
+from app.catalog import FORMATS, WRITERS, format_from_request, import_products, iter_supplier_products
 
 
 supplier_bp = Blueprint("supplier", __name__)
@@ -96,6 +103,7 @@ def update_product(product_id):
     product.category_id = data.get("category_id", product.category_id)
     product.thumbnail = data.get("thumbnail", product.thumbnail)
 
+    # a price change re-totals every cart holding the product on flush
     db.session.commit()
 
     return jsonify({"message": "Product updated"})
@@ -124,6 +132,249 @@ def update_stock(product_id):
 
 
 
+# ----------------------------------------------------------------
+# BATCH STOCK / PRICE UPDATE
+# body: {"mode": "set" | "delta",
+#        "updates": [{"product_id": 1, "stock": 5, "price": 9.99}, ...]}
+# "delta" adds stock to the current value (clamped at zero) so sync
+# jobs never race a concurrent checkout with read-modify-write
+# ----------------------------------------------------------------
+STOCK_MODES = ("set", "delta")
+MAX_BATCH_UPDATES = 5000
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+
+def _validate_batch_updates(updates, mode):
+    if not isinstance(updates, list) or not updates:
+        return "updates must be a non-empty list"
+    if len(updates) > MAX_BATCH_UPDATES:
+        return f"At most {MAX_BATCH_UPDATES} updates per request"
+
+    for index, item in enumerate(updates):
+        if not isinstance(item, dict) or not _is_int(item.get("product_id")):
+            return f"Update {index}: product_id is required"
+        if "stock" not in item and "price" not in item:
+            return f"Update {index}: stock or price is required"
+
+        if "stock" in item:
+            if not _is_int(item["stock"]):
+                return f"Update {index}: stock must be an integer"
+            if mode == "set" and item["stock"] < 0:
+                return f"Update {index}: stock must not be negative"
+
+        if "price" in item:
+            price = item["price"]
+            if not isinstance(price, (int, float)) or isinstance(price, bool) or price < 0:
+                return f"Update {index}: price must be a non-negative number"
+
+    return None
+
+
+
+def _batch_update_statement(supplier_id, has_stock, has_price, mode):
+    product = Product.__table__
+    values = {}
+
+    if has_stock:
+        if mode == "delta":
+            new_stock = product.c.stock + bindparam("b_stock")
+            values["stock"] = case((new_stock < 0, 0), else_=new_stock)
+        else:
+            values["stock"] = bindparam("b_stock")
+    if has_price:
+        values["price"] = bindparam("b_price")
+
+    return (
+        product.update()
+        .where(product.c.id == bindparam("b_id"), product.c.supplier_id == supplier_id)
+        .values(**values)
+    )
+
+
+
+@supplier_bp.route("/products/batch", methods=["PATCH"])
+@login_required
+def batch_update_products():
+    ok, res, code = supplier_required()
+    if not ok:
+        return res, code
+
+    data = request.get_json(silent=True) or {}
+    updates = data.get("updates")
+    mode = data.get("mode", "set")
+
+    if mode not in STOCK_MODES:
+        return jsonify({"error": f"Invalid mode, use one of: {', '.join(STOCK_MODES)}"}), 400
+
+    error = _validate_batch_updates(updates, mode)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # ids that don't exist or belong to someone else are rejected; the
+    # rows stay locked so the ledger balances match what gets written
+    requested = {item["product_id"] for item in updates}
+    current_stock = dict(
+        db.session.query(Product.id, Product.stock)
+        .filter(Product.id.in_(requested), Product.supplier_id == current_user.id)
+        .with_for_update()
+        .all()
+    )
+    owned = set(current_stock)
+
+    # one executemany per distinct field shape, at most three statements
+    groups = {}
+    for item in updates:
+        if item["product_id"] not in owned:
+            continue
+
+        shape = ("stock" in item, "price" in item)
+        params = {"b_id": item["product_id"]}
+        if shape[0]:
+            params["b_stock"] = item["stock"]
+        if shape[1]:
+            params["b_price"] = item["price"]
+        groups.setdefault(shape, []).append(params)
+
+    for (has_stock, has_price), params in groups.items():
+        db.session.execute(
+            _batch_update_statement(current_user.id, has_stock, has_price, mode),
+            params
+        )
+
+    stock_moves = []
+    for item in updates:
+        product_id = item["product_id"]
+        if product_id not in owned or "stock" not in item:
+            continue
+
+        old = current_stock[product_id] or 0
+        new = max(0, old + item["stock"]) if mode == "delta" else item["stock"]
+        current_stock[product_id] = new
+        stock_moves.append({
+            "product_id": product_id,
+            "supplier_id": current_user.id,
+            "delta": new - old,
+            "balance": new,
+            "reason": "batch",
+        })
+    record_stock_moves(db.session, stock_moves)
+
+    # carts holding a repriced product get new totals in one statement
+    repriced = [
+        item["b_id"]
+        for (_, has_price), params in groups.items() if has_price
+        for item in params
+    ]
+    if repriced:
+        refresh_cart_totals(db.session, product_ids=repriced)
+
+    for product_id in owned:
+        mark_stale(db.session, *product_tags(product_id))
+
+    db.session.commit()
+
+    return jsonify({
+        "updated": len(owned),
+        "rejected": sorted(requested - owned)
+    })
+
+
+
+# ----------------------------------------------------------------
+# BULK IMPORT / EXPORT
+# body is streamed: CSV (text/csv) or NDJSON (application/x-ndjson)
+# ----------------------------------------------------------------
+@supplier_bp.route("/products/import", methods=["POST"])
+@login_required
+def import_catalog():
+    ok, res, code = supplier_required()
+    if not ok:
+        return res, code
+
+    fmt = format_from_request(request)
+    if fmt not in FORMATS:
+        return jsonify({"error": f"Invalid format, use one of: {', '.join(FORMATS)}"}), 400
+
+    batch_size = request.args.get("batch_size", type=int)
+    if batch_size is not None and batch_size < 1:
+        return jsonify({"error": "batch_size must be positive"}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    report = import_products(stream, fmt, current_user.id, batch_size)
+
+    return jsonify(report.to_dict())
+
+
+
+@supplier_bp.route("/my-products/export", methods=["GET"])
+@login_required
+def export_catalog():
+    ok, res, code = supplier_required()
+    if not ok:
+        return res, code
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"Invalid format, use one of: {', '.join(FORMATS)}"}), 400
+
+    writer, mimetype = WRITERS[fmt]
+    rows = iter_supplier_products(current_user.id)
+
+    return Response(
+        stream_with_context(writer(rows)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=products.{fmt}"}
+    )
+
+
+
+# ----------------------------------------------------------------
+# MY PRODUCTS
+# keyset pages over (supplier_id, id); units sold and revenue come
+# from one grouped aggregate per page, never one query per product
+# ----------------------------------------------------------------
+STREAM_BATCH_SIZE = 1000
+
+
+def _my_products_page(supplier_id, after, limit):
+    query = (
+        db.session.query(*SUPPLIER_PRODUCT.columns())
+        .filter(Product.supplier_id == supplier_id)
+    )
+    if after is not None:
+        query = query.filter(keyset_after(Product, Product.id, after))
+
+    rows, next_after = keyset_page(query.order_by(Product.id), limit)
+
+    sales = {}
+    if rows:
+        sales = {
+            product_id: (units, revenue)
+            for product_id, units, revenue in
+            db.session.query(
+                OrderItem.product_id,
+                func.sum(OrderItem.quantity),
+                func.sum(OrderItem.quantity * OrderItem.price)
+            )
+            .filter(OrderItem.product_id.in_([r.id for r in rows]))
+            .group_by(OrderItem.product_id)
+            .all()
+        }
+
+    data = SUPPLIER_PRODUCT.dump_rows(rows)
+    for item in data:
+        units, revenue = sales.get(item["id"], (0, 0))
+        item["units_sold"] = units or 0
+        item["revenue"] = money(revenue)
+
+    return data, next_after
+
+
+
 @supplier_bp.route("/my-products", methods=["GET"])
 @login_required
 def my_products():
@@ -131,16 +382,111 @@ def my_products():
     if not ok:
         return res, code
 
-    products = Product.query.filter_by(supplier_id=current_user.id).all()
+    if request.args.get("format") == "ndjson":
+        return ndjson_response(iter_keyset(
+            lambda after, limit: _my_products_page(current_user.id, after, limit), STREAM_BATCH_SIZE
+        ))
+
+    after, limit = page_args()
+    data, next_after = _my_products_page(current_user.id, after, limit)
+
+    return jsonify({
+        "items": data,
+        "next_after": next_after
+    })
+
+
+
+# ----------------------------------------------------------------
+# LOW STOCK
+# ?after=<next_after>&limit=<n>, lowest stock first. served by a
+# range scan on ix_product_supplier_stock (supplier_id, stock, id)
+# ----------------------------------------------------------------
+def _low_stock_threshold(supplier_id):
+    threshold = db.session.query(User.low_stock_threshold).filter(User.id == supplier_id).scalar()
+    if threshold is None:
+        threshold = current_app.config.get("LOW_STOCK_THRESHOLD", 5)
+    return threshold
+
+
+
+@supplier_bp.route("/low-stock", methods=["GET"])
+@login_required
+def low_stock():
+    ok, res, code = supplier_required()
+    if not ok:
+        return res, code
+
+    after, limit = page_args()
+    threshold = _low_stock_threshold(current_user.id)
+
+    query = (
+        db.session.query(*SUPPLIER_PRODUCT.columns(), keyset_column(Product.stock))
+        .filter(Product.supplier_id == current_user.id, Product.stock <= threshold)
+    )
+    if after is not None:
+        query = query.filter(keyset_after(Product, Product.stock, after))
+
+    query = query.order_by(*keyset_order(Product, Product.stock))
+    rows, next_after = keyset_page(query, limit, keyset_key(Product, Product.stock))
+
+    return jsonify({
+        "threshold": threshold,
+        "items": SUPPLIER_PRODUCT.dump_rows(rows),
+        "next_after": next_after
+    })
+
+
+
+@supplier_bp.route("/low-stock/threshold", methods=["PUT"])
+@login_required
+def set_low_stock_threshold():
+    ok, res, code = supplier_required()
+    if not ok:
+        return res, code
+
+    data = request.get_json(silent=True) or {}
+    threshold = data.get("threshold")
+    if threshold is not None and (not _is_int(threshold) or threshold < 0):
+        return jsonify({"error": "threshold must be a non-negative integer or null"}), 400
+
+    # null resets to the site default
+    db.session.query(User).filter(User.id == current_user.id).update(
+        {"low_stock_threshold": threshold}, synchronize_session=False
+    )
+    db.session.commit()
+
+    return jsonify({"threshold": _low_stock_threshold(current_user.id)})
+
 
-    data = []
-    for p in products:
-        data.append({
-            "id": p.id,
-            "title": p.title,
-            "price": p.price,
-            "stock": p.stock,
-            "thumbnail": p.thumbnail
-        })
 
-        return jsonify(data)
\ No newline at end of file
+# ----------------------------------------------------------------
+# STOCK HISTORY
+# ?after=<ledger id>&limit=<n>, newest first off ix_stock_ledger_product;
+# movements older than the last compaction live in the snapshots
+# ----------------------------------------------------------------
+@supplier_bp.route("/product/<int:product_id>/stock-history", methods=["GET"])
+@login_required
+def stock_history(product_id):
+    ok, res, code = supplier_required()
+    if not ok:
+        return res, code
+
+    product = Product.query.get_or_404(product_id)
+    if product.supplier_id != current_user.id:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    after, limit = page_args()
+
+    query = db.session.query(*STOCK_MOVE.columns()).filter(StockLedger.product_id == product_id)
+    if after is not None:
+        query = query.filter(keyset_after(StockLedger, StockLedger.id, after, descending=True))
+
+    rows, next_after = keyset_page(query.order_by(StockLedger.id.desc()), limit)
+
+    return jsonify({
+        "product_id": product_id,
+        "stock": product.stock,
+        "items": STOCK_MOVE.dump_rows(rows),
+        "next_after": next_after
+    })
@@ -0,0 +1,324 @@
+import re
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import DDL, case, column, event, func, inspect, literal, or_, select, text
+
+from app.extensions import db
+from app.models import Category, Product
+
+
+# upper bounds of the price facet buckets, the last bucket is open-ended
+PRICE_BUCKETS = (10, 25, 50, 100, 250, 500)
+
+TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+
+def parse_terms(q):
+    """Split a user query into terms, the last one prefix matched."""
+    terms = TERM_RE.findall(q or "")
+    if terms and not terms[-1].endswith("*"):
+        terms[-1] += "*"
+    return terms
+
+
+
+# ----------------------------------------------------------------
+# SQLITE FTS5 BACKEND
+# product_fts keeps title, description and category name keyed by
+# rowid = product.id; ranking is bm25 with title weighted highest
+# ----------------------------------------------------------------
+class SqliteFtsBackend:
+    name = "sqlite_fts"
+
+    create_sql = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+        "title, description, category, tokenize='unicode61', prefix='2 3')"
+    )
+
+    def create(self, connection):
+        connection.execute(text(self.create_sql))
+
+    def index(self, connection, product_ids):
+        if not product_ids:
+            return
+        self.remove(connection, product_ids)
+        connection.execute(
+            text(
+                "INSERT INTO product_fts (rowid, title, description, category) "
+                "SELECT p.id, p.title, p.description, COALESCE(c.name, '') "
+                "FROM product p LEFT JOIN category c ON c.id = p.category_id "
+                "WHERE p.id IN (SELECT value FROM json_each(:ids))"
+            ),
+            {"ids": _json_ids(product_ids)}
+        )
+
+    def remove(self, connection, product_ids):
+        if not product_ids:
+            return
+        connection.execute(
+            text("DELETE FROM product_fts WHERE rowid IN (SELECT value FROM json_each(:ids))"),
+            {"ids": _json_ids(product_ids)}
+        )
+
+    def rebuild(self, connection):
+        connection.execute(text("DROP TABLE IF EXISTS product_fts"))
+        self.create(connection)
+        connection.execute(text(
+            "INSERT INTO product_fts (rowid, title, description, category) "
+            "SELECT p.id, p.title, p.description, COALESCE(c.name, '') "
+            "FROM product p LEFT JOIN category c ON c.id = p.category_id"
+        ))
+
+    def matches(self, terms):
+        expression = " ".join(
+            '"{}"{}'.format(term.rstrip("*"), "*" if term.endswith("*") else "")
+            for term in terms
+        )
+        return (
+            text(
+                "SELECT rowid AS product_id, bm25(product_fts, 10.0, 1.0, 5.0) AS rank "
+                "FROM product_fts WHERE product_fts MATCH :expression"
+            )
+            .bindparams(expression=expression)
+            .columns(column("product_id"), column("rank"))
+            .subquery("matches")
+        )
+
+
+
+def _json_ids(product_ids):
+    return "[" + ",".join(str(int(pid)) for pid in product_ids) + "]"
+
+
+
+# ----------------------------------------------------------------
+# LIKE BACKEND
+# portable fallback for databases without a native index wired up;
+# nothing to maintain, ranks title hits ahead of other hits
+# ----------------------------------------------------------------
+class LikeBackend:
+    name = "like"
+
+    def create(self, connection):
+        pass
+
+    def index(self, connection, product_ids):
+        pass
+
+    def remove(self, connection, product_ids):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def matches(self, terms):
+        conditions = []
+        title_hits = []
+        for term in terms:
+            pattern = f"%{term.rstrip('*')}%"
+            conditions.append(or_(
+                Product.title.ilike(pattern),
+                Product.description.ilike(pattern),
+                Category.name.ilike(pattern),
+            ))
+            title_hits.append(case((Product.title.ilike(pattern), 1), else_=0))
+
+        return (
+            select(
+                Product.id.label("product_id"),
+                (literal(0) - sum(title_hits, literal(0))).label("rank")
+            )
+            .outerjoin(Category, Product.category_id == Category.id)
+            .where(*conditions)
+            .subquery("matches")
+        )
+
+
+
+BACKENDS = {
+    "sqlite_fts": SqliteFtsBackend(),
+    "like": LikeBackend(),
+}
+
+DIALECT_DEFAULTS = {
+    "sqlite": "sqlite_fts",
+}
+
+
+def register_backend(backend, dialect=None):
+    BACKENDS[backend.name] = backend
+    if dialect:
+        DIALECT_DEFAULTS[dialect] = backend.name
+
+
+
+def get_backend(dialect_name):
+    name = None
+    if has_app_context():
+        name = current_app.config.get("SEARCH_BACKEND")
+    return BACKENDS[name or DIALECT_DEFAULTS.get(dialect_name, "like")]
+
+
+
+# ----------------------------------------------------------------
+# INDEX MAINTENANCE
+# runs inside the flush, so the index commits or rolls back with
+# the product write itself
+# ----------------------------------------------------------------
+INDEXED_FIELDS = ("title", "description", "category_id")
+
+
+def index_products(connection, product_ids):
+    get_backend(connection.dialect.name).index(connection, product_ids)
+
+
+
+@event.listens_for(Product, "after_insert")
+def _product_inserted(mapper, connection, target):
+    index_products(connection, [target.id])
+
+
+
+@event.listens_for(Product, "after_update")
+def _product_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS):
+        index_products(connection, [target.id])
+
+
+
+@event.listens_for(Product, "after_delete")
+def _product_deleted(mapper, connection, target):
+    get_backend(connection.dialect.name).remove(connection, [target.id])
+
+
+
+@event.listens_for(Category, "after_update")
+def _category_updated(mapper, connection, target):
+    if not inspect(target).attrs.name.history.has_changes():
+        return
+
+    product_ids = connection.execute(
+        select(Product.id).where(Product.category_id == target.id)
+    ).scalars().all()
+    index_products(connection, product_ids)
+
+
+
+# the FTS table is created next to product by db.create_all()
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(SqliteFtsBackend.create_sql).execute_if(dialect="sqlite")
+)
+
+
+
+# ----------------------------------------------------------------
+# QUERY
+# ----------------------------------------------------------------
+def _price_bucket():
+    whens = []
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        whens.append((Product.price < upper, literal(lower)))
+        lower = upper
+    return case(*whens, else_=literal(lower))
+
+
+
+def search_products(q, category_id=None, min_price=None, max_price=None, limit=20, offset=0):
+    terms = parse_terms(q)
+    if not terms:
+        return {"items": [], "total": 0, "facets": {"category": [], "price": []}}
+
+    matches = get_backend(db.session.get_bind().dialect.name).matches(terms)
+
+    def filtered(query, skip_category=False, skip_price=False):
+        if category_id is not None and not skip_category:
+            query = query.where(Product.category_id == category_id)
+        if min_price is not None and not skip_price:
+            query = query.where(Product.price >= min_price)
+        if max_price is not None and not skip_price:
+            query = query.where(Product.price <= max_price)
+        return query
+
+    base = select().select_from(matches).join(Product, Product.id == matches.c.product_id)
+
+    rows = db.session.execute(filtered(
+        base.add_columns(
+            Product.id, Product.title, Product.price, Product.stock,
+            Product.thumbnail, Category.name.label("category"), matches.c.rank
+        )
+        .outerjoin(Category, Product.category_id == Category.id)
+        .order_by(matches.c.rank, Product.id)
+        .limit(limit)
+        .offset(offset)
+    )).all()
+
+    total = db.session.execute(filtered(base.add_columns(func.count()))).scalar()
+
+    # each facet ignores its own filter so the client can widen it again
+    category_facet = db.session.execute(filtered(
+        base.add_columns(Category.id, Category.name, func.count())
+        .join(Category, Product.category_id == Category.id)
+        .group_by(Category.id, Category.name)
+        .order_by(func.count().desc(), Category.name),
+        skip_category=True
+    )).all()
+
+    bucket = _price_bucket().label("bucket")
+    price_facet = db.session.execute(filtered(
+        base.add_columns(bucket, func.count())
+        .group_by(bucket)
+        .order_by(bucket),
+        skip_price=True
+    )).all()
+
+    upper_bounds = dict(zip((0,) + PRICE_BUCKETS, PRICE_BUCKETS + (None,)))
+
+    return {
+        "items": [
+            {
+                "id": r.id,
+                "title": r.title,
+                "price": r.price,
+                "stock": r.stock,
+                "thumbnail": r.thumbnail,
+                "category": r.category,
+                "score": round(-r.rank, 6),
+            }
+            for r in rows
+        ],
+        "total": total,
+        "facets": {
+            "category": [
+                {"id": cid, "name": name, "count": count}
+                for cid, name, count in category_facet
+            ],
+            "price": [
+                {"min": lower, "max": upper_bounds[lower], "count": count}
+                for lower, count in price_facet
+            ],
+        },
+    }
+
+
+
+# ----------------------------------------------------------------
+# CLI
+# flask search rebuild
+# ----------------------------------------------------------------
+search_cli = AppGroup("search", help="Product search index.")
+
+
+@search_cli.command("rebuild")
+def rebuild_command():
+    """Recreate the search index from the product table."""
+    with db.engine.begin() as connection:
+        backend = get_backend(connection.dialect.name)
+        backend.rebuild(connection)
+
+    click.echo(f"Rebuilt {backend.name} search index")
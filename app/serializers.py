@@ -0,0 +1,242 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+from app.models import (
+    CartItem, Category, Order, OrderItem, Product, ProductQnA, Review,
+    StockLedger, User,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# ----------------------------------------------------------------
+# ENCODER
+# orjson when it is installed, the stdlib otherwise; both produce
+# compact UTF-8 bytes. JSON_FAST_ENCODER=False forces the stdlib
+# ----------------------------------------------------------------
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+
+if orjson is not None:
+    def _orjson_dumps(obj):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    _orjson_dumps = None
+
+
+
+def _orjson_option(kwargs):
+    """orjson flags for json.dumps kwargs, None when one has no equivalent."""
+    option = orjson.OPT_NON_STR_KEYS
+    for key, value in kwargs.items():
+        if key == "sort_keys":
+            option |= orjson.OPT_SORT_KEYS if value else 0
+        elif key == "indent" and value in (None, 2):
+            option |= orjson.OPT_INDENT_2 if value else 0
+        else:
+            return None
+    return option
+
+
+dumps = _orjson_dumps or _stdlib_dumps
+
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Routes jsonify() and Response.json through the fast encoder."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        fast = app.config.get("JSON_FAST_ENCODER", True)
+        self._dumps = dumps if fast else _stdlib_dumps
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return self._dumps(obj).decode()
+
+        # json.dumps-style formatting asked for by the caller
+        option = _orjson_option(kwargs) if self._dumps is _orjson_dumps else None
+        if option is not None:
+            return orjson.dumps(obj, default=_default, option=option).decode()
+
+        kwargs.setdefault("default", _default)
+        kwargs.setdefault("ensure_ascii", False)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+
+# ----------------------------------------------------------------
+# SCHEMAS
+# an ordered set of output fields, each backed by a column
+# expression. listings select the column tuple and build dicts
+# straight from rows, no ORM entities are hydrated:
+#
+#   rows = db.session.query(*PRODUCT_LISTING.columns()).all()
+#   items = PRODUCT_LISTING.dump_rows(rows)
+# ----------------------------------------------------------------
+class Schema:
+    def __init__(self, fields, formats=None):
+        # fields: [(name, column expression)]
+        self.fields = list(fields)
+        self.names = tuple(name for name, _ in self.fields)
+        self.formats = dict(formats or {})
+
+    def columns(self):
+        return [expr.label(name) for name, expr in self.fields]
+
+    def dump_row(self, row):
+        data = dict(zip(self.names, row))
+        for name, fmt in self.formats.items():
+            data[name] = fmt(data[name])
+        return data
+
+    def dump_rows(self, rows):
+        return [self.dump_row(row) for row in rows]
+
+    def extend(self, fields, formats=None):
+        return Schema(self.fields + list(fields), {**self.formats, **(formats or {})})
+
+
+
+def day(value):
+    return value.strftime("%Y-%m-%d") if value else None
+
+
+
+def timestamp(value):
+    return value.isoformat() if value else None
+
+
+
+def money(value):
+    return round(float(value or 0), 2)
+
+
+
+# ----------------------------------------------------------------
+# MODEL SCHEMAS
+# joined columns (category, user, product) need the matching join
+# in the query that selects them
+# ----------------------------------------------------------------
+SUPPLIER_PRODUCT = Schema([
+    ("id", Product.id),
+    ("title", Product.title),
+    ("price", Product.price),
+    ("stock", Product.stock),
+    ("thumbnail", Product.thumbnail),
+])
+
+PRODUCT_LISTING = SUPPLIER_PRODUCT.extend([
+    ("category", Category.name),            # outer join Category
+])
+
+REVIEW = Schema([
+    ("id", Review.id),
+    ("rating", Review.rating),
+    ("comment", Review.comment),
+    ("user", User.name),                    # join User
+    ("created_at", Review.created_at),
+], formats={"created_at": day})
+
+QNA = Schema([
+    ("id", ProductQnA.id),
+    ("question", ProductQnA.question),
+    ("answer", ProductQnA.answer),
+    ("user", User.name),                    # join User
+    ("created_at", ProductQnA.created_at),
+], formats={"created_at": day})
+
+CART_ITEM = Schema([
+    ("id", CartItem.id),
+    ("product_id", CartItem.product_id),
+    ("title", Product.title),               # join Product
+    ("price", Product.price),
+    ("quantity", CartItem.quantity),
+    ("thumbnail", Product.thumbnail),
+])
+
+ORDER = Schema([
+    ("id", Order.id),
+    ("status", Order.status),
+    ("total", Order.total_amount),
+    ("created_at", Order.created_at),
+], formats={"created_at": timestamp})
+
+ORDER_ITEM = Schema([
+    ("product_id", OrderItem.product_id),
+    ("title", OrderItem.title),
+    ("thumbnail", OrderItem.thumbnail),
+    ("quantity", OrderItem.quantity),
+    ("price", OrderItem.price),
+    ("subtotal", OrderItem.price * OrderItem.quantity),
+], formats={"subtotal": money})
+
+
+STOCK_MOVE = Schema([
+    ("id", StockLedger.id),
+    ("delta", StockLedger.delta),
+    ("balance", StockLedger.balance),
+    ("reason", StockLedger.reason),
+    ("reference", StockLedger.reference),
+    ("created_at", StockLedger.created_at),
+], formats={"created_at": timestamp})
+
+
+# ----------------------------------------------------------------
+# NDJSON STREAMING
+# one encoded object per line, generated while the client reads
+# ----------------------------------------------------------------
+def ndjson_lines(items):
+    for item in items:
+        yield dumps(item) + b"\n"
+
+
+
+def ndjson_response(items, headers=None):
+    return Response(
+        stream_with_context(ndjson_lines(items)),
+        mimetype="application/x-ndjson",
+        headers=headers
+    )
+
+
+
+def iter_keyset(fetch_page, batch_size):
+    """Walk every page of a keyset listing.
+
+    `fetch_page(after, limit)` returns (items, next_after) like the
+    paginated endpoints do.
+    """
+    after = None
+    while True:
+        items, after = fetch_page(after, batch_size)
+        yield from items
+        if after is None:
+            return
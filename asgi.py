@@ -0,0 +1,21 @@
+"""Production ASGI entry point.
+
+    WEB_CONCURRENCY=4 uvicorn asgi:application --workers 4 --host 0.0.0.0 --port 8000
+
+Same factory as wsgi.py. The read-heavy public listings
+(/api/products, /api/categories, category products, reviews and Q&A
+pages) run as native coroutines over an async engine (aiosqlite for
+SQLite, asyncpg for PostgreSQL, or ASYNC_DATABASE_URL), so a request
+waiting on the database holds no thread; everything else runs the
+Flask app on ASGI_THREADS threads per worker. Give the worker count
+as WEB_CONCURRENCY as well, the app reads it to reject per-process
+caches. Needs asgiref, uvicorn and the async driver.
+"""
+import os
+
+from app import create_app
+
+os.environ.setdefault("APP_CONFIG", "production")
+
+app = create_app(asgi=True)
+application = app.asgi_app
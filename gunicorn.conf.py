@@ -0,0 +1,36 @@
+"""gunicorn settings for the WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every value can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# processes side-step the GIL, threads cover database and hashing waits
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# tells the app it is one of several processes, so per-process
+# caches (CACHE_BACKEND=lru) are refused, and how many threads each
+# has, which sizes the password hashing slots and pool
+raw_env = [f"WEB_CONCURRENCY={workers}", f"GUNICORN_THREADS={threads}"]
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# recycle workers now and then so slow leaks never add up
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = 200
+
+# each worker builds its own app: engines, pools and the password
+# hashing workers must not be shared across a fork
+preload_app = False
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
@@ -0,0 +1,100 @@
+"""hot path indexes
+
+Composite indexes matching the filters and keyset orderings of the
+public, customer and supplier routes (every key ends with id so pages
+never need a sort step), plus one CartItem row per (cart, product).
+
+Revision ID: b8b558f851d2
+Revises: b430c33d1254
+Create Date: 2026-10-18 20:41:35.905012
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8b558f851d2'
+down_revision = 'b430c33d1254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # fold duplicate cart lines into the oldest one before the unique
+    # constraint goes on
+    op.execute(sa.text(
+        "UPDATE cart_item SET quantity = ("
+        " SELECT SUM(COALESCE(dup.quantity, 1)) FROM cart_item dup"
+        " WHERE dup.cart_id = cart_item.cart_id AND dup.product_id = cart_item.product_id"
+        ") WHERE id IN ("
+        " SELECT MIN(id) FROM cart_item GROUP BY cart_id, product_id HAVING COUNT(*) > 1"
+        ")"
+    ))
+    op.execute(sa.text(
+        "DELETE FROM cart_item WHERE id NOT IN ("
+        " SELECT MIN(id) FROM cart_item GROUP BY cart_id, product_id"
+        ")"
+    ))
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.create_index('ix_cart_item_product', ['product_id'], unique=False)
+        batch_op.create_unique_constraint('uq_cart_item_cart_product', ['cart_id', 'product_id'])
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_user_created', ['user_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.create_index('ix_order_item_order', ['order_id'], unique=False)
+        batch_op.create_index('ix_order_item_product', ['product_id', 'quantity', 'price'], unique=False)
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_category_created', ['category_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_product_category_id', ['category_id', 'id'], unique=False)
+        batch_op.create_index('ix_product_category_price', ['category_id', 'price', 'id'], unique=False)
+        batch_op.create_index('ix_product_created', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_product_price', ['price', 'id'], unique=False)
+        batch_op.create_index('ix_product_supplier_id', ['supplier_id', 'id'], unique=False)
+        batch_op.create_index('ix_product_supplier_stock', ['supplier_id', 'stock', 'id'], unique=False)
+
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.create_index('ix_product_image_product', ['product_id'], unique=False)
+
+    with op.batch_alter_table('product_qn_a', schema=None) as batch_op:
+        batch_op.create_index('ix_product_qna_product_created', ['product_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('review', schema=None) as batch_op:
+        batch_op.create_index('ix_review_product_created', ['product_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_review_product_rating', ['product_id', 'rating', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('review', schema=None) as batch_op:
+        batch_op.drop_index('ix_review_product_rating')
+        batch_op.drop_index('ix_review_product_created')
+
+    with op.batch_alter_table('product_qn_a', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_qna_product_created')
+
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_image_product')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_supplier_stock')
+        batch_op.drop_index('ix_product_supplier_id')
+        batch_op.drop_index('ix_product_price')
+        batch_op.drop_index('ix_product_created')
+        batch_op.drop_index('ix_product_category_price')
+        batch_op.drop_index('ix_product_category_id')
+        batch_op.drop_index('ix_product_category_created')
+
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_item_product')
+        batch_op.drop_index('ix_order_item_order')
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_user_created')
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cart_item_cart_product', type_='unique')
+        batch_op.drop_index('ix_cart_item_product')
@@ -0,0 +1,261 @@
+"""denormalized columns and new tables
+
+Rating summaries, cart totals, order line snapshots, the category
+tree, the stock ledger, sales rollups and the job queue. Existing rows
+are backfilled here; the sales rollups come from
+`flask analytics backfill` once this has run.
+
+Revision ID: e41c7a9d2f60
+Revises: b8b558f851d2
+Create Date: 2026-10-18 20:58:12.417093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41c7a9d2f60'
+down_revision = 'b8b558f851d2'
+branch_labels = None
+depends_on = None
+
+
+FTS_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "title, description, category, tokenize='unicode61', prefix='2 3')"
+)
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=100), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.create_index('ix_job_status_run_at', ['status', 'run_at'], unique=False)
+
+    op.create_table('sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('carts_started', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('sales_daily_category',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+    sa.PrimaryKeyConstraint('day', 'category_id')
+    )
+    op.create_table('sales_daily_supplier',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('supplier_id', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['supplier_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('day', 'supplier_id')
+    )
+    op.create_table('sales_daily_product',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    op.create_table('stock_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('supplier_id', sa.Integer(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('balance', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(length=30), nullable=False),
+    sa.Column('reference', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.ForeignKeyConstraint(['supplier_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_ledger', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_ledger_created', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_stock_ledger_product', ['product_id', 'id'], unique=False)
+
+    op.create_table('stock_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('supplier_id', sa.Integer(), nullable=False),
+    sa.Column('period_end', sa.DateTime(), nullable=False),
+    sa.Column('balance', sa.Integer(), nullable=False),
+    sa.Column('net_delta', sa.Integer(), nullable=False),
+    sa.Column('movements', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.ForeignKeyConstraint(['supplier_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_snapshot_product', ['product_id', 'period_end'], unique=False)
+
+    with op.batch_alter_table('cart', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('started_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('subtotal', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('path', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('depth', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('product_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('subtree_product_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_category_parent', ['parent_id'], unique=False)
+        batch_op.create_index('ix_category_path', ['path'], unique=False)
+        batch_op.create_foreign_key('fk_category_parent_id', 'category', ['parent_id'], ['id'])
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=100), nullable=True))
+        batch_op.create_unique_constraint('uq_order_user_idempotency_key', ['user_id', 'idempotency_key'])
+
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('title', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('thumbnail', sa.String(length=200), nullable=True))
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_1_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_2_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_3_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_4_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_5_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('low_stock_threshold', sa.Integer(), nullable=True))
+
+    backfill()
+
+
+def backfill():
+    # every existing category is a root
+    op.execute(sa.text(
+        "UPDATE category SET path = '/' || id || '/', depth = 0,"
+        " product_count = (SELECT COUNT(*) FROM product WHERE product.category_id = category.id),"
+        " subtree_product_count = (SELECT COUNT(*) FROM product WHERE product.category_id = category.id)"
+    ))
+
+    stars = ", ".join(
+        f"rating_{n}_count = (SELECT COUNT(*) FROM review"
+        f" WHERE review.product_id = product.id AND review.rating = {n})"
+        for n in range(1, 6)
+    )
+    op.execute(sa.text(
+        "UPDATE product SET"
+        " rating_count = (SELECT COUNT(*) FROM review WHERE review.product_id = product.id),"
+        " rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM review WHERE review.product_id = product.id),"
+        f" {stars}"
+    ))
+
+    op.execute(sa.text(
+        "UPDATE cart SET"
+        " subtotal = (SELECT COALESCE(SUM(cart_item.quantity * product.price), 0)"
+        "  FROM cart_item JOIN product ON product.id = cart_item.product_id"
+        "  WHERE cart_item.cart_id = cart.id),"
+        " item_count = (SELECT COALESCE(SUM(quantity), 0) FROM cart_item WHERE cart_item.cart_id = cart.id)"
+    ))
+
+    op.execute(sa.text(
+        "UPDATE order_item SET"
+        " title = (SELECT title FROM product WHERE product.id = order_item.product_id),"
+        " thumbnail = (SELECT thumbnail FROM product WHERE product.id = order_item.product_id)"
+    ))
+
+    # the ledger opens at today's stock so later balances add up
+    op.execute(sa.text(
+        "INSERT INTO stock_ledger (product_id, supplier_id, delta, balance, reason, created_at)"
+        " SELECT id, supplier_id, COALESCE(stock, 0), COALESCE(stock, 0), 'opening', CURRENT_TIMESTAMP"
+        " FROM product WHERE COALESCE(stock, 0) != 0"
+    ))
+
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(sa.text(FTS_CREATE))
+        op.execute(sa.text(
+            "INSERT INTO product_fts (rowid, title, description, category)"
+            " SELECT p.id, p.title, p.description, COALESCE(c.name, '')"
+            " FROM product p LEFT JOIN category c ON c.id = p.category_id"
+        ))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(sa.text("DROP TABLE IF EXISTS product_fts"))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('low_stock_threshold')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('rating_5_count')
+        batch_op.drop_column('rating_4_count')
+        batch_op.drop_column('rating_3_count')
+        batch_op.drop_column('rating_2_count')
+        batch_op.drop_column('rating_1_count')
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('rating_count')
+
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_column('thumbnail')
+        batch_op.drop_column('title')
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_order_user_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_category_parent_id', type_='foreignkey')
+        batch_op.drop_index('ix_category_path')
+        batch_op.drop_index('ix_category_parent')
+        batch_op.drop_column('subtree_product_count')
+        batch_op.drop_column('product_count')
+        batch_op.drop_column('depth')
+        batch_op.drop_column('path')
+        batch_op.drop_column('parent_id')
+
+    with op.batch_alter_table('cart', schema=None) as batch_op:
+        batch_op.drop_column('version')
+        batch_op.drop_column('item_count')
+        batch_op.drop_column('subtotal')
+        batch_op.drop_column('started_at')
+
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_snapshot_product')
+
+    op.drop_table('stock_snapshot')
+    with op.batch_alter_table('stock_ledger', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_ledger_product')
+        batch_op.drop_index('ix_stock_ledger_created')
+
+    op.drop_table('stock_ledger')
+    op.drop_table('sales_daily_product')
+    op.drop_table('sales_daily_supplier')
+    op.drop_table('sales_daily_category')
+    op.drop_table('sales_daily')
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_status_run_at')
+
+    op.drop_table('job')
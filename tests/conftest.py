@@ -0,0 +1,75 @@
+"""Shared fixtures.
+
+`app` is built on a fresh in-memory database. Tests open their own
+app_context() for direct database work and go through a test client
+for requests, so every request gets its own session like it would
+in production.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import Category, Product, User
+
+
+PASSWORD = "secret"
+
+
+class Config(TestingConfig):
+    CACHE_BACKEND = "lru"
+
+
+
+@pytest.fixture
+def app():
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+
+@pytest.fixture
+def catalog(app):
+    """A supplier, a customer, one category and one product, by id."""
+    with app.app_context():
+        supplier = User(name="Supplier", email="supplier@example.com", role="supplier")
+        customer = User(name="Customer", email="customer@example.com", role="customer")
+        for user in (supplier, customer):
+            user.set_password(PASSWORD)
+        category = Category(name="Books")
+        db.session.add_all([supplier, customer, category])
+        db.session.flush()
+
+        product = Product(
+            supplier_id=supplier.id, category_id=category.id,
+            title="Field guide", description="Birds of the coast", price=10.0, stock=20,
+        )
+        db.session.add(product)
+        db.session.commit()
+
+        return SimpleNamespace(
+            supplier_id=supplier.id, customer_id=customer.id,
+            category_id=category.id, product_id=product.id,
+        )
+
+
+
+@pytest.fixture
+def login(app):
+    """login(email) -> a test client holding that user's session."""
+    def login(email):
+        client = app.test_client()
+        response = client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.get_json()
+        return client
+
+    return login
@@ -0,0 +1,73 @@
+"""Response cache tags are bumped after commit, never before, and a
+write to anything a cached page shows makes the next read a MISS."""
+from app.cache import cache
+from app.extensions import db
+from app.models import Product, User
+
+
+def test_tags_bump_only_after_commit(app, catalog):
+    with app.app_context():
+        before = cache.backend.versions(["products", f"product:{catalog.product_id}"])
+
+        product = db.session.get(Product, catalog.product_id)
+        product.price = 12.5
+        db.session.flush()
+        assert cache.backend.versions(["products", f"product:{catalog.product_id}"]) == before
+
+        db.session.commit()
+        after = cache.backend.versions(["products", f"product:{catalog.product_id}"])
+        assert after == [version + 1 for version in before]
+
+
+
+def test_rolled_back_write_keeps_the_cache(app, catalog):
+    client = app.test_client()
+    assert client.get("/api/products").headers["X-Cache"] == "MISS"
+
+    with app.app_context():
+        db.session.get(Product, catalog.product_id).price = 99.0
+        db.session.flush()
+        db.session.rollback()
+
+    assert client.get("/api/products").headers["X-Cache"] == "HIT"
+
+
+
+def test_product_update_is_a_miss(app, catalog, login):
+    client = app.test_client()
+    path = f"/api/products/{catalog.product_id}"
+    assert client.get(path).headers["X-Cache"] == "MISS"
+    assert client.get(path).headers["X-Cache"] == "HIT"
+    assert client.get("/api/products").headers["X-Cache"] == "MISS"
+
+    supplier = login("supplier@example.com")
+    response = supplier.put(f"/api/supplier/product/{catalog.product_id}/update", json={"price": 14.0})
+    assert response.status_code == 200, response.get_json()
+
+    detail = client.get(path)
+    assert detail.headers["X-Cache"] == "MISS"
+    assert detail.get_json()["price"] == 14.0
+
+    listing = client.get("/api/products")
+    assert listing.headers["X-Cache"] == "MISS"
+    assert listing.get_json()["items"][0]["price"] == 14.0
+
+
+
+def test_supplier_rename_is_a_miss_on_their_products(app, catalog):
+    client = app.test_client()
+    path = f"/api/products/{catalog.product_id}"
+    assert client.get(path).get_json()["supplier"] == "Supplier"
+
+    with app.app_context():
+        db.session.get(User, catalog.customer_id).name = "Someone else"
+        db.session.commit()
+    assert client.get(path).headers["X-Cache"] == "HIT"
+
+    with app.app_context():
+        db.session.get(User, catalog.supplier_id).name = "Coastal Books"
+        db.session.commit()
+
+    detail = client.get(path)
+    assert detail.headers["X-Cache"] == "MISS"
+    assert detail.get_json()["supplier"] == "Coastal Books"
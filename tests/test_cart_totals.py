@@ -0,0 +1,127 @@
+"""The cart row's subtotal, item_count and version stay in step with
+its lines through every cart endpoint and a supplier price change."""
+import pytest
+
+from app.extensions import db
+from app.models import Product
+
+
+@pytest.fixture
+def products(app, catalog):
+    with app.app_context():
+        pen = Product(
+            supplier_id=catalog.supplier_id, category_id=catalog.category_id,
+            title="Pen", description="Blue ink", price=4.5, stock=50,
+        )
+        db.session.add(pen)
+        db.session.commit()
+        return catalog.product_id, pen.id
+
+
+
+def summary(client):
+    response = client.get("/api/customer/cart?summary=1")
+    assert response.status_code == 200
+    return response.get_json()
+
+
+
+def assert_consistent(client):
+    """The maintained columns agree with the lines they summarize."""
+    cart = client.get("/api/customer/cart").get_json()
+    assert cart["subtotal"] == round(sum(i["price"] * i["quantity"] for i in cart["items"]), 2)
+    assert cart["item_count"] == sum(i["quantity"] for i in cart["items"])
+    return cart
+
+
+
+def test_totals_follow_each_cart_endpoint(app, login, products):
+    guide, pen = products
+    client = login("customer@example.com")
+    versions = [summary(client)["version"]]
+
+    def step(subtotal, item_count):
+        cart = summary(client)
+        assert (cart["subtotal"], cart["item_count"]) == (subtotal, item_count)
+        assert cart["version"] > versions[-1]
+        versions.append(cart["version"])
+        assert_consistent(client)
+
+    client.post("/api/customer/cart/add", json={"product_id": guide, "quantity": 2})
+    step(20.0, 2)
+
+    client.patch("/api/customer/cart", json={"operations": [
+        {"op": "add", "product_id": pen, "quantity": 3},
+        {"op": "add", "product_id": guide, "quantity": 1},
+    ]})
+    step(43.5, 6)
+
+    items = {i["product_id"]: i["id"] for i in client.get("/api/customer/cart").get_json()["items"]}
+    client.put("/api/customer/cart/update", json={"item_id": items[guide], "quantity": 1})
+    step(23.5, 4)
+
+    client.delete(f"/api/customer/cart/remove/{items[pen]}")
+    step(10.0, 1)
+
+    client.patch("/api/customer/cart", json={"operations": [{"op": "set", "product_id": guide, "quantity": 0}]})
+    step(0, 0)
+
+    client.patch("/api/customer/cart", json={"operations": [{"op": "set", "product_id": pen, "quantity": 2}]})
+    step(9.0, 2)
+
+    client.delete("/api/customer/cart/clear")
+    step(0, 0)
+
+
+
+def test_supplier_reprice_updates_carts_holding_the_product(app, login, products):
+    guide, pen = products
+    client = login("customer@example.com")
+    client.patch("/api/customer/cart", json={"operations": [
+        {"op": "add", "product_id": guide, "quantity": 2},
+        {"op": "add", "product_id": pen, "quantity": 1},
+    ]})
+    before = client.get("/api/customer/cart?summary=1")
+    etag = before.headers["ETag"].strip('"')
+
+    supplier = login("supplier@example.com")
+    response = supplier.put(f"/api/supplier/product/{guide}/update", json={"price": 12.0})
+    assert response.status_code == 200, response.get_json()
+
+    after = client.get("/api/customer/cart?summary=1", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    cart = after.get_json()
+    assert cart["subtotal"] == 28.5
+    assert cart["item_count"] == 3
+    assert cart["version"] > before.get_json()["version"]
+    assert_consistent(client)
+
+
+
+def test_unchanged_summary_is_not_modified(app, login, products):
+    guide, _ = products
+    client = login("customer@example.com")
+    client.post("/api/customer/cart/add", json={"product_id": guide, "quantity": 1})
+
+    etag = client.get("/api/customer/cart?summary=1").headers["ETag"].strip('"')
+    assert client.get("/api/customer/cart?summary=1", headers={"If-None-Match": etag}).status_code == 304
+
+
+
+@pytest.mark.parametrize("operation, error", [
+    ({"op": "add", "product_id": True, "quantity": 1}, "product_id is required"),
+    ({"op": "remove", "product_id": False}, "product_id is required"),
+    ({"op": "set", "product_id": 1, "quantity": -2}, "quantity must not be negative"),
+    ({"op": "add", "product_id": 1, "quantity": 0}, "quantity must be positive"),
+    ({"op": "set", "product_id": 1, "quantity": True}, "quantity must be an integer"),
+])
+def test_invalid_operations_leave_the_cart_alone(app, login, products, operation, error):
+    guide, _ = products
+    client = login("customer@example.com")
+    client.post("/api/customer/cart/add", json={"product_id": guide, "quantity": 2})
+    before = summary(client)
+
+    response = client.patch("/api/customer/cart", json={"operations": [operation]})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == f"Operation 0: {error}"
+    assert summary(client) == before
@@ -0,0 +1,105 @@
+"""Catalog import reports bad rows by line and keeps the good ones,
+including rows the database rejects mid-batch."""
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app.extensions import db
+from app.models import Category, Product, StockLedger
+from app.search import search_products
+
+
+def ndjson(*rows):
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows) + "\n"
+
+
+
+def book(title, **extra):
+    return {"title": title, "description": "Paperback", "price": 5, "stock": 2, "category": "books", **extra}
+
+
+
+def import_rows(client, body, **args):
+    response = client.post(
+        "/api/supplier/products/import", query_string={"format": "ndjson", **args},
+        data=body, content_type="application/x-ndjson",
+    )
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+
+@pytest.fixture
+def poison(app):
+    """Make the database itself refuse any product titled "Poison"."""
+    with app.app_context():
+        db.session.execute(text(
+            "CREATE TRIGGER reject_poison BEFORE INSERT ON product "
+            "WHEN NEW.title = 'Poison' BEGIN SELECT RAISE(ABORT, 'poison row'); END"
+        ))
+        db.session.commit()
+
+
+
+def test_invalid_rows_are_reported_by_line(app, catalog, login):
+    supplier = login("supplier@example.com")
+    report = import_rows(supplier, ndjson(
+        book("One"),
+        "{not json",
+        book("", description="untitled"),
+        book("Two", price=-1),
+        book("Three", category="Nowhere"),
+        book("Four", images=["a.jpg", "b.jpg"]),
+    ))
+
+    assert report["inserted"] == 2
+    assert report["error_count"] == 4
+    assert [(e["line"], e["error"].split(":")[0]) for e in report["errors"]] == [
+        (2, "Invalid JSON"),
+        (3, "title is required"),
+        (4, "price must not be negative"),
+        (5, "Unknown category"),
+    ]
+
+    with app.app_context():
+        four = Product.query.filter_by(title="Four").one()
+        assert len(four.images) == 2
+
+
+
+def test_database_rejection_only_drops_that_row(app, catalog, login, poison):
+    supplier = login("supplier@example.com")
+    report = import_rows(
+        supplier,
+        ndjson(book("A"), book("B"), book("Poison"), book("C"), book("D"), book("E")),
+        batch_size=3,
+    )
+
+    # the first batch fails as a whole and is retried row by row,
+    # the second batch goes in untouched
+    assert report["inserted"] == 5
+    assert report["errors"] == [{"line": 3, "error": "poison row"}]
+
+    with app.app_context():
+        titles = {title for (title,) in db.session.query(Product.title)}
+        assert titles == {"Field guide", "A", "B", "C", "D", "E"}
+
+        # the rejected row left no ledger entry, index entry or count behind
+        imported = db.session.query(Product.id).filter(Product.title != "Field guide")
+        assert StockLedger.query.filter(StockLedger.product_id.in_(imported)).count() == 5
+        assert db.session.get(Category, catalog.category_id).product_count == 6
+        assert search_products("paperback")["total"] == 5
+
+
+
+def test_whole_batch_rejected_still_reports_each_row(app, catalog, login, poison):
+    supplier = login("supplier@example.com")
+    report = import_rows(supplier, ndjson(book("Poison"), book("Poison")), batch_size=10)
+
+    assert report["inserted"] == 0
+    assert [e["line"] for e in report["errors"]] == [1, 2]
+
+    with app.app_context():
+        assert Product.query.count() == 1
+        assert db.session.get(Category, catalog.category_id).product_count == 1
@@ -0,0 +1,142 @@
+"""Category paths and the maintained product counts follow category
+moves and product writes, and agree with a full rebuild_tree()."""
+import pytest
+
+from app.categories import rebuild_tree
+from app.extensions import db
+from app.models import Category, Product
+
+
+def snapshot():
+    rows = db.session.query(
+        Category.name, Category.path, Category.depth,
+        Category.product_count, Category.subtree_product_count,
+    )
+    return {name: (path, depth, direct, total) for name, path, depth, direct, total in rows}
+
+
+
+def assert_matches_rebuild():
+    db.session.expire_all()
+    maintained = snapshot()
+    rebuild_tree()
+    db.session.expire_all()
+    assert maintained == snapshot()
+
+
+
+@pytest.fixture
+def tree(app, catalog):
+    """outdoors > hiking > boots, plus a second root, gear."""
+    with app.app_context():
+        outdoors = Category(name="outdoors")
+        gear = Category(name="gear")
+        db.session.add_all([outdoors, gear])
+        db.session.flush()
+        hiking = Category(name="hiking", parent_id=outdoors.id)
+        db.session.add(hiking)
+        db.session.flush()
+        boots = Category(name="boots", parent_id=hiking.id)
+        db.session.add(boots)
+        db.session.flush()
+
+        for title, category in [("Trail boot", boots), ("Winter boot", boots), ("Map", hiking), ("Rope", gear)]:
+            db.session.add(Product(
+                supplier_id=catalog.supplier_id, category_id=category.id,
+                title=title, description=title, price=5.0, stock=1,
+            ))
+        db.session.commit()
+
+        return {c.name: c.id for c in (outdoors, gear, hiking, boots)}
+
+
+
+def test_counts_follow_product_inserts(app, tree):
+    with app.app_context():
+        ids = tree
+        state = snapshot()
+        assert state["outdoors"] == (f"/{ids['outdoors']}/", 0, 0, 3)
+        assert state["hiking"] == (f"/{ids['outdoors']}/{ids['hiking']}/", 1, 1, 3)
+        assert state["boots"][1:] == (2, 2, 2)
+        assert state["gear"][2:] == (1, 1)
+        assert_matches_rebuild()
+
+
+
+def test_reparenting_moves_the_subtree_and_its_counts(app, tree):
+    with app.app_context():
+        ids = tree
+        db.session.get(Category, ids["hiking"]).parent_id = ids["gear"]
+        db.session.commit()
+
+        state = snapshot()
+        assert state["hiking"] == (f"/{ids['gear']}/{ids['hiking']}/", 1, 1, 3)
+        assert state["boots"][:2] == (f"/{ids['gear']}/{ids['hiking']}/{ids['boots']}/", 2)
+        assert state["outdoors"][2:] == (0, 0)
+        assert state["gear"][2:] == (1, 4)
+        assert_matches_rebuild()
+
+
+
+def test_moving_to_the_root_shortens_paths(app, tree):
+    with app.app_context():
+        ids = tree
+        db.session.get(Category, ids["boots"]).parent_id = None
+        db.session.commit()
+
+        state = snapshot()
+        assert state["boots"] == (f"/{ids['boots']}/", 0, 2, 2)
+        assert state["hiking"][2:] == (1, 1)
+        assert state["outdoors"][2:] == (0, 1)
+        assert_matches_rebuild()
+
+
+
+def test_refiling_products_adjusts_counts(app, tree):
+    with app.app_context():
+        ids = tree
+        boot = Product.query.filter_by(title="Trail boot").one()
+        boot.category_id = ids["gear"]
+        db.session.commit()
+
+        state = snapshot()
+        assert state["boots"][2:] == (1, 1)
+        assert state["outdoors"][2:] == (0, 2)
+        assert state["gear"][2:] == (2, 2)
+
+        Product.query.filter_by(title="Map").one().category_id = ids["boots"]
+        db.session.commit()
+        assert snapshot()["hiking"][2:] == (0, 2)
+        assert snapshot()["boots"][2:] == (2, 2)
+        assert_matches_rebuild()
+
+
+
+def test_a_category_cannot_move_under_its_own_subtree(app, tree):
+    with app.app_context():
+        ids = tree
+        db.session.get(Category, ids["outdoors"]).parent_id = ids["boots"]
+        with pytest.raises(ValueError):
+            db.session.commit()
+        db.session.rollback()
+
+        assert snapshot()["outdoors"][:2] == (f"/{ids['outdoors']}/", 0)
+
+
+
+def test_subtree_listing_follows_a_move(app, tree):
+    client = app.test_client()
+    ids = tree
+
+    def titles(category_id):
+        response = client.get(f"/api/categories/{category_id}/products")
+        return sorted(item["title"] for item in response.get_json()["items"])
+
+    assert titles(ids["outdoors"]) == ["Map", "Trail boot", "Winter boot"]
+
+    with app.app_context():
+        db.session.get(Category, ids["hiking"]).parent_id = ids["gear"]
+        db.session.commit()
+
+    assert titles(ids["outdoors"]) == []
+    assert titles(ids["gear"]) == ["Map", "Rope", "Trail boot", "Winter boot"]
@@ -0,0 +1,113 @@
+"""Checkout under parallel load never oversells.
+
+Runs against a file-backed SQLite database so every thread gets its
+own connection and the conditional stock UPDATEs really race.
+
+    python -m pytest -q tests/test_checkout_concurrency.py
+"""
+import threading
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import Cart, CartItem, Category, Order, Product, StockLedger, User
+
+
+STOCK = 5
+CUSTOMERS = 12
+PASSWORD = "secret"
+
+
+@pytest.fixture
+def app(tmp_path):
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'checkout.db'}"
+        CACHE_BACKEND = "null"
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+
+        supplier = User(name="Supplier", email="supplier@example.com", role="supplier")
+        supplier.set_password(PASSWORD)
+        category = Category(name="Clearance")
+        db.session.add_all([supplier, category])
+        db.session.flush()
+
+        product = Product(
+            supplier_id=supplier.id, category_id=category.id,
+            title="Last units", description="Clearance stock", price=9.5, stock=STOCK,
+        )
+        db.session.add(product)
+        db.session.flush()
+
+        for i in range(CUSTOMERS):
+            customer = User(name=f"Customer {i}", email=f"customer{i}@example.com", role="customer")
+            customer.set_password(PASSWORD)
+            db.session.add(customer)
+            db.session.flush()
+
+            cart = Cart(user_id=customer.id)
+            db.session.add(cart)
+            db.session.flush()
+            db.session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1))
+
+        db.session.commit()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+
+def login(app, email):
+    client = app.test_client()
+    response = client.post("/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+
+def test_parallel_checkouts_never_oversell(app):
+    clients = [login(app, f"customer{i}@example.com") for i in range(CUSTOMERS)]
+    barrier = threading.Barrier(CUSTOMERS)
+    statuses = [None] * CUSTOMERS
+
+    def checkout(index):
+        barrier.wait()
+        statuses[index] = clients[index].post("/api/customer/checkout").status_code
+
+    threads = [threading.Thread(target=checkout, args=(i,)) for i in range(CUSTOMERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses.count(200) == STOCK, statuses
+    assert statuses.count(409) == CUSTOMERS - STOCK, statuses
+
+    with app.app_context():
+        assert Order.query.count() == STOCK
+        assert db.session.query(Product.stock).scalar() == 0
+        assert db.session.query(StockLedger.balance).filter(StockLedger.balance < 0).count() == 0
+
+
+
+def test_retried_checkout_returns_the_same_order(app):
+    client = login(app, "customer0@example.com")
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/customer/checkout", headers=headers)
+    second = client.post("/api/customer/checkout", headers=headers)
+
+    assert first.status_code == 200, first.get_json()
+    assert second.status_code == 200, second.get_json()
+    assert second.get_json()["order_id"] == first.get_json()["order_id"]
+
+    with app.app_context():
+        assert Order.query.count() == 1
+        assert db.session.query(Product.stock).scalar() == STOCK - 1
@@ -0,0 +1,143 @@
+"""Job queue retries with backoff, dead-letters exhausted jobs and
+reclaims jobs whose worker went away."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.jobs import HANDLERS, enqueue, jobs
+from app.models import Job
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    """A registered handler that fails while `calls["fail"]` is set."""
+    calls = {"count": 0, "fail": True}
+
+    def handler(payload):
+        calls["count"] += 1
+        if calls["fail"]:
+            raise RuntimeError("provider down")
+
+    monkeypatch.setitem(HANDLERS, "test.flaky", handler)
+    return calls
+
+
+
+def make_due(job_id):
+    db.session.execute(
+        Job.__table__.update().where(Job.id == job_id).values(run_at=datetime.utcnow() - timedelta(seconds=1))
+    )
+    db.session.commit()
+
+
+
+def test_failed_job_is_retried_with_growing_backoff(app, flaky):
+    with app.app_context():
+        enqueue(db.session, "test.flaky", max_attempts=5)
+        db.session.commit()
+
+        for attempt in (1, 2, 3):
+            before = datetime.utcnow()
+            (job,) = jobs.claim("worker-a")
+            job_id = job.id
+            assert jobs.run(job) == "retried"
+
+            job = db.session.get(Job, job_id)
+            assert (job.status, job.attempts, job.locked_by) == ("pending", attempt, None)
+            assert job.last_error == "RuntimeError: provider down"
+
+            # base doubled per attempt, with up to half taken off as jitter
+            delay = (job.run_at - before).total_seconds()
+            full = jobs.backoff_base * 2 ** (attempt - 1)
+            assert full * 0.5 - 0.1 <= delay <= full + 0.1
+
+            # not due again until the backoff has passed
+            assert jobs.claim("worker-a") == []
+            make_due(job_id)
+
+        flaky["fail"] = False
+        (job,) = jobs.claim("worker-a")
+        assert jobs.run(job) == "succeeded"
+        assert db.session.get(Job, job_id).status == "done"
+        assert flaky["count"] == 4
+
+
+
+def test_backoff_is_capped(app):
+    with app.app_context():
+        assert jobs.backoff(50) <= jobs.backoff_max
+
+
+
+def test_exhausted_job_is_dead_lettered_and_can_be_requeued(app, flaky):
+    with app.app_context():
+        enqueue(db.session, "test.flaky", max_attempts=2)
+        db.session.commit()
+
+        (job,) = jobs.claim("worker-a")
+        job_id = job.id
+        assert jobs.run(job) == "retried"
+        make_due(job_id)
+
+        (job,) = jobs.claim("worker-a")
+        assert jobs.run(job) == "dead"
+
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts) == ("dead", 2)
+        assert job.finished_at is not None
+        assert jobs.claim("worker-a") == []
+        assert jobs.stats()["dead"] == 1
+
+    result = app.test_cli_runner().invoke(args=["jobs", "retry-dead", "--kind", "test.flaky"])
+    assert result.exit_code == 0, result.output
+    assert "Requeued 1 job(s)" in result.output
+
+    flaky["fail"] = False
+    with app.app_context():
+        (job,) = jobs.claim("worker-a")
+        assert job.attempts == 1
+        assert jobs.run(job) == "succeeded"
+
+
+
+def test_unknown_kind_fails_like_any_error(app):
+    with app.app_context():
+        enqueue(db.session, "test.nobody", max_attempts=1)
+        db.session.commit()
+
+        (job,) = jobs.claim("worker-a")
+        assert jobs.run(job) == "dead"
+        assert "No handler registered" in db.session.get(Job, job.id).last_error
+
+
+
+def test_stale_lock_is_reclaimed_and_the_lost_worker_cannot_settle(app, flaky):
+    with app.app_context():
+        enqueue(db.session, "test.flaky")
+        db.session.commit()
+
+        (job,) = jobs.claim("worker-a")
+        job_id = job.id
+
+        # a fresh lock is not up for grabs
+        assert jobs.claim("worker-b") == []
+
+        db.session.execute(
+            Job.__table__.update().where(Job.id == job_id)
+            .values(locked_at=datetime.utcnow() - timedelta(seconds=jobs.lock_timeout + 1))
+        )
+        db.session.commit()
+
+        (job,) = jobs.claim("worker-b")
+        assert (job.id, job.locked_by, job.attempts) == (job_id, "worker-b", 2)
+
+        # worker-a resurfaces late; its result no longer applies
+        jobs._finish(job_id, worker="worker-a", status="done", finished_at=datetime.utcnow())
+        job = db.session.get(Job, job_id)
+        db.session.refresh(job)
+        assert (job.status, job.locked_by) == ("running", "worker-b")
+
+        flaky["fail"] = False
+        assert jobs.run(job) == "succeeded"
+        assert db.session.get(Job, job_id).status == "done"
@@ -0,0 +1,15 @@
+"""Every endpoint in app.query_guard.ENDPOINTS stays within its query
+budget, and its statement count does not grow with the dataset.
+
+    python -m pytest -q tests/test_query_budgets.py
+"""
+import pytest
+
+from app.query_guard import DEFAULT_SIZES, ENDPOINTS, build_app, check_endpoint
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS, ids=[endpoint[0] for endpoint in ENDPOINTS])
+def test_endpoint_within_query_budget(endpoint):
+    # stateful endpoints get a fresh database per size, as in run_guard
+    report = check_endpoint(endpoint, [(size, build_app(size)) for size in DEFAULT_SIZES])
+    assert report is None, report
@@ -0,0 +1,90 @@
+"""The FTS index follows product and category renames, so /search
+finds products by their current title and category name only."""
+import pytest
+
+from app.extensions import db
+from app.models import Category, Product, User
+from app.search import search_products
+from conftest import PASSWORD
+
+
+def found(app, q):
+    with app.app_context():
+        return sorted(item["id"] for item in search_products(q)["items"])
+
+
+
+@pytest.fixture
+def admin(app, login):
+    with app.app_context():
+        user = User(name="Admin", email="admin@example.com", role="admin")
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+
+    return login("admin@example.com")
+
+
+
+def test_new_product_is_indexed(app, catalog, login):
+    supplier = login("supplier@example.com")
+    response = supplier.post("/api/supplier/add-product", json={
+        "title": "Tide tables", "description": "Harbour almanac",
+        "price": 4.5, "stock": 3, "category_id": catalog.category_id,
+    })
+    product_id = response.get_json()["product_id"]
+
+    assert found(app, "almanac") == [product_id]
+    assert found(app, "books") == sorted([catalog.product_id, product_id])
+
+
+
+def test_product_rename_reindexes(app, catalog, login):
+    supplier = login("supplier@example.com")
+    response = supplier.put(f"/api/supplier/product/{catalog.product_id}/update", json={"title": "Shorebird atlas"})
+    assert response.status_code == 200, response.get_json()
+
+    assert found(app, "atlas") == [catalog.product_id]
+    assert found(app, "field") == []
+
+    # untouched columns are still searchable after the row is rewritten
+    assert found(app, "coast") == [catalog.product_id]
+
+    response = supplier.get("/api/search", query_string={"q": "shorebird"})
+    assert [item["title"] for item in response.get_json()["items"]] == ["Shorebird atlas"]
+
+
+
+def test_product_recategorised_reindexes(app, catalog, login):
+    with app.app_context():
+        maps = Category(name="Maps")
+        db.session.add(maps)
+        db.session.commit()
+        maps_id = maps.id
+
+    supplier = login("supplier@example.com")
+    supplier.put(f"/api/supplier/product/{catalog.product_id}/update", json={"category_id": maps_id})
+
+    assert found(app, "maps") == [catalog.product_id]
+    assert found(app, "books") == []
+
+
+
+def test_category_rename_reindexes_its_products(app, catalog, admin):
+    response = admin.put(f"/api/admin/categories/{catalog.category_id}", json={"name": "Ornithology"})
+    assert response.status_code == 200, response.get_json()
+
+    assert found(app, "ornithology") == [catalog.product_id]
+    assert found(app, "books") == []
+
+
+
+def test_rolled_back_rename_leaves_the_index_alone(app, catalog):
+    with app.app_context():
+        product = db.session.get(Product, catalog.product_id)
+        product.title = "Never saved"
+        db.session.flush()
+        db.session.rollback()
+
+    assert found(app, "saved") == []
+    assert found(app, "field") == [catalog.product_id]
@@ -0,0 +1,93 @@
+"""Every stock change lands in the ledger with the running balance,
+and compact_ledger() folds old movements into a StockSnapshot that
+still adds up to the product's stock."""
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.inventory import compact_ledger
+from app.models import Product, StockLedger, StockSnapshot
+
+
+def ledger(product_id):
+    return (
+        db.session.query(StockLedger.delta, StockLedger.balance, StockLedger.reason)
+        .filter(StockLedger.product_id == product_id)
+        .order_by(StockLedger.id)
+        .all()
+    )
+
+
+
+def move_stock(login, catalog):
+    """create 20, set to 15, batch +10, sell 3 -> 22."""
+    supplier = login("supplier@example.com")
+    pid = catalog.product_id
+    assert supplier.put(f"/api/supplier/product/{pid}/stock", json={"stock": 15}).status_code == 200
+    response = supplier.patch("/api/supplier/products/batch", json={
+        "mode": "delta", "updates": [{"product_id": pid, "stock": 10}],
+    })
+    assert response.status_code == 200, response.get_json()
+
+    customer = login("customer@example.com")
+    customer.patch("/api/customer/cart", json={"operations": [{"op": "add", "product_id": pid, "quantity": 3}]})
+    assert customer.post("/api/customer/checkout").status_code == 200
+
+
+
+def test_ledger_records_every_move_with_its_balance(app, login, catalog):
+    move_stock(login, catalog)
+
+    with app.app_context():
+        assert ledger(catalog.product_id) == [
+            (20, 20, "create"),
+            (-5, 15, "manual"),
+            (10, 25, "batch"),
+            (-3, 22, "checkout"),
+        ]
+        assert db.session.get(Product, catalog.product_id).stock == 22
+
+
+
+def test_stock_history_pages_newest_first(app, login, catalog):
+    move_stock(login, catalog)
+    supplier = login("supplier@example.com")
+
+    first = supplier.get(f"/api/supplier/product/{catalog.product_id}/stock-history?limit=3").get_json()
+    assert first["stock"] == 22
+    assert [move["balance"] for move in first["items"]] == [22, 25, 15]
+
+    rest = supplier.get(
+        f"/api/supplier/product/{catalog.product_id}/stock-history?limit=3&after={first['next_after']}"
+    ).get_json()
+    assert [move["balance"] for move in rest["items"]] == [20]
+    assert rest["next_after"] is None
+
+
+
+def test_compaction_folds_old_moves_into_a_snapshot(app, login, catalog):
+    move_stock(login, catalog)
+    cutoff = datetime.utcnow() - timedelta(days=90)
+
+    with app.app_context():
+        # the first three moves are older than the retention window
+        old_ids = [row.id for row in StockLedger.query.order_by(StockLedger.id).limit(3)]
+        StockLedger.query.filter(StockLedger.id.in_(old_ids)).update(
+            {"created_at": cutoff - timedelta(days=1)}, synchronize_session=False
+        )
+        db.session.commit()
+
+        assert compact_ledger(cutoff) == {"snapshots": 1, "compacted": 3}
+
+        snapshot = StockSnapshot.query.one()
+        assert (snapshot.product_id, snapshot.supplier_id) == (catalog.product_id, catalog.supplier_id)
+        assert (snapshot.movements, snapshot.net_delta, snapshot.balance) == (3, 25, 25)
+        assert snapshot.period_end == cutoff
+
+        remaining = ledger(catalog.product_id)
+        assert remaining == [(-3, 22, "checkout")]
+        stock = db.session.get(Product, catalog.product_id).stock
+        assert snapshot.balance + sum(delta for delta, _, _ in remaining) == stock
+
+        # nothing left before the cutoff
+        assert compact_ledger(cutoff) == {"snapshots": 0, "compacted": 0}
+        assert StockSnapshot.query.count() == 1
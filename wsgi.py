@@ -0,0 +1,22 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    WEB_CONCURRENCY=4 uvicorn --interface wsgi wsgi:app
+
+Multi-process, multi-threaded; worker and thread counts come from
+gunicorn.conf.py (WEB_CONCURRENCY, GUNICORN_THREADS). Under uvicorn
+give the worker count as WEB_CONCURRENCY rather than --workers, the
+app reads it to reject per-process caches.
+
+Uses the production profile unless APP_CONFIG says otherwise. Set
+CACHE_REDIS_URL to cache responses and identities in Redis so every
+worker sees invalidations; without it responses go uncached. asgi.py
+is the ASGI variant, run.py the development server only.
+"""
+import os
+
+from app import create_app
+
+os.environ.setdefault("APP_CONFIG", "production")
+
+app = create_app()